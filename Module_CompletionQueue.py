@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+## Background computation of completions.
+#  @package Module_CompletionQueue
+#
+#  Completions that need the HiveAPIQuery tool are computed
+#  on a pool of worker threads so Sublime's main thread never
+#  waits on the tool.  Each view has a generation number that
+#  is increased by every completion request; work belonging to
+#  an older generation is dropped because the user has typed
+#  something since it was requested.  Work waits for a short
+#  debounce window first, so a burst of keystrokes only runs the
+#  tool for the last of them.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+## A pool of threads that computes completions for views.
+class CompletionQueue:
+
+	## constructor
+	#  @param workers - number of threads computing completions
+	#  @param debounce - seconds work waits for newer requests before it runs
+	def __init__(self, workers=2, debounce=0):
+		self.executor = ThreadPoolExecutor(max(1, workers))
+		self.debounce = debounce
+		self.lock = threading.Lock()
+		## view id -> generation of the latest completion request
+		self.generations = {}
+		## view id -> (key, items) computed for the latest request
+		self.ready = {}
+
+	## Start a new completion request for a view.
+	#  Work queued for earlier requests of the view becomes stale.
+	#  @param viewId - the id of the sublime view
+	#  @returns the generation of the new request
+	def begin(self, viewId):
+		with self.lock:
+			generation = self.generations.get(viewId, 0) + 1
+			self.generations[viewId] = generation
+			return generation
+
+	## Check whether a request is still the latest one for its view.
+	#  @param viewId - the id of the sublime view
+	#  @param generation - the generation returned by begin
+	#  @returns True or False
+	def isCurrent(self, viewId, generation):
+		with self.lock:
+			return self.generations.get(viewId) == generation
+
+	## Take the completions computed in the background for a key.
+	#  @param viewId - the id of the sublime view
+	#  @param key - a hashable description of the completions
+	#  @returns a list of completions or None if nothing was computed for the key
+	def take(self, viewId, key):
+		with self.lock:
+			entry = self.ready.get(viewId)
+			if entry is None or entry[0] != key:
+				return None
+			del self.ready[viewId]
+			return entry[1]
+
+	## Compute completions on a worker thread.
+	#  @param viewId - the id of the sublime view
+	#  @param generation - the generation returned by begin
+	#  @param key - a hashable description of the completions
+	#  @param compute - a function returning the list of completions
+	#  @param onReady - a function called with no arguments on a worker thread
+	#  once the completions are ready and the request is still current
+	def submit(self, viewId, generation, key, compute, onReady):
+		self.executor.submit(self._run, viewId, generation, key, compute, onReady, time.perf_counter())
+
+	## Forget everything about a view.
+	#  @param viewId - the id of the sublime view
+	def forget(self, viewId):
+		with self.lock:
+			self.generations.pop(viewId, None)
+			self.ready.pop(viewId, None)
+
+	## Stop the worker threads.  Queued work is abandoned.
+	def shutdown(self):
+		with self.lock:
+			self.generations.clear()
+			self.ready.clear()
+		self.executor.shutdown(wait=False)
+
+	def _run(self, viewId, generation, key, compute, onReady, submitted):
+		# the user kept typing while this was waiting in the queue
+		if not self.isCurrent(viewId, generation):
+			return
+
+		# wait out the debounce window, giving up as soon as the user types again
+		wait = submitted + self.debounce - time.perf_counter()
+		while wait > 0:
+			time.sleep(min(wait, 0.01))
+			if not self.isCurrent(viewId, generation):
+				return
+			wait = submitted + self.debounce - time.perf_counter()
+
+		try:
+			items = compute()
+		except Exception as e:
+			print("Exception while computing HIVE completions. Exception %s" % e)
+			return
+
+		with self.lock:
+			if self.generations.get(viewId) != generation:
+				return
+			self.ready[viewId] = (key, items)
+
+		onReady()
@@ -11,6 +11,26 @@
 import json
 import subprocess
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .Module_PerfStats import *
+from .Module_QueryCache import *
+from .Module_QueryWorker import *
+from .Module_SchemaSnapshot import *
+from .Module_TypeTrie import *
+from .Module_DisIndex import *
+from .Module_QueryFlights import *
+
+## seconds between checks of whether a running HiveAPIQuery process is still wanted
+QUERY_POLL_INTERVAL = 0.05
+## seconds a HiveAPIQuery process may run
+QUERY_TIMEOUT = 10
+
+## seconds before the DIS table is loaded again after loading it failed or gave nothing
+DIS_RETRY_INTERVAL = 5
 
 ## Abstract class for different dictionary formats.
 #  The dictionaries are to be used for context-sensitive
@@ -23,10 +43,63 @@ import os
 #  of the same structure.
 class DataDictionary:
 
-	def __init__(self, queryBin):
+	## constructor
+	#  @param queryBin - path to the HiveAPIQuery executable
+	#  @param cacheEntries - maximum number of query results to keep
+	#  @param cacheBytes - maximum total size of the cached query results (0 for no limit)
+	#  @param cacheTTL - seconds a cached query result stays valid (0 for no expiry)
+	#  @param useWorker - keep one HiveAPIQuery process running in worker mode
+	#  instead of starting a process for every query
+	#  @param memoEntries - number of completion lists to keep built
+	def __init__(self, queryBin, cacheEntries=512, cacheBytes=0, cacheTTL=0, useWorker=False, memoEntries=256):
 		# This is the HiveAPIQuery executable
 		self.queryBin = queryBin
 
+		# Results of previous queries, flushed when the executable is rebuilt
+		self.cache = QueryCache(cacheEntries, cacheBytes, cacheTTL)
+
+		# Queries that are running, shared by the requests asking for them
+		self.flights = FlightTable()
+		# the isCancelled function of the request of each thread, see cancellable
+		self.local = threading.local()
+
+		# Completion lists built for each context, see memoized
+		self.memo = LRUCache(memoEntries)
+
+		# Long lived HiveAPIQuery process, None to run one process per query
+		self.worker = None
+		if useWorker:
+			self.worker = QueryWorker(queryBin)
+
+		# Snapshot of the whole HIVE API, see loadSnapshot
+		self.snapshot = None
+		self.snapshotPath = None
+		self.snapshotLock = threading.Lock()
+		self.snapshotBuilding = False
+		self.snapshotFailed = None
+
+		# Trie of every object type and the type list it was built from
+		self.typeTrie = None
+		self.typeTrieSource = None
+
+		# DisIndex of the DIS enumeration table, see getDisIndex
+		self.disIndex = None
+		# (signature, object type, param name) of the query loading the table
+		self.disQuery = None
+		# (signature, time) of the last load that failed or gave nothing
+		self.disFailed = None
+		self.disLock = threading.Lock()
+		# most DIS completions to offer at once
+		self.disMaxResults = 1000
+
+		# Object types whose channels and values were prefetched, see prefetch
+		self.prefetched = set()
+		self.prefetchSignature = None
+		self.prefetchLock = threading.Lock()
+		self.prefetchExecutor = None
+		# most queries run at once by prefetch
+		self.prefetchThreads = 2
+
 		# Build the list of XML Elements & Attributs that the HIVE Parser supports loading
 		self.elements = {
 				"root" :
@@ -87,135 +160,464 @@ class DataDictionary:
 			}
 
 	## Runs the HiveAPIQuery tool and requests API information that can be used for autocomplete.
+	#  Results are cached until the tool is rebuilt, evicted or expire.
 	# @param query - Which type of API information to return (type, channel, value, dis)
 	# @param typ - This is the HIVE class to use in the query (acts as filter of query=type)
 	# @param channel - The HIVE channel to query (acts as filter if query=channel)
 	# @param value - The filter to use when checking for a HIVE channel's possible values
-	def apiQuery(self, query, typ="", channel="", value="", dis=""):
-
-		objs = []
+	# @param block - when False, None is returned instead of running the tool if the result is not cached.
+	# None is also returned if the request of the calling thread is superseded while the tool runs, see cancellable
+	# @param record - False to leave the lookup out of the cache counters and timings, for lookups
+	# that are not completion requests such as those of validation
+	def apiQuery(self, query, typ="", channel="", value="", dis="", block=True, record=True):
 
 		# Don't try to run the tool unless it exists and is executable
-		if os.path.isfile(self.queryBin) and os.access(self.queryBin, os.X_OK):
-	        # Hide the console window on Windows
-			startupinfo = None
-			if os.name == "nt":
-				startupinfo = subprocess.STARTUPINFO()
-				startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-			cmd = [self.queryBin, query]
-			if typ != "":
-				cmd.append('--type=%s' % typ)
-			if channel != "":
-				cmd.append('--channel=%s' % channel)
-			if value != "":
-				cmd.append('--value=%s' % value)
-			if dis != "":
-				cmd.append('--dis=%s' % dis)
-
-			# They asked for a list of available object types, so lets ask HIVE
-			apiStr = subprocess.check_output(cmd, timeout=10, universal_newlines=True,startupinfo=startupinfo)
-
-			try:
-				objs = json.loads(apiStr)
-			except Exception as e:
-				print("Exception while converting HiveAPIQuery results [%s] from JSON. Exception %s" % (apiStr, e))
-		else:
+		signature = fileSignature(self.queryBin)
+		if signature is None or not os.access(self.queryBin, os.X_OK):
 			print("HiveAPIQuery binary was not found! [%s]" % self.queryBin)
+			return []
+
+		if signature != self.cache.signature and self.worker is not None:
+			# The executable was rebuilt, so the worker has to be restarted
+			self.worker.reset()
+		self.cache.validate(signature)
+
+		snapshot = self.snapshot
+		if snapshot is not None:
+			if snapshot.signature == signature:
+				start = time.perf_counter()
+				found, objs = snapshot.lookup(query, typ, channel, value, dis)
+				if record:
+					PERF_STATS.record("apiQuery", "snapshot", time.perf_counter() - start)
+				if found:
+					return objs
+			else:
+				# The executable was rebuilt since the snapshot was taken
+				self.buildSnapshot()
+
+		key = (query, typ, channel, value, dis)
+		start = time.perf_counter()
+		found, objs = self.cache.lookup(key, record)
+		if record:
+			PERF_STATS.record("apiQuery", "cache", time.perf_counter() - start)
+		if found:
+			return objs
+		if not block:
+			return None
+
+		# a request for the same query that is already running waits for it
+		def run(abandoned):
+			objs, size = self.runQuery(query, typ, channel, value, dis, abandoned)
+			if objs is not None:
+				self.cache.store(key, objs, size)
+			else:
+				objs = []
+			return objs
+
+		try:
+			return self.flights.run(key, run, getattr(self.local, "isCancelled", None))
+		except QueryCancelled:
+			return None
+
+	## Mark the apiQuery calls made by the current thread as belonging to
+	#  a request that may be superseded.  A HiveAPIQuery process is killed
+	#  once every request waiting on it was superseded.
+	#  @param isCancelled - a function returning True once the request was superseded
+	@contextmanager
+	def cancellable(self, isCancelled):
+		previous = getattr(self.local, "isCancelled", None)
+		self.local.isCancelled = isCancelled
+		try:
+			yield
+		finally:
+			self.local.isCancelled = previous
+
+	## Runs the HiveAPIQuery tool without consulting the cache.
+	#  The worker process is used when it is enabled and working,
+	#  otherwise a new process is started for the query.
+	#  @param abandoned - optional function returning True once the result is no
+	#  longer wanted, which kills the process
+	#  @returns a pair of the decoded results (None if they could not be decoded)
+	#  and the length of the tool's output
+	#  @throws QueryCancelled if the process was killed because of abandoned
+	def runQuery(self, query, typ="", channel="", value="", dis="", abandoned=None):
+
+		if self.worker is not None and not self.worker.failed:
+			try:
+				start = time.perf_counter()
+				result = self.worker.query(query, typ, channel, value, dis)
+				PERF_STATS.record("apiQuery", "worker", time.perf_counter() - start)
+				return result
+			except QueryWorkerError as e:
+				print("%s, running HiveAPIQuery directly" % e)
+
+		return self.runProcessQuery(query, typ, channel, value, dis, abandoned)
+
+	## Runs the HiveAPIQuery tool in a new process.
+	#  @param abandoned - optional function returning True once the result is no
+	#  longer wanted, which kills the process
+	#  @returns a pair of the decoded results (None if they could not be decoded)
+	#  and the length of the tool's output
+	#  @throws QueryCancelled if the process was killed because of abandoned
+	def runProcessQuery(self, query, typ="", channel="", value="", dis="", abandoned=None):
+
+		objs = None
+
+		# Hide the console window on Windows
+		startupinfo = None
+		if os.name == "nt":
+			startupinfo = subprocess.STARTUPINFO()
+			startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+		cmd = [self.queryBin, query]
+		if typ != "":
+			cmd.append('--type=%s' % typ)
+		if channel != "":
+			cmd.append('--channel=%s' % channel)
+		if value != "":
+			cmd.append('--value=%s' % value)
+		if dis != "":
+			cmd.append('--dis=%s' % dis)
+
+		# They asked for a list of available object types, so lets ask HIVE
+		start = time.perf_counter()
+		process = subprocess.Popen(cmd, stdout=subprocess.PIPE, universal_newlines=True, startupinfo=startupinfo)
+		while True:
+			try:
+				apiStr = process.communicate(timeout=QUERY_POLL_INTERVAL)[0]
+				break
+			except subprocess.TimeoutExpired:
+				if abandoned is not None and abandoned():
+					process.kill()
+					process.communicate()
+					raise QueryCancelled("HiveAPIQuery %s query was superseded" % query)
+				if time.perf_counter() - start > QUERY_TIMEOUT:
+					process.kill()
+					process.communicate()
+					raise subprocess.TimeoutExpired(cmd, QUERY_TIMEOUT)
+		PERF_STATS.record("apiQuery", "process", time.perf_counter() - start)
+		if process.returncode != 0:
+			raise subprocess.CalledProcessError(process.returncode, cmd, apiStr)
+
+		start = time.perf_counter()
+		try:
+			objs = json.loads(apiStr)
+		except Exception as e:
+			print("Exception while converting HiveAPIQuery results [%s] from JSON. Exception %s" % (apiStr, e))
+		PERF_STATS.record("apiQuery", "decode", time.perf_counter() - start)
 
 		# print("Query {%s} returned [%s]" % (cmd, apiStr))
-		return objs
-
+		return (objs, len(apiStr))
+
+	## Forget all cached query results.
+	def clearCache(self):
+		self.cache.clear()
+		self.memo.clear()
+
+	## Load a schema snapshot so type, channel and value queries are
+	#  answered from memory.  The snapshot is rebuilt in the background
+	#  whenever the HiveAPIQuery binary changes.
+	#  @param path - the snapshot file
+	#  @returns True if a snapshot was loaded
+	def loadSnapshot(self, path):
+		self.snapshotPath = path
+		self.snapshot = SchemaSnapshot.load(path)
+		if self.snapshot is not None and self.snapshot.signature != fileSignature(self.queryBin):
+			self.buildSnapshot()
+		return self.snapshot is not None
+
+	## Build a schema snapshot from the HiveAPIQuery tool in a background
+	#  thread, save it and start using it.
+	#  @param progress - optional function called with status messages,
+	#  None for automatic rebuilds which are not retried after failing
+	#  @returns False if the tool is missing or a build is already running
+	def buildSnapshot(self, progress=None):
+		signature = fileSignature(self.queryBin)
+		if self.snapshotPath is None or signature is None:
+			return False
+		if progress is None and signature == self.snapshotFailed:
+			return False
+
+		with self.snapshotLock:
+			if self.snapshotBuilding:
+				return False
+			self.snapshotBuilding = True
+
+		def build():
+			try:
+				snapshot = SchemaSnapshot.build(self.runQuery, signature, progress=progress)
+				snapshot.save(self.snapshotPath)
+				self.snapshot = snapshot
+				msg = "HIVE: schema snapshot of %d types saved" % len(snapshot.types)
+			except Exception as e:
+				self.snapshotFailed = signature
+				msg = "HIVE: schema snapshot failed: %s" % e
+			finally:
+				with self.snapshotLock:
+					self.snapshotBuilding = False
+
+			print(msg)
+			if progress is not None:
+				progress(msg)
+
+		thread = threading.Thread(target=build, name="HIVE schema snapshot")
+		thread.daemon = True
+		thread.start()
+		return True
+
+	## Query the channels of some object types and the values of each
+	#  channel in the background, so the first completions in objects
+	#  of those types come from the cache.  Types already prefetched
+	#  for the current HiveAPIQuery binary are skipped.
+	#  @param types - a list of object types
+	#  @returns the number of types queued
+	def prefetch(self, types):
+		signature = fileSignature(self.queryBin)
+		if signature is None:
+			return 0
+
+		with self.prefetchLock:
+			if signature != self.prefetchSignature:
+				self.prefetched = set()
+				self.prefetchSignature = signature
+			types = [typ for typ in types if typ not in self.prefetched]
+			self.prefetched.update(types)
+			if not types:
+				return 0
+			if self.prefetchExecutor is None:
+				self.prefetchExecutor = ThreadPoolExecutor(max(1, self.prefetchThreads))
+
+		for typ in types:
+			self.prefetchExecutor.submit(self._prefetchType, typ)
+		return len(types)
+
+	# Query the channels and values of one object type
+	def _prefetchType(self, typ):
+		try:
+			channels = self.apiQuery("channel", typ)
+			for channel in channels:
+				# DIS tables are loaded whole by getDisIndex when first used,
+				# and prefetching must not push older results out of the cache
+				if channel[0] == "disEnumeration" or len(self.cache) >= self.cache.maxEntries // 2:
+					continue
+				self.apiQuery("value", typ, channel[0])
+		except Exception as e:
+			print("Exception while prefetching HIVE type %s. Exception %s" % (typ, e))
+
+	## Stop the HiveAPIQuery worker process if one is running.
+	def shutdown(self):
+		if self.prefetchExecutor is not None:
+			self.prefetchExecutor.shutdown(wait=False)
+		if self.worker is not None:
+			self.worker.stop()
+
+
+	## Get the completions of a context from the memo, building both
+	#  quoting variants the first time they are asked for.  An entry is
+	#  rebuilt when its version changes.  Entries only hold the version,
+	#  not the query result they were built from, so evicted results are freed.
+	#  @param key - a (context kind, object type, param name, prefix) tuple
+	#  @param version - a value that changes whenever the data the completions
+	#  are built from changes, such as the signature of the HiveAPIQuery binary
+	#  @param source - the query result or index the completions are built from.
+	#  Completions of an empty result are not kept, it may be from a failed query
+	#  @param addQuotes - boolean indicating whether to get the quoted variant
+	#  @param build - a function taking the quotes to add and returning
+	#  a list of trigger-completion pairs
+	#  @returns a sorted list of trigger-completion pairs, shared by every
+	#  caller, so it must not be changed
+	def memoized(self, key, version, source, addQuotes, build):
+		found, entry = self.memo.lookup(key)
+		if not found or entry[0] != version:
+			# lists so sublime does not take them for (completions, flags) pairs
+			entry = (version,
+				sorted(tuple(c) for c in build('')),
+				sorted(tuple(c) for c in build('\"')))
+			if len(source) > 0:
+				self.memo.store(key, entry)
+
+		return entry[2] if addQuotes else entry[1]
 
 	## Get a list of objects that can be passed to sublime's autocompletion plugin.
 	#  @param addQuotes - boolean indicating whether to add quotes around the object type
+	#  @param block - when False, None is returned if the HiveAPIQuery tool would have to be run
 	#  @returns a list of pairs of strings (trigger-completion pairs)
-	def getObjectCompletions(self, prefix="", addQuotes = False):
-
-		# Running the HiveAPQuery tool every time isn't the fastest thing, we might want to just save a
-		# list of all the objects and only updated it if the HIVEAPIQuery tool is rebuilt, or like every 5mins.
-		quotes = ''
-		if addQuotes == True:
-			quotes = '\"' #add quotes to the completion
-
-		completions = []
-		results = self.apiQuery("type", prefix)
-		for obj in results:
-			val = obj.replace(prefix, "", 1)
-			completions.append([val, quotes + val + quotes])
-
-			# If we had descriptions for the classes we would use
-			# completions.append([val + "\t" + desc, quotes + val + quotes])
-
-		return completions
+	def getObjectCompletions(self, prefix="", addQuotes = False, block = True):
+
+		# taken before the query, so a binary rebuilt meanwhile only makes the entry stale
+		version = fileSignature(self.queryBin)
+		trie = self.getTypeTrie(block)
+		if trie is None:
+			return None
+
+		# The trie returns the types sorted and with the prefix already removed
+		# If we had descriptions for the classes we would use
+		# completions.append([val + "\t" + desc, quotes + val + quotes])
+		return self.memoized(("type", "", "", prefix), version, self.typeTrieSource, addQuotes,
+			lambda quotes: [[val, quotes + val + quotes] for val in trie.complete(prefix)])
+
+	## Get the trie of every object type.  It is built the first time it is
+	#  needed and again whenever the list of types from apiQuery changes.
+	#  @param block - when False, None is returned if the HiveAPIQuery tool would have to be run
+	#  @returns a TypeTrie or None
+	def getTypeTrie(self, block=True):
+		types = self.apiQuery("type", block=block)
+		if types is None:
+			return None
+
+		# cached and snapshot results are the same list object every time
+		if types is not self.typeTrieSource:
+			self.typeTrie = TypeTrie(types)
+			self.typeTrieSource = types
+
+		return self.typeTrie
 
 	## Get a list of param names that can be passed to sublime's autocompletion plugin.
 	#  @param objectType - the type of this parameter's parent object
 	#  @param addQuotes - boolean indicating whether to add quotes around the param name
+	#  @param block - when False, None is returned if the HiveAPIQuery tool would have to be run
 	#  @returns a list of pairs of strings (trigger-completion pairs)
-	def getParamCompletions(self, objectType, addQuotes = False):
-
-		quotes = ''
-		if addQuotes == True:
-			quotes = '\"' #add quotes to the completion
+	def getParamCompletions(self, objectType, addQuotes = False, block = True):
 
-		completions = []
-		results = self.apiQuery("channel", objectType)
-		for param in results:
-			completions.append([param[0] + "\t" + param[1], quotes + param[0] + quotes])
+		version = fileSignature(self.queryBin)
+		results = self.apiQuery("channel", objectType, block=block)
+		if results is None:
+			return None
 
-		return completions
+		return self.memoized(("channel", objectType, "", ""), version, results, addQuotes,
+			lambda quotes: [[param[0] + "\t" + param[1], quotes + param[0] + quotes] for param in results])
 
 	## Get a list of parameter values to pass to autocompletion
 	#  @param paramName - a string of the parameter's name
 	#  @param addQuotes - boolean indicating whether to add quotes around the param name
 	#  @param objectType - the parent object type of the parameter
+	#  @param prefix - the part of the value before the word being typed
+	#  @param word - the word being typed, which the completion replaces
+	#  @param block - when False, None is returned if the HiveAPIQuery tool would have to be run
 	#  @returns a list of pairs of strings
-	def getParamValueCompletions(self, paramName, objectType, prefix = '', addQuotes=False):
+	def getParamValueCompletions(self, paramName, objectType, prefix = '', addQuotes=False, block=True, word=''):
 
-		quotes = ''
-		if(addQuotes):
-			quotes = '\"'
+		if paramName == "disEnumeration":
+			# The whole DIS table is loaded once, so every keystroke is a lookup in memory
+			index = self.getDisIndex(objectType, paramName, block)
+			if index is None:
+				return None
+
+			# one entry for the word being typed, rather than one for every keystroke
+			return self.memoized(("dis", "", paramName, ""), (index.signature, prefix, word), index, addQuotes,
+				lambda quotes: self.buildDisCompletions(index, prefix, word, quotes))
+
+		version = fileSignature(self.queryBin)
+		results = self.apiQuery("value", objectType, paramName, block=block)
+		if results is None:
+			return None
+
+		return self.memoized(("value", objectType, paramName, ""), version, results, addQuotes,
+			lambda quotes: [[v[0] + "\t" + str(v[1]), quotes + str(v[0]) + quotes] for v in results])
+
+	## Build the DIS enumeration completions for a word.
+	#  @param index - the DisIndex of the object type
+	#  @param prefix - the part of the value before the word being typed
+	#  @param word - the word being typed, which the completion replaces
+	#  @param quotes - the quotes to add around the completions
+	#  @returns a list of pairs of strings
+	def buildDisCompletions(self, index, prefix, word, quotes):
 
 		completions = []
 
-		if paramName == "disEnumeration":
-			# To prevent DIS Query tool from lagging, don't ask for DIS suggestions
-			# unless there are at least 3 charaters in the string
-			if len(prefix) >= 3:
-				results = self.apiQuery("dis", objectType, paramName, dis=prefix)
-				for v in results:
-					asterix = ""
-					if v[2] == 1:
-						asterix = "*"
-
-					completions.append([v[0] + "\t" + asterix + v[1], quotes + v[0].replace(prefix, "", 1) + quotes])
-		else:
-			results = self.apiQuery("value", objectType, paramName)
-			for v in results:
-				completions.append([v[0] + "\t" + str(v[1]), quotes + str(v[0]) + quotes])
+		typed = prefix + word
+		for v in index.prefixMatches(typed, self.disMaxResults):
+			asterix = ""
+			if v[2] == 1:
+				asterix = "*"
+
+			completions.append([v[0] + "\t" + asterix + v[1], quotes + v[0][len(prefix):] + quotes])
+
+		# Enumerations containing the word or with a description containing it can
+		# only be inserted while nothing before the word has been typed
+		if prefix == "" and len(completions) < self.disMaxResults:
+			for v, inDescription in index.substringMatches(typed, self.disMaxResults - len(completions)):
+				if v[0].startswith(typed):
+					continue #already a prefix match
+
+				asterix = ""
+				if v[2] == 1:
+					asterix = "*"
+
+				if inDescription:
+					# the trigger must contain the word for sublime to show the completion
+					completions.append([v[1] + "\t" + asterix + v[0], quotes + v[0] + quotes])
+				else:
+					completions.append([v[0] + "\t" + asterix + v[1], quotes + v[0] + quotes])
 
 		return completions
 
 
+	## Get the DIS enumeration index, loading the whole table from the
+	#  HiveAPIQuery tool the first time and again after the tool is rebuilt.
+	#  The table is the same for every object type, so it is loaded once.
+	#  A failed or empty load is not kept: an empty index is returned without
+	#  running the tool until DIS_RETRY_INTERVAL has passed, then it is loaded again.
+	#  @param objectType - the object type the enumerations are for
+	#  @param paramName - the param holding the enumeration
+	#  @param block - when False, None is returned if the table is not loaded yet
+	#  @returns a DisIndex or None
+	def getDisIndex(self, objectType, paramName, block=True):
+		signature = fileSignature(self.queryBin)
+		index = self.disIndex
+		if index is not None and index.signature == signature:
+			return index
+		failed = self.disFailed
+		if failed is not None and failed[0] == signature and time.monotonic() - failed[1] < DIS_RETRY_INTERVAL:
+			return DisIndex([], signature)
+		if not block:
+			return None
+
+		# every request loading the table asks the same query, so the
+		# tool is run once however many object types are waiting for it
+		with self.disLock:
+			if self.disQuery is None or self.disQuery[0] != signature:
+				self.disQuery = (signature, objectType, paramName)
+			query = self.disQuery
+
+		try:
+			results = self.apiQuery("dis", query[1], query[2])
+		except Exception:
+			self.disFailed = (signature, time.monotonic())
+			raise
+		if results is None:
+			return None
+
+		with self.disLock:
+			if not results:
+				# the output could not be decoded or the tool gave nothing,
+				# so the next load must run the tool again
+				self.cache.remove(("dis", query[1], query[2], "", ""))
+				self.disFailed = (signature, time.monotonic())
+				return DisIndex([], signature)
+			self.disFailed = None
+			index = self.disIndex
+			if index is None or index.signature != signature:
+				index = self.disIndex = DisIndex(results, signature)
+
+		return index
+
 	## Get a list of elements to pass to autocompletion.
 	#  @param element - the governing element above the current tag
 	#  @returns a list of pairs of strings
 	def getElementCompletions(self, element):
-		completions = []
-		if (self.elements is not None) and (element in self.elements):
-			for el in self.elements[element][0]:
-				completions.append([el, el])
+		if (self.elements is None) or (element not in self.elements):
+			return []
 
-		return completions
+		return self.memoized(("element", "", "", element), None, self.elements, False,
+			lambda quotes: [[el, el] for el in self.elements[element][0]])
 
 	## Get a list of attributes to pass to autocompletion.
 	#  @param element - the element type of the current tag
 	#  @returns a list of pairs of strings
 	def getAttributeCompletions(self, element):
-		completions = []
-		if (self.elements is not None) and (element in self.elements):
-			for attr in self.elements[element][1]:
-				completions.append([attr, attr])
+		if (self.elements is None) or (element not in self.elements):
+			return []
 
-		return completions
\ No newline at end of file
+		return self.memoized(("attribute", "", "", element), None, self.elements, False,
+			lambda quotes: [[attr, attr] for attr in self.elements[element][1]])
\ No newline at end of file
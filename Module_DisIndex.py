@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+## In memory index of DIS enumerations.
+#  @package Module_DisIndex
+#
+#  The DIS enumeration table is loaded from the HiveAPIQuery
+#  tool once and kept sorted so prefix lookups are a binary
+#  search.  A lower case copy of every enumeration and its
+#  description is kept in one string so substring lookups
+#  are done by str.find instead of a Python loop.
+
+import bisect
+from array import array
+from itertools import accumulate
+from operator import itemgetter
+
+## A sorted index of [enumeration, description, flag] entries.
+class DisIndex:
+
+	## constructor
+	#  @param entries - a list of [enumeration, description, flag] lists
+	#  as returned by the dis query of HiveAPIQuery
+	#  @param signature - signature of the HiveAPIQuery binary the entries came from
+	def __init__(self, entries, signature=None):
+		self.signature = signature
+		## entries sorted by enumeration
+		self.entries = sorted(entries, key=itemgetter(0))
+		## sorted enumeration strings, for bisect
+		self.keys = [v[0] for v in self.entries]
+
+		## lower case "enumeration\tdescription" lines for substring search
+		lines = [v[0] + "\t" + str(v[1]) for v in self.entries]
+		self.haystack = "\n".join(lines).lower()
+		## offset of each line in haystack
+		self.offsets = array("q", accumulate([0] + [len(line) + 1 for line in lines[:-1]]) if lines else [])
+
+	def __len__(self):
+		return len(self.entries)
+
+	## Get the entries whose enumeration starts with a prefix.
+	#  @param prefix - the start of an enumeration
+	#  @param limit - maximum number of entries to return
+	#  @returns a list of entries in enumeration order
+	def prefixMatches(self, prefix, limit=1000):
+		start = bisect.bisect_left(self.keys, prefix)
+		matches = []
+		for i in range(start, min(start + limit, len(self.keys))):
+			if not self.keys[i].startswith(prefix):
+				break
+			matches.append(self.entries[i])
+		return matches
+
+	## Get the entries whose enumeration or description contains
+	#  a string, ignoring case.
+	#  @param text - the string to look for
+	#  @param limit - maximum number of entries to return
+	#  @returns a list of (entry, inDescription) pairs in enumeration order,
+	#  where inDescription is True if only the description matched
+	def substringMatches(self, text, limit=1000):
+		text = text.lower()
+		matches = []
+		if text == "":
+			return matches
+
+		pos = self.haystack.find(text)
+		while pos != -1 and len(matches) < limit:
+			i = bisect.bisect_right(self.offsets, pos) - 1
+			entry = self.entries[i]
+			matches.append((entry, text not in entry[0].lower()))
+
+			# continue after the line that matched
+			if i + 1 >= len(self.offsets):
+				break
+			pos = self.haystack.find(text, self.offsets[i + 1])
+
+		return matches
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+## Reading HIVE log files from disk.
+#  @package Module_LogFile
+#
+#  HIVE .nlog files can be several gigabytes, so they are read
+#  straight from disk through mmap in chunks of whole lines
+#  instead of through the text of a view.
+
+import mmap
+import os
+import re
+
+## The log levels in the order hive.tmLanguage lists them
+LEVELS = "SDIAW!#"
+
+## log level -> name
+LEVEL_NAMES = {
+	"S" : "system",
+	"D" : "debug",
+	"I" : "info",
+	"A" : "alert",
+	"W" : "warning",
+	"!" : "error",
+	"#" : "fatal"
+}
+
+## Finds the level of each log line in a chunk of bytes.
+#  The same lines as the hive.tmLanguage patterns: a [level] marker
+#  followed by the file(line) the message was written from.
+#  Group 1 is the level and group 2 the file(line) reference.
+LOG_LINE_RE = re.compile(br"^[^\n]*\[([SDIAW!#])\][ \t]+([^()\r\n]+\([0-9]+\))", re.M)
+
+## number of bytes read at a time
+CHUNK_SIZE = 8 * 1024 * 1024
+
+## Make an expression that finds the whole log lines of some levels in a chunk of bytes.
+#  @param levels - a string of log levels such as "W!#"
+#  @returns a compiled bytes expression, group 1 is the level
+def levelLineRe(levels):
+	levels = "".join(re.escape(level) for level in levels)
+	return re.compile(br"^[^\n]*\[([" + levels.encode() + br"])\][ \t]+[^()\r\n]+\([0-9]+\)[^\n]*\n", re.M)
+
+## Get the identity of a file, which changes when the file is
+#  replaced by another one, as log rotation does.
+#  @param path - path to the file
+#  @returns a (device, inode, size) tuple or None if the file does not exist
+def fileIdentity(path):
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (st.st_dev, st.st_ino, st.st_size)
+
+## Find the start of the first line at or after an offset of a file.
+#  @param path - path to the file
+#  @param offset - an offset into the file
+#  @returns the offset of the line, which is the size of the file if there is none
+def lineStart(path, offset):
+	with open(path, "rb") as f:
+		size = os.fstat(f.fileno()).st_size
+		if offset <= 0 or size == 0:
+			return 0
+		if offset >= size:
+			return size
+
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			newline = mm.find(b"\n", offset - 1)
+		finally:
+			mm.close()
+		return size if newline < 0 else newline + 1
+
+## Read the complete lines of a file in chunks.
+#  A line that is still being written (no newline yet) is not returned.
+#  @param path - path to the file
+#  @param start - offset of the first byte to read, the start of a line
+#  @param chunkSize - approximate number of bytes in each chunk
+#  @returns an iterator of (offset, bytes) pairs, each chunk ending with a newline
+def readLines(path, start=0, chunkSize=CHUNK_SIZE):
+	with open(path, "rb") as f:
+		size = os.fstat(f.fileno()).st_size
+		if size <= start:
+			return
+
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			pos = start
+			while pos < size:
+				end = min(size, pos + chunkSize)
+				newline = mm.rfind(b"\n", pos, end)
+				if newline < 0:
+					# a line longer than a chunk
+					newline = mm.find(b"\n", end)
+					if newline < 0:
+						break #the last line is not finished
+				yield (pos, mm[pos:newline + 1])
+				pos = newline + 1
+		finally:
+			mm.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+
+## Filtering of HIVE log files from disk.
+#  @package Module_LogFilter
+#
+#  The lines of a log with some levels, or matching an expression,
+#  are found by reading the file from disk in chunks, so a log of
+#  any size can be filtered without opening it in a view.  The
+#  lines are copied unchanged, keeping their file(line) reference.
+
+import os
+import re
+import threading
+
+from .Module_LogFile import *
+
+## Compile a filter expression for the lines of a chunk.
+#  The expression is matched against each line on its own, so ^ and $
+#  match at the start and end of every line of a chunk.
+#  @param pattern - an expression the lines must contain
+#  @returns a compiled bytes expression
+#  @throws re.error if pattern is not a valid expression
+def compileLinePattern(pattern):
+	return re.compile(pattern.encode("utf-8"), re.M)
+
+## Find the lines of a chunk that pass a filter.
+#  @param chunk - bytes ending with a newline
+#  @param levelRe - an expression from levelLineRe, or None for lines of any level
+#  @param pattern - an expression from compileLinePattern the lines must contain, or None
+#  @returns a list of lines, each ending with a newline
+def filterChunk(chunk, levelRe=None, pattern=None):
+	lines = []
+	if levelRe is not None:
+		for m in levelRe.finditer(chunk):
+			# up to the newline, so $ matches at the end of the line
+			if pattern is None or pattern.search(chunk, m.start(), m.end() - 1):
+				lines.append(m.group(0))
+		return lines
+
+	if pattern is None:
+		return [chunk]
+
+	pos = 0
+	while pos < len(chunk):
+		m = pattern.search(chunk, pos)
+		if m is None:
+			break
+		start = chunk.rfind(b"\n", 0, m.start()) + 1
+		end = chunk.find(b"\n", m.start()) + 1
+		if end <= 0:
+			end = len(chunk)
+		stop = end - 1 if chunk[end - 1:end] == b"\n" else end
+		# a match running past the end of its line, such as one of \s,
+		# only counts if the line matches on its own
+		if m.end() <= stop or pattern.search(chunk, start, stop):
+			lines.append(chunk[start:end])
+		pos = end
+	return lines
+
+## A filter of one log file run on a background thread.
+class LogFilter:
+
+	## constructor
+	#  @param path - path to the log file
+	#  @param levels - a string of log levels such as "W!#", or None for any level
+	#  @param pattern - an expression the lines must contain, or None
+	#  @throws re.error if pattern is not a valid expression
+	def __init__(self, path, levels=None, pattern=None):
+		self.path = path
+		self.levels = levels
+		self.pattern = pattern
+		self.levelRe = levelLineRe(levels) if levels else None
+		self.patternRe = compileLinePattern(pattern) if pattern else None
+		self.cancelled = threading.Event()
+
+		## number of lines that passed the filter so far
+		self.lineCount = 0
+		## number of bytes read so far
+		self.offset = 0
+		## True once the whole file was read or the filter was cancelled
+		self.done = False
+
+	## Stop the filter after the chunk it is reading.
+	def cancel(self):
+		self.cancelled.set()
+
+	## Filter the file.
+	#  @param onLines - function called with the text of the lines of each chunk that passed
+	#  @param progress - optional function called with the fraction of the file read
+	#  @returns True if the whole file was read, False if the filter was cancelled
+	def run(self, onLines, progress=None):
+		try:
+			size = os.path.getsize(self.path)
+			for offset, chunk in readLines(self.path):
+				if self.cancelled.is_set():
+					return False
+
+				lines = filterChunk(chunk, self.levelRe, self.patternRe)
+				self.offset = offset + len(chunk)
+				if lines:
+					self.lineCount += len(lines)
+					onLines(b"".join(lines).decode("utf-8", "replace"))
+
+				if progress is not None and size > 0:
+					progress(min(1.0, float(self.offset) / size))
+			return not self.cancelled.is_set()
+		finally:
+			self.done = True
+
+	## Run the filter on a background thread.
+	#  @param onLines - function called with the text of the lines of each chunk that passed
+	#  @param progress - optional function called with the fraction of the file read
+	#  @param onDone - optional function called with the result of run
+	def start(self, onLines, progress=None, onDone=None):
+		def filter():
+			finished = False
+			try:
+				finished = self.run(onLines, progress)
+			except Exception as e:
+				print("Exception while filtering HIVE log [%s]. Exception %s" % (self.path, e))
+			if onDone is not None:
+				onDone(finished)
+
+		thread = threading.Thread(target=filter, name="HIVE log filter")
+		thread.daemon = True
+		thread.start()
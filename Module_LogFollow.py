@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+
+## Following HIVE log files as they are written.
+#  @package Module_LogFollow
+#
+#  Only the bytes written since the last poll are read, so a
+#  log that HIVE keeps writing to is never read again from the
+#  start.  A poll reads at most maxBytes and returns at most
+#  maxLines lines; when HIVE logs faster than that the oldest
+#  new lines are skipped instead of falling further behind.
+
+from collections import deque
+
+from .Module_LogFile import *
+
+## most bytes read by one poll
+FOLLOW_MAX_BYTES = 4 * 1024 * 1024
+
+## number of bytes at the start of the file compared on each poll,
+#  which catches a new file that was given the old one's inode
+FOLLOW_HEAD_BYTES = 64
+
+## Read the first bytes of a file.
+#  @param path - path to the file
+#  @returns up to FOLLOW_HEAD_BYTES bytes
+def readHead(path):
+	with open(path, "rb") as f:
+		return f.read(FOLLOW_HEAD_BYTES)
+
+## Reads the lines added to a log file since the last poll.
+class LogFollower:
+
+	## constructor
+	#  @param path - path to the log file
+	#  @param maxLines - most lines returned by a poll
+	#  @param maxBytes - most bytes read by a poll, the lines
+	#  before that are skipped
+	def __init__(self, path, maxLines=100000, maxBytes=FOLLOW_MAX_BYTES):
+		self.path = path
+		self.maxLines = maxLines
+		self.maxBytes = maxBytes
+		## offset of the first byte not read yet, always the start of a line
+		self.offset = 0
+		## identity of the file when it was last read
+		self.identity = None
+		## the first bytes of the file when it was last read
+		self.head = b""
+
+	## Read the lines added since the last poll.  The first poll
+	#  reads the end of the file.  The file is read from the start
+	#  again if it was replaced or truncated.
+	#  @returns a (text, notice) pair, text is the new lines and notice
+	#  describes anything that was not shown, or None
+	def poll(self):
+		identity = fileIdentity(self.path)
+		if identity is None:
+			return ("", None)
+
+		notices = []
+		head = readHead(self.path)
+		if self.identity is not None and (identity[:2] != self.identity[:2] or not head.startswith(self.head)):
+			notices.append("log was replaced")
+			self.offset = 0
+		elif identity[2] < self.offset:
+			notices.append("log was truncated")
+			self.offset = 0
+
+		size = identity[2]
+		if size - self.offset > self.maxBytes:
+			start = lineStart(self.path, size - self.maxBytes)
+			if self.identity is None:
+				notices.append("%d earlier bytes not shown" % start)
+			else:
+				notices.append("%d bytes skipped" % (start - self.offset))
+			self.offset = start
+
+		lines = deque(maxlen=self.maxLines)
+		for offset, chunk in readLines(self.path, self.offset):
+			lines.extend(chunk[:-1].split(b"\n"))
+			self.offset = offset + len(chunk)
+		self.identity = identity
+		self.head = head
+
+		text = ""
+		if lines:
+			text = (b"\n".join(lines) + b"\n").decode("utf-8", "replace")
+		return (text, ", ".join(notices) if notices else None)
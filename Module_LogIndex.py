@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+
+## Index of the log levels of a HIVE log file.
+#  @package Module_LogIndex
+#
+#  The line number of every message of each level is kept in a
+#  compact array, so the next error of a multi gigabyte log is
+#  found by a binary search instead of a search of the buffer.
+#  The file is indexed from disk on a background thread and the
+#  index is extended from where it stopped when the file grows.
+
+import bisect
+import os
+import threading
+from array import array
+
+from .Module_LogFile import *
+
+## path -> LogIndex
+LOG_INDEXES = {}
+LOG_INDEXES_LOCK = threading.Lock()
+
+## The line numbers of each log level of a file.
+class LogIndex:
+
+	## Get the index of a file, creating an empty one if there is none.
+	#  @param path - path to the log file
+	#  @returns a LogIndex
+	@staticmethod
+	def forFile(path):
+		path = os.path.abspath(path)
+		with LOG_INDEXES_LOCK:
+			index = LOG_INDEXES.get(path)
+			if index is None:
+				index = LOG_INDEXES[path] = LogIndex(path)
+			return index
+
+	## Drop the index of a file.
+	#  @param path - path to the log file
+	@staticmethod
+	def discard(path):
+		with LOG_INDEXES_LOCK:
+			LOG_INDEXES.pop(os.path.abspath(path), None)
+
+	## constructor
+	#  @param path - path to the log file
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.reset()
+		## True while a background update is running
+		self.updating = False
+
+	## Forget everything indexed so far.
+	def reset(self):
+		with self.lock:
+			## log level -> array of 0 based line numbers
+			self.rows = dict((level, array("q")) for level in LEVELS)
+			## number of bytes indexed, always the end of a line
+			self.offset = 0
+			## number of lines indexed
+			self.lineCount = 0
+			## identity of the file when it was last indexed
+			self.identity = None
+
+	## Index the part of the file that has not been indexed yet.
+	#  The index starts over if the file was replaced or truncated.
+	#  @param progress - optional function called with the fraction of the file indexed
+	#  @returns True if the index changed
+	def update(self, progress=None):
+		identity = fileIdentity(self.path)
+		if identity is None:
+			return False
+
+		if self.identity is not None and (identity[:2] != self.identity[:2] or identity[2] < self.offset):
+			# rotated or truncated, so the lines indexed are gone
+			self.reset()
+
+		size = identity[2]
+		line = self.lineCount
+		changed = False
+		levels = dict((level.encode(), level) for level in LEVELS)
+
+		for offset, chunk in readLines(self.path, self.offset):
+			found = dict((level, []) for level in LEVELS)
+			last = 0
+			for m in LOG_LINE_RE.finditer(chunk):
+				line += chunk.count(b"\n", last, m.start())
+				last = m.start()
+				found[levels[m.group(1)]].append(line)
+			line += chunk.count(b"\n", last)
+
+			with self.lock:
+				for level in LEVELS:
+					self.rows[level].extend(found[level])
+				self.offset = offset + len(chunk)
+				self.lineCount = line
+			changed = True
+
+			if progress is not None and size > 0:
+				progress(min(1.0, float(self.offset) / size))
+
+		with self.lock:
+			self.identity = identity
+		return changed
+
+	## Run update on a background thread unless one is already running.
+	#  @param progress - optional function called with the fraction of the file indexed
+	#  @param onDone - optional function called with the result of update
+	#  @returns True if a thread was started
+	def updateAsync(self, progress=None, onDone=None):
+		with self.lock:
+			if self.updating:
+				return False
+			self.updating = True
+
+		def run():
+			changed = False
+			try:
+				changed = self.update(progress)
+			except Exception as e:
+				print("Exception while indexing HIVE log [%s]. Exception %s" % (self.path, e))
+			finally:
+				with self.lock:
+					self.updating = False
+			if onDone is not None:
+				onDone(changed)
+
+		thread = threading.Thread(target=run, name="HIVE log index")
+		thread.daemon = True
+		thread.start()
+		return True
+
+	## Get the number of lines of each level.
+	#  @returns a dictionary of log level -> count
+	def counts(self):
+		with self.lock:
+			return dict((level, len(rows)) for level, rows in self.rows.items())
+
+	## Find the nearest line of some levels before or after a line.
+	#  @param row - the 0 based line to search from
+	#  @param levels - a string of log levels such as "!#"
+	#  @param forward - True to search after row, False to search before it
+	#  @returns a 0 based line number or -1 if there is none
+	def nearest(self, row, levels, forward=True):
+		best = -1
+		with self.lock:
+			for level in levels:
+				rows = self.rows.get(level)
+				if not rows:
+					continue
+				if forward:
+					i = bisect.bisect_right(rows, row)
+					if i < len(rows) and (best < 0 or rows[i] < best):
+						best = rows[i]
+				else:
+					i = bisect.bisect_left(rows, row) - 1
+					if i >= 0 and rows[i] > best:
+						best = rows[i]
+		return best
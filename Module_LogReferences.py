@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+
+## Index of the source references in a HIVE log file.
+#  @package Module_LogReferences
+#
+#  Every file(line) reference in a log is counted in one pass
+#  over the file, together with the number of errors and warnings
+#  written from it and the worst log level it wrote.  The lines
+#  of each chunk are counted by findall and Counter, so no Python
+#  code runs per line.  The scan holds the GIL throughout, as the
+#  re module does while it matches, so splitting it between threads
+#  would not make it faster and Sublime's plugin host cannot start
+#  processes for it; bench/bench_logs.py measures its throughput.
+
+import collections
+import mmap
+import os
+import re
+
+from .Module_LogFile import *
+
+## index of each log level in LEVELS, the higher the worse
+LEVEL_RANK = dict((level, i) for i, level in enumerate(LEVELS))
+
+## Finds the level and file(line) reference of each log line in a chunk of bytes.
+#  The same lines and groups as LOG_LINE_RE, which tries every line from
+#  its start and keeps the last [level] marker of the line followed by a
+#  file(line) reference.  This one searches from one [ to the next and
+#  the lookahead rejects a marker followed by another on the same line,
+#  which makes the scan about half again as fast.
+REFERENCE_RE = re.compile(br"\[(?![^\n]*\[[SDIAW!#]\][ \t]+[^()\r\n]+\([0-9]+\))([SDIAW!#])\][ \t]+([^()\r\n]+\([0-9]+\))")
+
+## The lines a log wrote from one file(line) reference.
+class LogReference:
+
+	## constructor
+	#  @param ref - the file(line) reference as written in the log
+	def __init__(self, ref):
+		self.ref = ref
+		## number of log lines with the reference
+		self.count = 0
+		## number of error and fatal lines
+		self.errors = 0
+		## number of warning lines
+		self.warnings = 0
+		## the worst log level written, None before the first line
+		self.worst = None
+
+	## Count a log line.
+	#  @param level - the log level of the line
+	#  @param count - number of lines counted at once
+	def add(self, level, count=1):
+		self.count += count
+		if level in "!#":
+			self.errors += count
+		elif level == "W":
+			self.warnings += count
+		if self.worst is None or LEVEL_RANK[level] > LEVEL_RANK[self.worst]:
+			self.worst = level
+
+## Count the (level, file(line) reference) pairs of a log.
+#  Unlike readLines, the last line is counted even without a newline.
+#  @param path - path to the log file
+#  @param chunkSize - approximate number of bytes searched at a time
+#  @returns a Counter of (level, file(line) reference) -> count
+def countReferences(path, chunkSize=CHUNK_SIZE):
+	counts = collections.Counter()
+	with open(path, "rb") as f:
+		size = os.fstat(f.fileno()).st_size
+		if size == 0:
+			return counts
+
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			pos = 0
+			while pos < size:
+				end = min(size, pos + chunkSize)
+				newline = mm.rfind(b"\n", pos, end)
+				if newline < 0 and end < size:
+					# a line longer than a chunk
+					newline = mm.find(b"\n", end)
+				end = size if newline < 0 else newline + 1
+				# the chunk's list of matches is short lived, so memory stays bounded
+				counts.update(REFERENCE_RE.findall(mm, pos, end))
+				pos = end
+		finally:
+			mm.close()
+	return counts
+
+## Count every file(line) reference of a log.
+#  @param path - path to the log file
+#  @returns a list of LogReference sorted by errors, then warnings, then lines
+def scanReferences(path):
+	refs = {}
+	for (level, ref), count in countReferences(path).items():
+		reference = refs.get(ref)
+		if reference is None:
+			reference = refs[ref] = LogReference(ref.decode("utf-8", "replace"))
+		reference.add(level.decode(), count)
+
+	return sorted(refs.values(), key=lambda r: (-r.errors, -r.warnings, -r.count, r.ref))
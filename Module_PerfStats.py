@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+
+## Timing of the completion pipeline.
+#  @package Module_PerfStats
+#
+#  Each stage of a completion request (finding the context,
+#  walking the tags, querying HiveAPIQuery, decoding its output,
+#  building the completion list) is timed and kept in a rolling
+#  histogram per context, so the slow stage can be found from
+#  the percentiles instead of guessed at.
+
+import threading
+import time
+from collections import deque
+
+## A histogram of the most recent durations of something.
+class RollingHistogram:
+
+	## constructor
+	#  @param size - number of recent samples kept
+	def __init__(self, size=512):
+		## recent durations in milliseconds, oldest first
+		self.samples = deque(maxlen=size)
+		## number of samples ever added
+		self.count = 0
+		## longest duration ever added
+		self.maximum = 0.0
+
+	## Add a duration.
+	#  @param ms - the duration in milliseconds
+	def add(self, ms):
+		self.samples.append(ms)
+		self.count += 1
+		if ms > self.maximum:
+			self.maximum = ms
+
+	## Get percentiles of the recent durations.
+	#  @param percents - the percentiles wanted, 0 to 100
+	#  @returns a list of durations in milliseconds, by nearest rank
+	def percentiles(self, percents=(50, 95, 99)):
+		samples = sorted(self.samples)
+		if len(samples) == 0:
+			return [0.0 for p in percents]
+		return [samples[max(0, min(len(samples) - 1, int(p / 100.0 * len(samples) + 0.5) - 1))] for p in percents]
+
+## The stages of one request, timed one after the other.
+class Trace:
+
+	## constructor
+	#  @param stats - the PerfStats the stages are recorded in
+	def __init__(self, stats):
+		self.stats = stats
+		self.start = time.perf_counter()
+		self.last = self.start
+		## (stage, milliseconds) pairs in the order they finished
+		self.stages = []
+		## (stage, milliseconds) pairs recorded with PerfStats.record during the request
+		self.details = []
+
+	## Finish a stage that started when the previous one finished.
+	#  @param stage - name of the stage
+	def mark(self, stage):
+		now = time.perf_counter()
+		self.stages.append((stage, (now - self.last) * 1000.0))
+		self.last = now
+
+	## Finish the request and record its stages.
+	#  @param category - what the request was, such as its completion context
+	#  @returns the total duration in milliseconds
+	def finish(self, category):
+		total = (time.perf_counter() - self.start) * 1000.0
+		self.stats.finishTrace(self, category, total)
+		return total
+
+## Rolling histograms of stage durations, by category and stage.
+class PerfStats:
+
+	## constructor
+	#  @param size - number of recent samples kept for each stage
+	def __init__(self, size=512):
+		self.size = size
+		self.lock = threading.Lock()
+		## (category, stage) -> RollingHistogram
+		self.histograms = {}
+		## requests slower than this many milliseconds are logged, 0 to log nothing
+		self.slowThreshold = 0
+		self.local = threading.local()
+
+	## Start timing a request on this thread.
+	#  @returns a Trace
+	def trace(self):
+		trace = Trace(self)
+		self.local.trace = trace
+		return trace
+
+	## Record the duration of a stage.
+	#  The stage is also added to the request being traced on this thread.
+	#  @param category - what the stage belongs to, such as apiQuery
+	#  @param stage - name of the stage
+	#  @param seconds - the duration
+	def record(self, category, stage, seconds):
+		ms = seconds * 1000.0
+		self.add(category, stage, ms)
+		trace = getattr(self.local, "trace", None)
+		if trace is not None:
+			trace.details.append((category + "." + stage, ms))
+
+	## Add a duration to a histogram.
+	#  @param category - what the stage belongs to
+	#  @param stage - name of the stage
+	#  @param ms - the duration in milliseconds
+	def add(self, category, stage, ms):
+		key = (category, stage)
+		with self.lock:
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				histogram = self.histograms[key] = RollingHistogram(self.size)
+			histogram.add(ms)
+
+	## Record the stages of a finished request.
+	#  Called by Trace.finish.
+	def finishTrace(self, trace, category, total):
+		if getattr(self.local, "trace", None) is trace:
+			self.local.trace = None
+
+		for stage, ms in trace.stages:
+			self.add(category, stage, ms)
+		self.add(category, "total", total)
+
+		if self.slowThreshold > 0 and total >= self.slowThreshold:
+			print("HIVE: slow completion, %.1f ms in %s (%s)" % (total, category,
+				", ".join("%s %.1f ms" % stage for stage in trace.stages + trace.details)))
+
+	## Forget every recorded duration.
+	def clear(self):
+		with self.lock:
+			self.histograms.clear()
+
+	## Get a table of the percentiles of every stage.
+	#  @returns a list of lines of text
+	def report(self):
+		with self.lock:
+			rows = [(key, histogram.count, histogram.percentiles(), histogram.maximum) for key, histogram in self.histograms.items()]
+
+		rows.sort()
+		lines = ["%-40s %8s %10s %10s %10s %10s" % ("stage", "count", "p50 ms", "p95 ms", "p99 ms", "max ms")]
+		for key, count, percentiles, maximum in rows:
+			lines.append("%-40s %8d %10.2f %10.2f %10.2f %10.2f" % ((key[0] + "." + key[1], count) + tuple(percentiles) + (maximum,)))
+		return lines
+
+## The timings of this plugin, shared by the completion listener and DataDictionary
+PERF_STATS = PerfStats()
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+## Result caches for HiveAPIQuery data.
+#  @package Module_QueryCache
+#
+#  A small LRU cache with an entry limit, a memory cap
+#  and an optional time to live, plus a variant that
+#  invalidates itself when the HiveAPIQuery binary changes.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+## Get a signature for a file that changes whenever the file is replaced or rebuilt.
+#  @param path - path to the file
+#  @returns a (path, mtime, size) tuple or None if the file does not exist
+def fileSignature(path):
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (os.path.abspath(path), st.st_mtime, st.st_size)
+
+## A thread safe least recently used cache.
+#  Entries are evicted when there are more than maxEntries of them
+#  or when the sum of their sizes exceeds maxBytes.
+#  Entries older than ttl seconds are treated as missing.
+class LRUCache:
+
+	## constructor
+	#  @param maxEntries - maximum number of entries (0 disables the cache)
+	#  @param maxBytes - maximum total size of the entries (0 for no limit)
+	#  @param ttl - seconds an entry stays valid (0 for no expiry)
+	def __init__(self, maxEntries=512, maxBytes=0, ttl=0):
+		self.maxEntries = maxEntries
+		self.maxBytes = maxBytes
+		self.ttl = ttl
+
+		## key -> (value, size, time stored)
+		self.entries = OrderedDict()
+		## sum of the sizes of all entries
+		self.totalBytes = 0
+		self.lock = threading.Lock()
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	## Look up a key.
+	#  @param key - a hashable key
+	#  @param count - False to leave the lookup out of the hit and miss counters
+	#  @returns a (found, value) pair
+	def lookup(self, key, count=True):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None and self.ttl > 0 and time.time() - entry[2] > self.ttl:
+				self._remove(key)
+				entry = None
+
+			if entry is None:
+				if count:
+					self.misses += 1
+				return (False, None)
+
+			self.entries.move_to_end(key)
+			if count:
+				self.hits += 1
+			return (True, entry[0])
+
+	## Store a value.
+	#  @param key - a hashable key
+	#  @param value - the value to store
+	#  @param size - approximate size of the value in bytes
+	def store(self, key, value, size=0):
+		if self.maxEntries <= 0 or (self.maxBytes > 0 and size > self.maxBytes):
+			return
+
+		with self.lock:
+			if key in self.entries:
+				self._remove(key)
+
+			self.entries[key] = (value, size, time.time())
+			self.totalBytes += size
+
+			while(len(self.entries) > self.maxEntries or (self.maxBytes > 0 and self.totalBytes > self.maxBytes)):
+				self._remove(next(iter(self.entries)))
+				self.evictions += 1
+
+	## Remove a key if it is stored.
+	#  @param key - a hashable key
+	def remove(self, key):
+		with self.lock:
+			if key in self.entries:
+				self._remove(key)
+
+	## Get the number of entries.
+	def __len__(self):
+		with self.lock:
+			return len(self.entries)
+
+	## Remove every entry.  The hit and miss counters are kept.
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.totalBytes = 0
+
+	## Get the cache counters.
+	#  @returns a dictionary of counter names to values
+	def stats(self):
+		with self.lock:
+			lookups = self.hits + self.misses
+			return {
+				"entries" : len(self.entries),
+				"bytes" : self.totalBytes,
+				"hits" : self.hits,
+				"misses" : self.misses,
+				"evictions" : self.evictions,
+				"hit_rate" : (float(self.hits) / lookups) if lookups else 0.0
+			}
+
+	# Must be called with the lock held
+	def _remove(self, key):
+		entry = self.entries.pop(key)
+		self.totalBytes -= entry[1]
+
+## A cache for HiveAPIQuery results that is flushed
+#  whenever the signature of the query binary changes.
+class QueryCache(LRUCache):
+
+	def __init__(self, maxEntries=512, maxBytes=0, ttl=0):
+		LRUCache.__init__(self, maxEntries, maxBytes, ttl)
+		## signature of the binary that produced the cached entries
+		self.signature = None
+		## number of times the cache was flushed because the binary changed
+		self.invalidations = 0
+
+	## Flush the cache if the binary changed since the entries were stored.
+	#  @param signature - the current signature of the binary (see fileSignature)
+	def validate(self, signature):
+		if signature == self.signature:
+			return
+
+		with self.lock:
+			if signature != self.signature:
+				if self.signature is not None:
+					self.invalidations += 1
+				self.signature = signature
+				self.entries.clear()
+				self.totalBytes = 0
+
+	def stats(self):
+		stats = LRUCache.stats(self)
+		stats["invalidations"] = self.invalidations
+		return stats
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+## Sharing of HiveAPIQuery runs between requests.
+#  @package Module_QueryFlights
+#
+#  A query asked for while the same query is already running
+#  waits for that run instead of starting the tool again.  Each
+#  request waiting on a run may be superseded, for example by the
+#  user typing on; once every request waiting on a run has been
+#  superseded the run is told it was abandoned, so it can kill
+#  the HiveAPIQuery process instead of letting it run to its timeout.
+
+import threading
+
+## Raised when every request waiting on a query was superseded.
+class QueryCancelled(Exception):
+	pass
+
+## A query that is running, and the requests waiting on it.
+class QueryFlight:
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+		## isCancelled function of each waiting request, None for requests that are never superseded
+		self.checks = []
+
+## The queries that are running, by key.
+class FlightTable:
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		## key -> QueryFlight
+		self.flights = {}
+
+	## Run a query, or wait for the run of the same query that is in flight.
+	#  @param key - a hashable description of the query
+	#  @param function - a function running the query, taking a function that
+	#  returns True once every request waiting on the run was superseded
+	#  @param isCancelled - a function returning True once the calling request
+	#  was superseded, or None if it never is
+	#  @returns the result of function
+	#  @throws QueryCancelled if the calling request was superseded
+	def run(self, key, function, isCancelled=None):
+		while True:
+			with self.lock:
+				flight = self.flights.get(key)
+				owner = flight is None
+				if owner:
+					flight = self.flights[key] = QueryFlight()
+				flight.checks.append(isCancelled)
+
+			if owner:
+				try:
+					flight.result = function(lambda: self.abandoned(flight))
+				except Exception as e:
+					flight.error = e
+				finally:
+					with self.lock:
+						del self.flights[key]
+					flight.done.set()
+			else:
+				while not flight.done.wait(0.05):
+					if isCancelled is not None and isCancelled():
+						with self.lock:
+							flight.checks.remove(isCancelled)
+						raise QueryCancelled("the request was superseded")
+
+			if isinstance(flight.error, QueryCancelled) and not (isCancelled is not None and isCancelled()):
+				continue #joined a run just as it was abandoned, so run it again
+			if flight.error is not None:
+				raise flight.error
+			return flight.result
+
+	## Check whether every request waiting on a run was superseded.
+	#  @param flight - a QueryFlight
+	#  @returns True or False
+	def abandoned(self, flight):
+		with self.lock:
+			checks = list(flight.checks)
+		return all(check is not None and check() for check in checks)
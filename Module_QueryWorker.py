@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+
+## Long lived HiveAPIQuery process.
+#  @package Module_QueryWorker
+#
+#  Runs the HiveAPIQuery tool once in worker mode and sends it
+#  line delimited JSON requests over stdin.  Each request is
+#  a single line such as
+#    {"id": 7, "query": "channel", "type": "a::b", "channel": "", "value": "", "dis": ""}
+#  and the worker answers each request with a single line of
+#    {"id": 7, "result": [...]}  or  {"id": 7, "error": "message"}
+#  Requests are pipelined: several may be in flight at once and
+#  responses are matched to requests by id, in any order.
+
+import json
+import os
+import subprocess
+import threading
+
+## Raised when a query could not be answered by the worker process.
+class QueryWorkerError(Exception):
+	pass
+
+## A request that has been sent to the worker and is waiting for its response.
+class PendingQuery:
+	def __init__(self, process):
+		## the worker process the request was sent to
+		self.process = process
+		self.done = threading.Event()
+		self.result = None
+		self.size = 0
+		self.error = None
+
+## A HiveAPIQuery process that stays alive between queries.
+#  The process is started on the first query and restarted
+#  after it crashes or stops answering.  If it keeps dying
+#  before answering anything the worker is marked as failed
+#  and callers should fall back to running one process per query.
+class QueryWorker:
+
+	## number of failed starts in a row before the worker gives up
+	MAX_FAILED_STARTS = 3
+
+	## constructor
+	#  @param queryBin - path to the HiveAPIQuery executable
+	#  @param args - arguments that put the executable in worker mode
+	#  @param timeout - seconds to wait for a response before the process is considered hung
+	def __init__(self, queryBin, args=("--serve",), timeout=10):
+		self.queryBin = queryBin
+		self.args = list(args)
+		self.timeout = timeout
+
+		## the worker process or None if it is not running
+		self.process = None
+		## request id -> PendingQuery
+		self.pending = {}
+		self.nextId = 1
+		self.lock = threading.Lock()
+		self.writeLock = threading.Lock()
+
+		## True once the executable has shown it does not support worker mode
+		self.failed = False
+		## starts in a row that ended without a single response
+		self.failedStarts = 0
+		## True once the current process has answered a request
+		self.answered = False
+		## number of times the process was (re)started
+		self.starts = 0
+
+	## Send a query to the worker and wait for the response.
+	#  @param query - Which type of API information to return (type, channel, value, dis)
+	#  @param typ - the --type filter
+	#  @param channel - the --channel filter
+	#  @param value - the --value filter
+	#  @param dis - the --dis filter
+	#  @returns a pair of the decoded results and the length of the response
+	#  @throws QueryWorkerError if the worker could not answer the query
+	def query(self, query, typ="", channel="", value="", dis=""):
+		if self.failed:
+			raise QueryWorkerError("HiveAPIQuery does not support worker mode")
+
+		with self.lock:
+			process = self._ensureStarted()
+			request = PendingQuery(process)
+			requestId = self.nextId
+			self.nextId += 1
+			self.pending[requestId] = request
+
+		line = json.dumps({"id" : requestId, "query" : query, "type" : typ, "channel" : channel, "value" : value, "dis" : dis})
+		try:
+			with self.writeLock:
+				process.stdin.write(line + "\n")
+				process.stdin.flush()
+		except (OSError, ValueError) as e:
+			self._processDied(process)
+			raise QueryWorkerError("Could not send request to HiveAPIQuery worker: %s" % e)
+
+		if not request.done.wait(self.timeout):
+			print("HiveAPIQuery worker did not answer within %s seconds, restarting it" % self.timeout)
+			self._kill(process)
+			self._processDied(process)
+
+		if not request.done.is_set():
+			raise QueryWorkerError("HiveAPIQuery worker did not answer")
+		if request.error is not None:
+			raise QueryWorkerError(request.error)
+
+		return (request.result, request.size)
+
+	## Stop the worker process.  It is started again by the next query.
+	def stop(self):
+		with self.lock:
+			process = self.process
+		if process is not None:
+			self._kill(process)
+			self._processDied(process)
+
+	## Forget that the executable failed to start in worker mode,
+	#  for instance because it has been rebuilt.
+	def reset(self):
+		self.stop()
+		self.failed = False
+		self.failedStarts = 0
+
+	# Must be called with the lock held
+	def _ensureStarted(self):
+		if self.process is not None:
+			if self.process.poll() is None:
+				return self.process
+			# the process exited but its reader has not noticed yet, so
+			# the requests sent to it are failed now rather than left to
+			# wait for their timeout once it is replaced
+			self._failPending(self._detach(self.process))
+			if self.failed:
+				raise QueryWorkerError("HiveAPIQuery does not support worker mode")
+
+		# Hide the console window on Windows
+		startupinfo = None
+		if os.name == "nt":
+			startupinfo = subprocess.STARTUPINFO()
+			startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+		try:
+			process = subprocess.Popen([self.queryBin] + self.args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+				stderr=subprocess.DEVNULL, universal_newlines=True, bufsize=1, startupinfo=startupinfo)
+		except OSError as e:
+			self.failed = True
+			raise QueryWorkerError("Could not start HiveAPIQuery worker: %s" % e)
+
+		self.process = process
+		self.answered = False
+		self.starts += 1
+
+		reader = threading.Thread(target=self._readLoop, args=(process,), name="HiveAPIQuery worker reader")
+		reader.daemon = True
+		reader.start()
+		return process
+
+	# Dispatch responses to the requests waiting for them until the process exits
+	def _readLoop(self, process):
+		try:
+			for line in process.stdout:
+				try:
+					response = json.loads(line)
+					requestId = response["id"]
+				except Exception as e:
+					print("Exception while converting HiveAPIQuery worker response [%s] from JSON. Exception %s" % (line.rstrip(), e))
+					continue
+
+				with self.lock:
+					request = self.pending.pop(requestId, None)
+					if self.process is process:
+						self.answered = True
+						self.failedStarts = 0
+				if request is None:
+					continue #the request timed out and was given up on
+
+				if "error" in response:
+					request.error = "HiveAPIQuery worker error: %s" % response["error"]
+				else:
+					request.result = response.get("result")
+					request.size = len(line)
+				request.done.set()
+		except (OSError, ValueError):
+			pass
+
+		self._processDied(process)
+
+	# Fail every pending request of a process that has exited or was killed
+	def _processDied(self, process):
+		with self.lock:
+			pending = self._detach(process)
+		self._failPending(pending)
+		self._kill(process)
+
+	# Forget a process that has exited or was killed and take its pending requests.
+	# Must be called with the lock held
+	def _detach(self, process):
+		if self.process is process:
+			self.process = None
+			if not self.answered:
+				self.failedStarts += 1
+				if self.failedStarts >= self.MAX_FAILED_STARTS:
+					print("HiveAPIQuery does not seem to support worker mode, running one process per query")
+					self.failed = True
+
+		pending = [requestId for requestId, request in self.pending.items() if request.process is process]
+		return [self.pending.pop(requestId) for requestId in pending]
+
+	def _failPending(self, pending):
+		for request in pending:
+			request.error = "HiveAPIQuery worker exited"
+			request.done.set()
+
+	def _kill(self, process):
+		try:
+			if process.poll() is None:
+				process.kill()
+			process.wait(1)
+		except (OSError, subprocess.TimeoutExpired):
+			pass
+		for stream in (process.stdin, process.stdout):
+			try:
+				stream.close()
+			except (OSError, ValueError):
+				pass
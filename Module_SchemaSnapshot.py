@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+
+## Compiled snapshot of the HIVE API.
+#  @package Module_SchemaSnapshot
+#
+#  Every object type, the channels of each type and the values
+#  of each channel, gathered from the HiveAPIQuery tool once and
+#  saved to a compressed JSON file so later sessions can answer
+#  type, channel and value queries from memory.
+
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+## Version of the snapshot file format.
+#  Files with another version are ignored.
+SNAPSHOT_VERSION = 1
+
+## The object types, channels and channel values of a HiveAPIQuery build.
+class SchemaSnapshot:
+
+	def __init__(self):
+		## signature of the HiveAPIQuery binary the snapshot was built from
+		self.signature = None
+		## sorted list of every object type
+		self.types = []
+		## object type -> list of [channel name, description] pairs
+		self.channels = {}
+		## object type -> channel name -> list of [value, description] pairs
+		self.values = {}
+
+	## Answer a HiveAPIQuery request from the snapshot.
+	#  Takes the same arguments as DataDictionary.apiQuery.
+	#  @returns a (found, results) pair, found is False if the
+	#  snapshot does not contain the answer
+	def lookup(self, query, typ="", channel="", value="", dis=""):
+		if value != "" or dis != "":
+			return (False, None)
+
+		if query == "type" and channel == "":
+			if typ == "":
+				return (True, self.types)
+			return (True, [t for t in self.types if t.startswith(typ)])
+
+		elif query == "channel" and channel == "":
+			if typ in self.channels:
+				return (True, self.channels[typ])
+
+		elif query == "value":
+			channels = self.values.get(typ)
+			if channels is not None and channel in channels:
+				return (True, channels[channel])
+
+		return (False, None)
+
+	## Gather a snapshot from the HiveAPIQuery tool.
+	#  @param runQuery - a function taking the arguments of DataDictionary.apiQuery
+	#  and returning a (results, size) pair like DataDictionary.runQuery
+	#  @param signature - the signature of the HiveAPIQuery binary
+	#  @param threads - number of queries to run at once
+	#  @param progress - optional function called with a status message
+	#  @returns a SchemaSnapshot
+	@staticmethod
+	def build(runQuery, signature, threads=4, progress=None):
+		snapshot = SchemaSnapshot()
+		snapshot.signature = signature
+
+		types = runQuery("type")[0] or []
+		snapshot.types = sorted(set(types))
+
+		lock = threading.Lock()
+		done = [0]
+		total = len(snapshot.types)
+
+		# channels of a type and then the values of each channel
+		def walkType(typ):
+			channels = runQuery("channel", typ)[0]
+			if channels is None:
+				return
+			values = {}
+			for channel in channels:
+				result = runQuery("value", typ, channel[0])[0]
+				if result is not None:
+					values[channel[0]] = result
+
+			with lock:
+				snapshot.channels[typ] = channels
+				snapshot.values[typ] = values
+				done[0] += 1
+				if progress is not None and done[0] % 100 == 0:
+					progress("HIVE: schema snapshot %d of %d types" % (done[0], total))
+
+		def safeWalkType(typ):
+			try:
+				walkType(typ)
+			except Exception as e:
+				print("Exception while reading the HIVE API for type %s. Exception %s" % (typ, e))
+
+		with ThreadPoolExecutor(max(1, threads)) as executor:
+			list(executor.map(safeWalkType, snapshot.types))
+
+		return snapshot
+
+	## Write the snapshot to a compressed JSON file.
+	#  The file is replaced atomically so a reader never sees half a snapshot.
+	#  @param path - the file to write
+	def save(self, path):
+		data = {
+			"version" : SNAPSHOT_VERSION,
+			"signature" : list(self.signature) if self.signature is not None else None,
+			"types" : self.types,
+			"channels" : self.channels,
+			"values" : self.values
+		}
+		tmpPath = path + ".tmp"
+		with gzip.open(tmpPath, "wt", encoding="utf-8") as f:
+			json.dump(data, f, separators=(",", ":"))
+		os.replace(tmpPath, path)
+
+	## Read a snapshot written by save.
+	#  @param path - the file to read
+	#  @returns a SchemaSnapshot or None if the file is missing or has another version
+	@staticmethod
+	def load(path):
+		try:
+			with gzip.open(path, "rt", encoding="utf-8") as f:
+				data = json.load(f)
+		except (OSError, ValueError) as e:
+			if os.path.exists(path):
+				print("Exception while loading HIVE schema snapshot [%s]. Exception %s" % (path, e))
+			return None
+
+		if data.get("version") != SNAPSHOT_VERSION:
+			return None
+
+		snapshot = SchemaSnapshot()
+		if data.get("signature") is not None:
+			snapshot.signature = tuple(data["signature"])
+		snapshot.types = data.get("types", [])
+		snapshot.channels = data.get("channels", {})
+		snapshot.values = data.get("values", {})
+		return snapshot
@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+
+## Index of the source files HIVE logs refer to.
+#  @package Module_SourceIndex
+#
+#  Logs written on build machines name source files by paths
+#  that do not exist here.  Every file under the configured
+#  source roots is indexed by its name, and a reference is
+#  resolved to the indexed file whose path ends with the most
+#  of the reference's directories.  The index is saved between
+#  sessions; updating it only lists the directories that changed.
+
+import gzip
+import json
+import os
+import re
+import stat
+import threading
+
+## Version of the index file format.
+#  Files with another version are ignored.
+SOURCE_INDEX_VERSION = 1
+
+## Split a path into its parts, accepting both kinds of slashes.
+#  @param path - a path
+#  @returns a list of strings
+def splitPath(path):
+	return [part for part in re.split(r"[\\/]+", path) if part not in ("", ".")]
+
+## List a directory without following links to directories.  Python 3.3,
+#  which Sublime Text runs plugins in by default, has no os.scandir,
+#  so os.listdir and os.lstat are used there.
+#  @param directory - path of the directory
+#  @returns a pair of lists of the names of the files and the subdirectories,
+#  without hidden entries such as .git and .svn
+#  @throws OSError if the directory could not be listed
+def listDirectory(directory):
+	files = []
+	subdirs = []
+	if hasattr(os, "scandir"):
+		for e in os.scandir(directory):
+			if e.name.startswith("."):
+				continue
+			if e.is_dir(follow_symlinks=False):
+				subdirs.append(e.name)
+			elif e.is_file():
+				files.append(e.name)
+	else:
+		for name in os.listdir(directory):
+			if name.startswith("."):
+				continue
+			path = os.path.join(directory, name)
+			try:
+				mode = os.lstat(path).st_mode
+			except OSError:
+				continue
+			if stat.S_ISDIR(mode):
+				subdirs.append(name)
+			elif stat.S_ISREG(mode) or (stat.S_ISLNK(mode) and os.path.isfile(path)):
+				files.append(name)
+	return (files, subdirs)
+
+## An index of the files under some directories by file name.
+class SourceIndex:
+
+	## constructor
+	#  @param roots - the directories to index
+	def __init__(self, roots=()):
+		self.lock = threading.Lock()
+		## the directories indexed
+		self.roots = [os.path.abspath(root) for root in roots]
+		## directory -> (mtime, file names, subdirectory names) when it was listed
+		self.dirs = {}
+		## lower case file name -> list of paths
+		self.names = {}
+		## True while a background update is running
+		self.updating = False
+
+	## Change the directories indexed.  Directories already listed
+	#  are kept, so roots that stay are not listed again.
+	#  @param roots - the directories to index
+	#  @returns True if the roots changed
+	def setRoots(self, roots):
+		roots = [os.path.abspath(root) for root in roots]
+		if roots == self.roots:
+			return False
+		self.roots = roots
+		return True
+
+	## Find the file a log refers to.
+	#  @param ref - the path written in the log
+	#  @returns a path or None if no indexed file has the same name
+	def resolve(self, ref):
+		if os.path.isfile(ref):
+			return ref
+
+		parts = [part.lower() for part in splitPath(ref)]
+		if not parts:
+			return None
+
+		with self.lock:
+			candidates = self.names.get(parts[-1], [])
+
+		best = None
+		bestScore = 0
+		for path in candidates:
+			candidate = [part.lower() for part in splitPath(path)]
+			score = 0
+			while score < len(parts) and score < len(candidate) and parts[-1 - score] == candidate[-1 - score]:
+				score += 1
+			if score > bestScore or (score == bestScore and len(path) < len(best)):
+				best = path
+				bestScore = score
+		return best
+
+	## Add a file to the index if it is under one of the roots.
+	#  @param path - path to the file
+	def addFile(self, path):
+		path = os.path.abspath(path)
+		if not any(path.startswith(os.path.join(root, "")) for root in self.roots):
+			return
+
+		with self.lock:
+			paths = self.names.setdefault(os.path.basename(path).lower(), [])
+			if path not in paths:
+				paths.append(path)
+
+	## List the directories under the roots that changed since they
+	#  were last listed and rebuild the file names from them.
+	#  @returns True if the index changed
+	def update(self):
+		dirs = {}
+		changed = False
+		stack = list(self.roots)
+		while stack:
+			directory = stack.pop()
+			if directory in dirs:
+				continue
+			try:
+				mtime = os.stat(directory).st_mtime
+			except OSError:
+				continue
+
+			# a directory's mtime changes when entries are added, removed or renamed
+			entry = self.dirs.get(directory)
+			if entry is None or entry[0] != mtime:
+				try:
+					files, subdirs = listDirectory(directory)
+				except OSError:
+					continue
+				entry = (mtime, files, subdirs)
+				changed = True
+
+			dirs[directory] = entry
+			stack.extend(os.path.join(directory, name) for name in entry[2])
+
+		if not changed and len(dirs) == len(self.dirs):
+			return False
+
+		names = {}
+		for directory, entry in dirs.items():
+			for name in entry[1]:
+				names.setdefault(name.lower(), []).append(os.path.join(directory, name))
+
+		with self.lock:
+			self.dirs = dirs
+			self.names = names
+		return True
+
+	## Run update on a background thread unless one is already running.
+	#  @param onDone - optional function called with the result of update
+	#  @returns True if a thread was started
+	def updateAsync(self, onDone=None):
+		with self.lock:
+			if self.updating:
+				return False
+			self.updating = True
+
+		def run():
+			changed = False
+			try:
+				changed = self.update()
+			except Exception as e:
+				print("Exception while indexing HIVE sources. Exception %s" % e)
+			finally:
+				with self.lock:
+					self.updating = False
+			if onDone is not None:
+				onDone(changed)
+
+		thread = threading.Thread(target=run, name="HIVE source index")
+		thread.daemon = True
+		thread.start()
+		return True
+
+	## Get the number of files indexed.
+	def __len__(self):
+		with self.lock:
+			return sum(len(paths) for paths in self.names.values())
+
+	## Write the listed directories to a compressed JSON file.
+	#  The file is replaced atomically so a reader never sees half an index.
+	#  @param path - the file to write
+	def save(self, path):
+		with self.lock:
+			data = {
+				"version" : SOURCE_INDEX_VERSION,
+				"dirs" : dict((directory, list(entry)) for directory, entry in self.dirs.items())
+			}
+		tmpPath = path + ".tmp"
+		with gzip.open(tmpPath, "wt", encoding="utf-8") as f:
+			json.dump(data, f, separators=(",", ":"))
+		os.replace(tmpPath, path)
+
+	## Read the directories listed by an earlier session.
+	#  The next update only lists the ones that changed since.
+	#  @param path - the file written by save
+	#  @returns True if the file was read
+	def load(self, path):
+		try:
+			with gzip.open(path, "rt", encoding="utf-8") as f:
+				data = json.load(f)
+		except (OSError, ValueError) as e:
+			if os.path.exists(path):
+				print("Exception while loading HIVE source index [%s]. Exception %s" % (path, e))
+			return False
+
+		if data.get("version") != SOURCE_INDEX_VERSION:
+			return False
+
+		dirs = dict((directory, tuple(entry)) for directory, entry in data.get("dirs", {}).items())
+		names = {}
+		for directory, entry in dirs.items():
+			if any(directory == root or directory.startswith(os.path.join(root, "")) for root in self.roots):
+				for name in entry[1]:
+					names.setdefault(name.lower(), []).append(os.path.join(directory, name))
+
+		with self.lock:
+			self.dirs = dirs
+			self.names = names
+		return True
@@ -0,0 +1,508 @@
+#!/usr/bin/python3
+
+## Index of the tags in a view.
+#  @package Module_TagIndex
+#
+#  Keeps the offsets of every tag in a buffer so that
+#  XMLTagIterator does not search the whole buffer for
+#  each completion.  The index is updated from text change
+#  notifications by re-scanning only the edited span and
+#  shifting the tags after it.  If a change is missed the
+#  index is rebuilt the next time it is used.
+
+import bisect
+import re
+from array import array
+
+import sublime
+
+## Same expression XMLTagIterator used with view.find_all:
+#  comment tags and tags, non greedy
+TAGS_RE = re.compile(r"<!--[\s\S]*?-->|<[\s\S]*?>")
+
+## buffer id -> TagIndex
+TAG_INDEXES = {}
+
+## most edits kept for takeChanges before they are treated as lost
+MAX_CHANGES = 1024
+
+#tag kinds
+
+## an opening tag such as <object type="a">
+TAG_OPEN = 0
+## an ending tag such as </object>
+TAG_CLOSE = 1
+## a stand alone tag such as <param name="a"/>
+TAG_SELF_CLOSING = 2
+## a comment tag
+TAG_COMMENT = 3
+## a processing instruction tag such as <?xml version="1.0"?>
+TAG_PI = 4
+## a CDATA section such as <![CDATA[text]]>
+TAG_CDATA = 5
+
+## Split a tag into tokens the way the autocompletion plugin always has.
+#  @param tagText - the text of a tag
+#  @returns a list of strings
+def tokenizeTag(tagText):
+	return tagText.replace('=', ' = ').replace('<', ' < ').replace('\"', ' \" ').replace('/', ' / ').replace('>', ' > ').split()
+
+## Work out the kind of a tag from its text.
+#  @param tagText - the text of a tag
+#  @returns one of the TAG_ constants
+def classifyTag(tagText):
+	if tagText.startswith("<!--"):
+		return TAG_COMMENT
+	if tagText.startswith("<?"):
+		return TAG_PI
+	if tagText.startswith("<![CDATA["):
+		return TAG_CDATA
+	if tagText[:-1].rstrip().endswith("/"):
+		return TAG_SELF_CLOSING
+	if tagText[1:].lstrip().startswith("/"):
+		return TAG_CLOSE
+	return TAG_OPEN
+
+## Get the element name of a tag.
+#  @param kind - the kind of the tag
+#  @param tagText - the text of the tag
+#  @returns a string, or None for comments, processing instructions and CDATA sections
+def tagName(kind, tagText):
+	if kind == TAG_OPEN or kind == TAG_SELF_CLOSING:
+		return tokenizeTag(tagText)[1]
+	if kind == TAG_CLOSE:
+		return tokenizeTag(tagText)[2]
+	return None
+
+## Reduce a run of tags to what it does to the nesting of the tags
+#  around it, cancelling each opening tag directly followed by an ending
+#  tag of the same name, which both ways of walking the tags step over.
+#  @param kinds - the kinds of the tags
+#  @param names - the names of the tags
+#  @returns a list of (kind, name) pairs of the opening and ending tags left
+def reduceNesting(kinds, names):
+	left = []
+	for kind, name in zip(kinds, names):
+		if kind == TAG_CLOSE and left and left[-1] == (TAG_OPEN, name):
+			left.pop()
+		elif kind == TAG_OPEN or kind == TAG_CLOSE:
+			left.append((kind, name))
+	return left
+
+## Check for a "<!--" tag that TAGS_RE ended at a ">" because no "-->" follows it.
+#  @param tagText - the text of a tag
+#  @returns True or False
+def isUnclosedComment(tagText):
+	return tagText.startswith("<!--") and (len(tagText) < 7 or not tagText.endswith("-->"))
+
+## Offsets and kinds of the tags in a buffer.
+#  Tag i spans [starts[i], ends[i]) and is of kind kinds[i].
+class TagIndex:
+
+	## number of characters read at a time while re-scanning after an edit
+	CHUNK_SIZE = 65536
+
+	## Get the up to date tag index of a view's buffer.
+	#  @param view - a sublime view object
+	#  @returns a TagIndex
+	@staticmethod
+	def forView(view):
+		index = TAG_INDEXES.get(view.buffer_id())
+		if index is None:
+			index = TAG_INDEXES[view.buffer_id()] = TagIndex(view)
+		index.view = view
+		index.ensure()
+		return index
+
+	## Drop the tag index of a view's buffer.
+	#  @param view - a sublime view object
+	@staticmethod
+	def discard(view):
+		TAG_INDEXES.pop(view.buffer_id(), None)
+
+	## constructor
+	#  @param view - a sublime view object
+	def __init__(self, view):
+		self.view = view
+		self.starts = array("q")
+		self.ends = array("q")
+		## kind of each tag (TAG_OPEN, TAG_CLOSE, ...), worked out when the tag is scanned
+		self.kinds = array("b")
+		## change count of the view when the index was last brought up to date, -1 if never
+		self.changeCount = -1
+		## size of the buffer the index describes
+		self.size = 0
+		## increased every time the tags change
+		self.version = 0
+		## start of the first "<!--" tag without a "-->", or -1.
+		#  Such a tag ends at the next ">" only because there is no "-->"
+		#  after it, so an edit adding a "-->" anywhere later changes it.
+		self.unclosedComment = -1
+
+		# The nesting structure is computed by a single forward pass over the
+		# tags, which is only run as far as a query needs and is cut back to
+		# the first re-scanned tag after an edit.  Each array has one entry per
+		# tag that the pass has reached.
+
+		## element name of each tag, None for comments, processing instructions and CDATA sections
+		self.names = []
+		## parent of the position after each tag, -1 for none.
+		#  The parent of tag i is scopes[i - 1].
+		self.scopes = array("q")
+		## ending tag of each opening tag, -1 if none has been found yet,
+		#  and opening tag of each ending tag, -1 if it has none
+		self.matches = array("q")
+		## top of the stack of opening tags after each tag, -1 for none
+		self.tops = array("q")
+		## top of the stack of opening tags before each opening tag was pushed
+		self.below = array("q")
+
+		## edits re-scanned since takeChanges was last called, see rescan
+		self.changes = []
+		## True if the buffer was scanned again from scratch since takeChanges was last called
+		self.changesLost = True
+
+	def __len__(self):
+		return len(self.starts)
+
+	## Rebuild the index if the view changed without it being told.
+	def ensure(self):
+		if self.changeCount != self.view.change_count():
+			self.rebuild()
+
+	## Scan the whole buffer for tags.
+	def rebuild(self):
+		text = self.view.substr(sublime.Region(0, self.view.size()))
+		self.starts = array("q")
+		self.ends = array("q")
+		self.kinds = array("b")
+		self.unclosedComment = -1
+		for m in TAGS_RE.finditer(text):
+			tagText = m.group()
+			self.starts.append(m.start())
+			self.ends.append(m.end())
+			self.kinds.append(classifyTag(tagText))
+			if self.unclosedComment < 0 and isUnclosedComment(tagText):
+				self.unclosedComment = m.start()
+
+		self.size = len(text)
+		self.changeCount = self.view.change_count()
+		self.version += 1
+		self.truncateStructure(0)
+		self.changes = []
+		self.changesLost = True
+
+	## Get the edits re-scanned since the last call.
+	#  @returns a (changes, lost) pair, changes is a list of (start, end, delta, nesting)
+	#  tuples in the order they were made: the tags between start and end of the text
+	#  before the edit were scanned again, the text after end moved by delta characters,
+	#  and nesting is True if the edit changed how the tags after it nest.
+	#  lost is True if the whole buffer was scanned again since the last call,
+	#  in which case changes does not describe everything that changed
+	def takeChanges(self):
+		changes = self.changes
+		lost = self.changesLost
+		self.changes = []
+		self.changesLost = False
+		return (changes, lost)
+
+	## Bring the index up to date after edits.
+	#  Each change replaced the old text between begin and end by
+	#  length characters, and changes are in the order they were made.
+	#  @param changes - a list of (begin, end, length) tuples
+	def applyChanges(self, changes):
+		if len(changes) == 0:
+			return
+
+		# merge the changes into one span: [lo, hiOld) of the old text
+		# became [lo, hiNew) of the new text
+		lo, hiOld, length = changes[0]
+		hiNew = lo + length
+		for begin, end, length in changes[1:]:
+			if end > hiNew:
+				hiOld += end - hiNew
+				hiNew = end
+			lo = min(lo, begin)
+			hiNew += length - (end - begin)
+
+		delta = hiNew - hiOld
+		if self.changeCount < 0 or self.size + delta != self.view.size():
+			# the index does not describe the text before these changes
+			self.changeCount = -1
+			return
+
+		self.rescan(lo, hiOld, hiNew)
+		self.size = self.view.size()
+		self.changeCount = self.view.change_count()
+		self.version += 1
+
+	## Re-scan the tags around an edit and shift the tags after it.
+	#  @param lo - where the edit starts
+	#  @param hiOld - where the edit ended in the old text
+	#  @param hiNew - where the edit ends in the new text
+	def rescan(self, lo, hiOld, hiNew):
+		delta = hiNew - hiOld
+		size = self.view.size()
+
+		if 0 <= self.unclosedComment < lo:
+			window = self.view.substr(sublime.Region(max(0, lo - 2), min(size, hiNew + 2)))
+			if "-->" in window:
+				# every "<!--" tag after the first unclosed one may now be closed,
+				# which is rare enough to simply scan everything again
+				self.rebuild()
+				return
+
+		# tags ending before the edit are unchanged, and scanning can
+		# resume where the last of them ends
+		keep = bisect.bisect_right(self.ends, lo)
+		pos = self.ends[keep - 1] if keep > 0 else 0
+		scanStart = pos
+
+		newStarts = array("q")
+		newEnds = array("q")
+		newKinds = array("b")
+		newTexts = []
+		newUnclosed = -1
+		resume = len(self.starts) #first old tag that is still valid after the edit
+
+		chunk = self.CHUNK_SIZE
+		synced = False
+		while not synced and pos < size:
+			windowEnd = min(size, max(pos + chunk, hiNew + chunk))
+			text = self.view.substr(sublime.Region(pos, windowEnd))
+			atEnd = windowEnd == size
+
+			scanned = -1
+			for m in TAGS_RE.finditer(text):
+				# a match touching the end of the window could continue past it
+				if not atEnd and (m.end() == len(text) or isUnclosedComment(m.group())):
+					break
+
+				start = pos + m.start()
+				end = pos + m.end()
+				scanned = m.end()
+
+				if start >= hiNew:
+					# past the edit the text is the same as before, so once a
+					# tag lines up with an old tag the rest of the old tags are valid
+					j = bisect.bisect_left(self.starts, start - delta, keep)
+					if j < len(self.starts) and self.starts[j] == start - delta and self.ends[j] == end - delta:
+						resume = j
+						synced = True
+						break
+
+				tagText = m.group()
+				newStarts.append(start)
+				newEnds.append(end)
+				newKinds.append(classifyTag(tagText))
+				newTexts.append(tagText)
+				if newUnclosed < 0 and isUnclosedComment(tagText):
+					newUnclosed = start
+
+			if not synced:
+				if atEnd:
+					break
+				if scanned >= 0:
+					pos += scanned
+				elif "<" in text:
+					# a tag starts in the window but does not end in it
+					pos += text.index("<")
+					chunk *= 2
+				else:
+					pos = windowEnd
+
+		# the tags from scanStart to scanEnd of the old text were replaced;
+		# the tags after them nest differently unless the replaced and the
+		# new tags open and end the same tags once matched pairs are left out
+		scanEnd = max(hiOld, self.ends[resume - 1] if resume > keep else scanStart)
+		newNames = [tagName(newKinds[k], newTexts[k]) for k in range(len(newKinds))]
+		oldKinds = self.kinds[keep:resume]
+		if len(self.scopes) >= resume:
+			nesting = reduceNesting(oldKinds, self.names[keep:resume]) != reduceNesting(newKinds, newNames)
+		else:
+			# the names of the replaced tags are not known
+			nesting = any(kind == TAG_OPEN or kind == TAG_CLOSE for kind in oldKinds + newKinds)
+		if len(self.changes) < MAX_CHANGES:
+			self.changes.append((scanStart, scanEnd, delta, nesting))
+		else:
+			self.changes = []
+			self.changesLost = True
+
+		lostUnclosed = False
+		if 0 <= self.unclosedComment < scanStart:
+			pass #it was before the re-scanned span
+		elif newUnclosed >= 0:
+			self.unclosedComment = newUnclosed
+		elif self.unclosedComment < 0:
+			pass #the edit did not leave a comment unclosed
+		elif resume < len(self.starts) and self.unclosedComment >= self.starts[resume]:
+			self.unclosedComment += delta
+		else:
+			# the unclosed comment was edited away and the next one
+			# is somewhere in the tags after the edit
+			lostUnclosed = True
+
+		tailStarts = self.starts[resume:]
+		tailEnds = self.ends[resume:]
+		if delta != 0:
+			tailStarts = array("q", [s + delta for s in tailStarts])
+			tailEnds = array("q", [e + delta for e in tailEnds])
+
+		self.starts = self.starts[:keep] + newStarts + tailStarts
+		self.ends = self.ends[:keep] + newEnds + tailEnds
+		# the nesting structure is still valid if the re-scanned tags
+		# are of the same kinds and have the same names as the old ones
+		sameStructure = len(self.scopes) >= resume and newKinds == oldKinds and \
+			self.names[keep:resume] == newNames
+
+		self.kinds = self.kinds[:keep] + newKinds + self.kinds[resume:]
+		if not sameStructure:
+			self.truncateStructure(keep)
+
+		if lostUnclosed:
+			self.rebuild()
+
+	## Find the tag at a location.
+	#  @param location - an integer index into the view
+	#  @returns the index of the tag containing location, or of the closest
+	#  tag to the right of it, or len(self) if there is no such tag
+	def find(self, location):
+		i = bisect.bisect_right(self.starts, location) - 1
+		if i < 0:
+			return 0
+		if self.ends[i] >= location:
+			return i
+		return i + 1
+
+	## Get the region of a tag.
+	#  @param i - index of the tag
+	#  @returns a sublime region
+	def region(self, i):
+		return sublime.Region(self.starts[i], self.ends[i])
+
+	## Get the kind of a tag.
+	#  @param i - index of the tag
+	#  @returns one of the TAG_ constants
+	def kindOf(self, i):
+		return self.kinds[i]
+
+	## Get the element name of a tag.
+	#  @param i - index of the tag
+	#  @returns a string, or None for comments, processing instructions and CDATA sections
+	def nameOf(self, i):
+		self.extendStructure(i + 1)
+		return self.names[i]
+
+	## Get the tag governing a position in the tag list.
+	#  @param i - index of a tag, or len(self) for the end of the buffer
+	#  @returns the index of the innermost opening tag that is still
+	#  open before tag i, or -1 if there is none
+	def parentOf(self, i):
+		if i <= 0:
+			return -1
+		self.extendStructure(i)
+		return self.scopes[i - 1]
+
+	## Get the ending tag of an opening tag.
+	#  @param i - index of an opening tag
+	#  @param within - optional number of tags after the opening tag to look in
+	#  @returns the index of the matching ending tag, or -1 if there is none
+	#  or none within the given number of tags
+	def closingOf(self, i, within=None):
+		limit = len(self.starts) if within is None else min(len(self.starts), i + 1 + within)
+		self.extendStructure(i + 1)
+		step = 256
+		while self.matches[i] < 0 and len(self.scopes) < limit:
+			self.extendStructure(min(limit, len(self.scopes) + step))
+			step *= 2
+		return self.matches[i]
+
+	## Run the nesting pass up to a tag.
+	#  Comment, processing instruction and CDATA tags are skipped and stand
+	#  alone tags do not nest.  Otherwise the tags are matched the way the
+	#  tag-by-tag walks of XMLTagIterator matched them, which differ on
+	#  documents that are not well formed:
+	#  - the parent of a tag is found walking backwards, where an ending
+	#    tag is matched with the nearest earlier opening tag of the same
+	#    name that is not inside another matched pair, and
+	#  - the ending tag of an opening tag is found walking forwards, where
+	#    an ending tag closes the innermost opening tag after it whatever
+	#    its name, but only removes it from the stack of open tags if the
+	#    names are the same.
+	#  @param upTo - number of tags that must have been processed
+	def extendStructure(self, upTo):
+		first = len(self.scopes)
+		upTo = min(upTo, len(self.starts))
+		if upTo <= first:
+			return
+
+		base = self.starts[first]
+		text = self.view.substr(sublime.Region(base, self.ends[upTo - 1]))
+
+		kinds = self.kinds
+		names = self.names
+		scopes = self.scopes
+		matches = self.matches
+		tops = self.tops
+		below = self.below
+		top = tops[first - 1] if first > 0 else -1
+		for i in range(first, upTo):
+			kind = kinds[i]
+			name = tagName(kind, text[self.starts[i] - base:self.ends[i] - base])
+			names.append(name)
+
+			if kind == TAG_OPEN:
+				matches.append(-1)
+				below.append(top)
+				top = i
+				scopes.append(i)
+			elif kind == TAG_CLOSE:
+				if top >= 0:
+					if matches[top] < 0:
+						matches[top] = i
+					if names[top] == name:
+						top = below[top]
+
+				# walk back over the earlier tags, jumping over matched pairs
+				opening = -1
+				j = i - 1
+				while j >= 0:
+					k = kinds[j]
+					if k == TAG_CLOSE:
+						if matches[j] < 0:
+							break #an ending tag without an opening tag hides every earlier tag
+						j = matches[j] - 1
+					elif k == TAG_OPEN and names[j] == name:
+						opening = j
+						break
+					else:
+						j -= 1
+
+				matches.append(opening)
+				below.append(-1)
+				scopes.append(scopes[opening - 1] if opening > 0 else -1)
+			else:
+				matches.append(-1)
+				below.append(-1)
+				scopes.append(scopes[i - 1] if i > 0 else -1)
+
+			tops.append(top)
+
+	## Forget the nesting structure from a tag onwards.
+	#  @param keep - number of tags whose structure is still valid
+	def truncateStructure(self, keep):
+		if keep >= len(self.scopes):
+			return
+
+		# opening tags still on the stack at the cut may be closed by a later tag
+		top = self.tops[keep - 1] if keep > 0 else -1
+		while top >= 0:
+			if self.matches[top] >= keep:
+				self.matches[top] = -1
+			top = self.below[top]
+
+		del self.names[keep:]
+		del self.scopes[keep:]
+		del self.matches[keep:]
+		del self.tops[keep:]
+		del self.below[keep:]
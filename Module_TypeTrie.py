@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+## Trie of HIVE object types.
+#  @package Module_TypeTrie
+#
+#  HIVE object types are namespaced with :: (a::b::c).
+#  The trie has one node per namespace segment so the
+#  completions for a namespace prefix are found by walking
+#  the segments of the prefix instead of filtering every type.
+
+## A node of the type trie.
+class TypeTrieNode:
+
+	__slots__ = ("children", "terminal", "completions")
+
+	def __init__(self):
+		## segment -> TypeTrieNode
+		self.children = {}
+		## True if the path to this node is an object type
+		self.terminal = False
+		## sorted tuple of the types below this node relative to it, built on first use
+		self.completions = None
+
+	## Get the types below this node with the path to the node removed.
+	#  @returns a sorted tuple of strings
+	def getCompletions(self):
+		if self.completions is None:
+			completions = []
+			for segment, child in self.children.items():
+				if child.terminal:
+					completions.append(segment)
+				for rest in child.getCompletions():
+					completions.append(segment + "::" + rest)
+			completions.sort()
+			self.completions = tuple(completions)
+
+		return self.completions
+
+## A trie of object types keyed by :: separated segments.
+class TypeTrie:
+
+	## constructor
+	#  @param types - an iterable of object type strings
+	def __init__(self, types=()):
+		self.root = TypeTrieNode()
+		self.size = 0
+		for typ in types:
+			self.add(typ)
+
+	## Add an object type to the trie.
+	#  @param typ - a string such as a::b::c
+	def add(self, typ):
+		node = self.root
+		for segment in typ.split("::"):
+			child = node.children.get(segment)
+			if child is None:
+				child = node.children[segment] = TypeTrieNode()
+			node.completions = None
+			node = child
+
+		if not node.terminal:
+			node.terminal = True
+			self.size += 1
+
+	## Get the object types starting with a prefix, with the prefix removed.
+	#  @param prefix - the start of an object type, usually ending with ::
+	#  @returns a sorted sequence of strings
+	def complete(self, prefix=""):
+		segments = prefix.split("::")
+		partial = segments.pop()
+
+		node = self.root
+		for segment in segments:
+			node = node.children.get(segment)
+			if node is None:
+				return ()
+
+		if partial == "":
+			return node.getCompletions()
+
+		# the last segment has only been partly typed
+		completions = []
+		for segment, child in node.children.items():
+			if segment.startswith(partial):
+				tail = segment[len(partial):]
+				if child.terminal:
+					completions.append(tail)
+				for rest in child.getCompletions():
+					completions.append(tail + "::" + rest)
+		completions.sort()
+		return completions
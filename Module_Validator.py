@@ -0,0 +1,320 @@
+#!/usr/bin/python3
+
+## Validation of HIVE files against the schema.
+#  @package Module_Validator
+#
+#  Finds elements that are not allowed where they are, attributes
+#  an element does not have, params the parent object type does not
+#  have and values outside a param's enumeration.  Params and values
+#  are only checked against schema data that is already cached, so
+#  validating never runs the HiveAPIQuery tool.
+#
+#  A whole file is checked from a copy of its text on a background
+#  thread.  After an edit only the tags the TagIndex scanned again,
+#  and the tags inside them, are checked again.
+
+import bisect
+import re
+from array import array
+
+import sublime
+from .Module_QueryCache import fileSignature
+from .Module_TagIndex import *
+
+## most tags checked again after an edit; when an edit needs more, such as
+#  an edit of the opening tag of an object holding most of the file,
+#  the whole file is checked in the background instead
+MAX_INCREMENTAL_TAGS = 500
+
+## Finds the quoted attributes of a tag, group 1 is the name and group 2 the value
+ATTRIBUTE_RE = re.compile(r'([^\s/<>"=]+)\s*=\s*"([^"]*)"')
+
+## Find the value of the last attribute with a name in a tag.
+#  @param tagText - the text of the tag
+#  @param attribute - the name of the attribute
+#  @returns a (start, end) pair of offsets into tagText
+def attributeSpan(tagText, attribute):
+	span = (0, 0)
+	for m in ATTRIBUTE_RE.finditer(tagText):
+		if m.group(1) == attribute:
+			span = m.span(2)
+	return span
+
+## Holds the text of a view so a TagIndex can be built from it off the main thread.
+class TextSnapshot:
+
+	## constructor
+	#  @param text - the text of the view
+	#  @param changeCount - the change count of the view when the text was read
+	def __init__(self, text, changeCount):
+		self.text = text
+		self.changeCount = changeCount
+
+	def substr(self, region):
+		return self.text[region.begin():region.end()]
+
+	def size(self):
+		return len(self.text)
+
+	def change_count(self):
+		return self.changeCount
+
+## Checks tags against the schema.  Schema lookups are remembered
+#  for the life of the object, so make a new one for each check.
+class TagChecker:
+
+	## constructor
+	#  @param dd - a DataDictionary
+	def __init__(self, dd):
+		self.dd = dd
+		## params and values can only be checked if the HiveAPIQuery binary exists,
+		#  apiQuery prints a message for every call otherwise
+		self.useQueries = dd is not None and fileSignature(dd.queryBin) is not None
+		## object type -> set of param names, or None if not cached
+		self.channels = {}
+		## (object type, param name) -> set of values, or None if not cached or not an enumeration
+		self.values = {}
+		## tag index -> object type of the tag
+		self.types = {}
+
+	## Get the param names of an object type if they are cached.
+	#  @param objectType - an object type
+	#  @returns a set of strings or None
+	def channelNames(self, objectType):
+		if objectType not in self.channels:
+			results = self.dd.apiQuery("channel", objectType, block=False, record=False) if self.useQueries else None
+			self.channels[objectType] = set(c[0] for c in results) if results else None
+		return self.channels[objectType]
+
+	## Get the values a param may have if they are cached and are an enumeration.
+	#  @param objectType - the object type of the param's parent
+	#  @param paramName - the name of the param
+	#  @returns a set of strings or None
+	def valueNames(self, objectType, paramName):
+		key = (objectType, paramName)
+		if key not in self.values:
+			results = None
+			if self.useQueries and paramName != "disEnumeration":
+				results = self.dd.apiQuery("value", objectType, paramName, block=False, record=False)
+			self.values[key] = set(str(v[0]) for v in results) if results else None
+		return self.values[key]
+
+	## Get the value of the type attribute of an object tag.
+	#  @param index - the TagIndex
+	#  @param i - index of the tag
+	#  @returns a string or None
+	def objectType(self, index, i):
+		if i not in self.types:
+			objectType = None
+			for m in ATTRIBUTE_RE.finditer(index.view.substr(index.region(i))):
+				if m.group(1) == "type":
+					objectType = m.group(2)
+					break
+			self.types[i] = objectType
+		return self.types[i]
+
+	## Check a range of tags.
+	#  @param index - the TagIndex of the text
+	#  @param first - index of the first tag to check
+	#  @param last - index after the last tag to check
+	#  @returns a list of (start, end, message) problems sorted by start
+	def check(self, index, first, last):
+		problems = []
+		if first >= last:
+			return problems
+
+		elements = self.dd.elements if self.dd is not None else None
+		if not elements:
+			return problems
+
+		index.extendStructure(last)
+		names = index.names
+		scopes = index.scopes
+		kinds = index.kinds
+		base = index.starts[first]
+		text = index.view.substr(sublime.Region(base, index.ends[last - 1]))
+		for i in range(first, last):
+			kind = kinds[i]
+			if kind != TAG_OPEN and kind != TAG_SELF_CLOSING:
+				continue
+
+			start = index.starts[i]
+			tagText = text[start - base:index.ends[i] - base]
+			name = names[i]
+			nameStart = start + tagText.find(name)
+
+			parent = scopes[i - 1] if i > 0 else -1
+			parentName = names[parent] if parent >= 0 else "root"
+			if parentName in elements and name not in elements[parentName][0]:
+				problems.append((nameStart, nameStart + len(name), "<%s> is not allowed in <%s>" % (name, parentName)))
+
+			# the attributes are located again only for the tags with a problem
+			attributes = elements[name][1] if name in elements else None
+			found = ATTRIBUTE_RE.findall(tagText)
+			if attributes and any(a not in attributes for a, v in found):
+				for a in ATTRIBUTE_RE.finditer(tagText):
+					if a.group(1) not in attributes:
+						problems.append((start + a.start(1), start + a.end(1), "<%s> has no %s attribute" % (name, a.group(1))))
+
+			if name != "param" or parentName != "object":
+				continue
+
+			objectType = self.objectType(index, parent)
+			if objectType is None:
+				continue
+			params = dict(found)
+			paramName = params.get("name")
+			if paramName is None:
+				continue
+
+			channels = self.channelNames(objectType)
+			if channels is not None and paramName not in channels:
+				s0, s1 = attributeSpan(tagText, "name")
+				problems.append((start + s0, start + s1, "%s has no param named %s" % (objectType, paramName)))
+				continue
+
+			value = params.get("value")
+			if value is None:
+				continue
+			values = self.valueNames(objectType, paramName)
+			if values is not None and value not in values:
+				s0, s1 = attributeSpan(tagText, "value")
+				problems.append((start + s0, start + s1, "%s is not a value of %s" % (value, paramName)))
+
+		problems.sort()
+		return problems
+
+## Check the whole text of a view.
+#  @param dd - a DataDictionary
+#  @param snapshot - a TextSnapshot of the view
+#  @returns a (problems, index) pair, index is the TagIndex built from the snapshot
+def validateText(dd, snapshot):
+	index = TagIndex(snapshot)
+	index.rebuild()
+	index.takeChanges()
+	return (TagChecker(dd).check(index, 0, len(index)), index)
+
+## The problems found in a view, kept up to date as it is edited.
+#  The problems are kept in parallel arrays rather than a list of
+#  tuples, so moving thousands of them after each keystroke does not
+#  allocate objects the garbage collector has to track.
+class ViewValidation:
+
+	def __init__(self):
+		## sorted start of each problem
+		self.starts = array("q")
+		## end of each problem
+		self.ends = array("q")
+		## message of each problem
+		self.messages = []
+		## at least the length of the longest problem, so the problems at a point can be found by bisection
+		self.longest = 0
+		## change count of the view the problems describe, -1 if they describe nothing
+		self.changeCount = -1
+		## True while a whole file check runs in the background
+		self.running = False
+
+	## Replace the problems.
+	#  @param problems - a list of (start, end, message) sorted by start
+	#  @param changeCount - change count of the view the problems describe
+	def setProblems(self, problems, changeCount):
+		self.starts = array("q", [p[0] for p in problems])
+		self.ends = array("q", [p[1] for p in problems])
+		self.messages = [p[2] for p in problems]
+		self.longest = max([p[1] - p[0] for p in problems] or [0])
+		self.changeCount = changeCount
+
+	## Get the problems.
+	#  @returns a list of (start, end, message) sorted by start
+	def problems(self):
+		return list(zip(self.starts, self.ends, self.messages))
+
+	## Check again only the tags changed by the edits a TagIndex re-scanned.
+	#  @param dd - a DataDictionary
+	#  @param index - the up to date TagIndex of the view
+	#  @returns False if the problems could not be brought up to date this way
+	def update(self, dd, index):
+		changes, lost = index.takeChanges()
+		if lost or self.changeCount < 0:
+			return False
+		if any(change[3] for change in changes):
+			return False #the nesting of every later tag may have changed
+
+		# move the spans still to check along with each edit
+		spans = []
+		for start, end, delta, nesting in changes:
+			spanStart = start
+			spanEnd = end + delta
+			kept = []
+			for s0, s1 in spans:
+				if s1 < start:
+					kept.append((s0, s1))
+				elif s0 > end:
+					kept.append((s0 + delta, s1 + delta))
+				else:
+					spanStart = min(spanStart, s0)
+					spanEnd = max(spanEnd, s1 + delta)
+			kept.append((spanStart, spanEnd))
+			spans = kept
+
+		# the tags to check again: the changed tags, and the tags inside the
+		# changed opening tags, since the params of an object depend on its type
+		ranges = []
+		count = 0
+		for spanStart, spanEnd in spans:
+			first = bisect.bisect_right(index.ends, spanStart)
+			last = bisect.bisect_left(index.starts, spanEnd)
+			if last > len(index.scopes) + MAX_INCREMENTAL_TAGS:
+				return False #the nesting pass would have to run over much of the file
+			end = last
+			for i in range(first, last):
+				if index.kinds[i] == TAG_OPEN:
+					closing = index.closingOf(i, MAX_INCREMENTAL_TAGS)
+					end = max(end, closing + 1 if closing >= 0 else len(index))
+			if first < end:
+				ranges.append((first, end))
+				count += end - first
+		if count > MAX_INCREMENTAL_TAGS:
+			return False
+
+		# move the problems along with each edit, dropping those of the changed tags
+		starts = self.starts
+		ends = self.ends
+		messages = self.messages
+		for start, end, delta, nesting in changes:
+			lo = bisect.bisect_left(starts, start)
+			hi = bisect.bisect_left(starts, end)
+			if delta != 0:
+				starts = starts[:lo] + array("q", [s + delta for s in starts[hi:]])
+				ends = ends[:lo] + array("q", [e + delta for e in ends[hi:]])
+			else:
+				del starts[lo:hi]
+				del ends[lo:hi]
+			del messages[lo:hi]
+
+		checker = TagChecker(dd)
+		longest = self.longest
+		for first, end in ranges:
+			lo = bisect.bisect_left(starts, index.starts[first])
+			hi = bisect.bisect_left(starts, index.ends[end - 1])
+			found = checker.check(index, first, end)
+			starts[lo:hi] = array("q", [p[0] for p in found])
+			ends[lo:hi] = array("q", [p[1] for p in found])
+			messages[lo:hi] = [p[2] for p in found]
+			for p in found:
+				longest = max(longest, p[1] - p[0])
+
+		self.starts = starts
+		self.ends = ends
+		self.messages = messages
+		self.longest = longest
+		self.changeCount = index.changeCount
+		return True
+
+	## Get the message of the problems at a point.
+	#  @param point - an index into the view
+	#  @returns a list of strings
+	def messagesAt(self, point):
+		first = bisect.bisect_left(self.starts, point - self.longest)
+		last = bisect.bisect_right(self.starts, point)
+		return [self.messages[i] for i in range(first, last) if point <= self.ends[i]]
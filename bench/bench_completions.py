@@ -0,0 +1,389 @@
+#!/usr/bin/python3
+
+## Headless completion latency benchmark.
+#  @package bench_completions
+#
+#  Runs the autocompletion plugin against synthetic HIVE files
+#  outside of Sublime Text and reports the p50, p95 and p99
+#  latency of each completion context, of requests with several
+#  cursors and of the XMLTagIterator parent and closing tag lookups
+#  as JSON, so runs can be compared over time.
+#
+#  Usage: python3 bench/bench_completions.py --tags 1000 10000 100000 --output run.json
+#
+#  The schema of the synthetic files is served from a SchemaSnapshot
+#  so the HiveAPIQuery tool is never run and only the plugin is measured.
+#  Requests that miss the cache are measured separately, against
+#  fake_hive_api_query.py, through the CompletionQueue and its debounce
+#  window: from the request to the popup being shown again, and how
+#  many times the tool runs for a burst of keystrokes.
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_sublime
+fake_sublime.install()
+
+from synthetic_hive import generateSchema, generateDocument
+from fake_hive_api_query import writeLauncher
+
+## Version of the JSON report format
+REPORT_VERSION = 2
+
+## keystrokes in each burst of the debounce measurement
+BURST_LENGTH = 5
+## seconds to wait for a queued request before it counts as lost
+QUEUE_TIMEOUT = 10
+
+## Where the cursor is put for each measured completion.
+#  The cursor goes at the end of each match of the expression.
+CURSOR_PATTERNS = [
+	("object_type", r'<object type="'),
+	("object_type_colon", r'<object type="[a-z]+::'),
+	("object_attribute", r'<object '),
+	("param_name", r'<param name="'),
+	("param_value", r'<param name="\w+" value="'),
+	("param_attribute", r'<param '),
+]
+
+## A view that records when the completion popup is shown again,
+#  which the plugin does once queued completions are ready.
+class RecordingView(fake_sublime.View):
+
+	def __init__(self, text):
+		fake_sublime.View.__init__(self, text)
+		self.retriggered = threading.Event()
+
+	def run_command(self, command, args=None):
+		if command == "auto_complete":
+			self.retriggered.set()
+
+## Import the plugin modules as a package the way Sublime Text does,
+#  so their relative imports work.
+#  @returns the hive_autocomplete_plugin module
+def loadPlugin():
+	package = types.ModuleType("hive")
+	package.__path__ = [PACKAGE_DIR]
+	sys.modules["hive"] = package
+	return importlib.import_module("hive.hive_autocomplete_plugin")
+
+## Make a data dictionary that answers every query from a snapshot of a schema.
+#  The interpreter stands in for the HiveAPIQuery binary: the snapshot
+#  carries its signature so the snapshot is always current.
+#  @param plugin - the hive_autocomplete_plugin module
+#  @param schema - a schema from generateSchema
+#  @returns a DataDictionary
+def makeDataDictionary(plugin, schema):
+	snapshot = plugin.SchemaSnapshot()
+	snapshot.signature = plugin.fileSignature(sys.executable)
+	snapshot.types = schema["types"]
+	snapshot.channels = schema["channels"]
+	snapshot.values = schema["values"]
+
+	dd = plugin.DataDictionary(sys.executable)
+	dd.snapshot = snapshot
+	return dd
+
+## Get a percentile of sorted samples by nearest rank.
+#  @param samples - a sorted list of numbers
+#  @param percent - the percentile, 0 to 100
+def percentile(samples, percent):
+	if not samples:
+		return None
+	rank = max(0, min(len(samples) - 1, int(round(percent / 100.0 * len(samples) + 0.5)) - 1))
+	return samples[rank]
+
+## Summarize the timings of an operation.
+#  @param times - a list of durations in seconds
+#  @param calls - a list of the number of view calls of each run
+#  @returns a dictionary of statistics in milliseconds
+def summarize(times, calls):
+	times = sorted(t * 1000.0 for t in times)
+	return {
+		"samples" : len(times),
+		"p50_ms" : percentile(times, 50),
+		"p95_ms" : percentile(times, 95),
+		"p99_ms" : percentile(times, 99),
+		"max_ms" : times[-1] if times else None,
+		"mean_view_calls" : float(sum(calls)) / len(calls) if calls else None
+	}
+
+## Time a function on a view.
+#  @param view - a fake_sublime.View
+#  @param function - a function taking no arguments
+#  @returns a (seconds, view calls) pair
+def measure(view, function):
+	calls = view.calls
+	start = time.perf_counter()
+	function()
+	elapsed = time.perf_counter() - start
+	return (elapsed, view.calls - calls)
+
+## Run the benchmark on one synthetic file.
+#  @param plugin - the hive_autocomplete_plugin module
+#  @param schema - a schema from generateSchema
+#  @param args - the parsed command line
+#  @param tags - number of tags in the file
+#  @returns a dictionary of results
+def benchmarkFile(plugin, schema, args, tags):
+	text = generateDocument(schema, tags, args.depth, args.tag_length, args.seed)
+	rng = random.Random(args.seed)
+	view = fake_sublime.View(text)
+	listener = plugin.HiveAutoComplete()
+
+	# the first use of a view scans all of its tags
+	buildTime, buildCalls = measure(view, lambda: plugin.TagIndex.forView(view))
+	tagCount = len(plugin.TagIndex.forView(view))
+
+	operations = {}
+	contexts = {}
+
+	for name, pattern in CURSOR_PATTERNS:
+		locations = [m.end() for m in re.finditer(pattern, text)]
+		if not locations:
+			continue
+		times = []
+		calls = []
+		for i in range(args.samples):
+			location = rng.choice(locations)
+			elapsed, count = measure(view, lambda: listener.on_query_completions(view, "", [location]))
+			times.append(elapsed)
+			calls.append(count)
+		operations["complete_" + name] = summarize(times, calls)
+		contexts["complete_" + name] = plugin.CONTEXT_NAMES[plugin.getContext(view, location)]
+
+	# an element completion needs a '<' to have been typed between two tags
+	# and the tag index is told about the edit as the editor would tell it
+	index = plugin.TagIndex.forView(view)
+	gaps = [m.start() for m in re.finditer(r'\n\t*<', text)]
+	times = []
+	calls = []
+	for i in range(args.samples):
+		location = rng.choice(gaps) + 1
+		view.replace(location, location, "<")
+		index.applyChanges([(location, location, 1)])
+		elapsed, count = measure(view, lambda: listener.on_query_completions(view, "", [location + 1]))
+		view.replace(location, location + 1, "")
+		index.applyChanges([(location, location + 1, 0)])
+		times.append(elapsed)
+		calls.append(count)
+	operations["complete_element"] = summarize(times, calls)
+
+	# several cursors in param values, the lists combined both ways
+	locations = [m.end() for m in re.finditer(r'<param name="\w+" value="', text)]
+	savedMode = plugin.multiCursorMode
+	for mode in ["intersection", "union"]:
+		plugin.multiCursorMode = mode
+		times = []
+		calls = []
+		for i in range(args.samples):
+			cursors = sorted(rng.sample(locations, min(args.cursors, len(locations))))
+			view.selection = fake_sublime.Selection(fake_sublime.Region(c) for c in cursors)
+			elapsed, count = measure(view, lambda: listener.on_query_completions(view, "", cursors))
+			times.append(elapsed)
+			calls.append(count)
+		operations["multi_cursor_" + mode] = summarize(times, calls)
+	plugin.multiCursorMode = savedMode
+	view.selection = fake_sublime.Selection([fake_sublime.Region(0)])
+
+	tagStarts = [m.start() + 1 for m in re.finditer(r'<', text)]
+	openStarts = [m.start() + 1 for m in re.finditer(r'<object ', text)]
+	for name, starts, method in [("get_parent", tagStarts, "getParent"), ("get_closing_tag", openStarts, "getClosingTag")]:
+		times = []
+		calls = []
+		for i in range(args.samples):
+			location = rng.choice(starts)
+			elapsed, count = measure(view, lambda: getattr(plugin.XMLTagIterator(view, location), method)())
+			times.append(elapsed)
+			calls.append(count)
+		operations[name] = summarize(times, calls)
+
+	return {
+		"tags" : tagCount,
+		"characters" : len(text),
+		"index_build_ms" : buildTime * 1000.0,
+		"index_build_view_calls" : buildCalls,
+		"contexts" : contexts,
+		"operations" : operations
+	}
+
+## Measure requests that miss the cache, which are computed by the
+#  CompletionQueue while the tool runs.
+#  @param plugin - the hive_autocomplete_plugin module
+#  @param args - the parsed command line
+#  @returns a dictionary of results
+def benchmarkQueue(plugin, args):
+	os.environ["HIVE_FAKE_QUERY_MS"] = str(args.query_ms)
+	directory = tempfile.mkdtemp(prefix="hive_bench_completions_")
+	dd = plugin.DataDictionary(writeLauncher(directory))
+	queue = plugin.CompletionQueue(plugin.completionThreads, args.debounce_ms / 1000.0)
+	saved = (plugin.DATA_DICTIONARY, plugin.COMPLETION_QUEUE, plugin.asyncCompletions)
+	plugin.DATA_DICTIONARY = dd
+	plugin.COMPLETION_QUEUE = queue
+	plugin.asyncCompletions = True
+
+	runs = [0]
+	runQuery = dd.runQuery
+	def countingRunQuery(*a, **kw):
+		runs[0] += 1
+		return runQuery(*a, **kw)
+	dd.runQuery = countingRunQuery
+
+	rng = random.Random(args.seed)
+	operations = {}
+	lost = 0
+	empty = 0
+	burstRuns = []
+	try:
+		# a file of the stand-in's own types, so every query has an answer
+		text = generateDocument({"types" : dd.apiQuery("type")}, args.queue_tags, args.depth, args.tag_length, args.seed)
+		view = RecordingView(text)
+		listener = plugin.HiveAutoComplete()
+		locations = [m.end() for m in re.finditer(r'<param name="', text)]
+
+		# one request, from the keystroke to the popup showing the results
+		requests = []
+		requestCalls = []
+		ready = []
+		for i in range(args.queue_samples):
+			dd.clearCache()
+			location = rng.choice(locations)
+			view.selection = fake_sublime.Selection([fake_sublime.Region(location)])
+			view.retriggered.clear()
+			start = time.perf_counter()
+			elapsed, count = measure(view, lambda: listener.on_query_completions(view, "", [location]))
+			requests.append(elapsed)
+			requestCalls.append(count)
+			if not view.retriggered.wait(QUEUE_TIMEOUT):
+				lost += 1
+				continue
+			ready.append(time.perf_counter() - start)
+			if not listener.on_query_completions(view, "", [location]):
+				empty += 1
+		operations["queued_request"] = summarize(requests, requestCalls)
+		operations["queued_until_ready"] = summarize(ready, [0] * len(ready))
+
+		# keystrokes faster than the debounce window, then the results of the last one
+		ready = []
+		for i in range(args.queue_samples):
+			dd.clearCache()
+			runs[0] = 0
+			view.retriggered.clear()
+			for k in range(BURST_LENGTH):
+				location = rng.choice(locations)
+				view.selection = fake_sublime.Selection([fake_sublime.Region(location)])
+				start = time.perf_counter()
+				listener.on_query_completions(view, "", [location])
+				if k < BURST_LENGTH - 1:
+					time.sleep(args.debounce_ms / 2000.0)
+			if not view.retriggered.wait(QUEUE_TIMEOUT):
+				lost += 1
+				continue
+			ready.append(time.perf_counter() - start)
+			burstRuns.append(runs[0])
+		operations["debounced_burst_until_ready"] = summarize(ready, [0] * len(ready))
+	finally:
+		plugin.DATA_DICTIONARY, plugin.COMPLETION_QUEUE, plugin.asyncCompletions = saved
+		queue.shutdown()
+		dd.shutdown()
+		shutil.rmtree(directory)
+
+	return {
+		"tags" : args.queue_tags,
+		"debounce_ms" : args.debounce_ms,
+		"query_ms" : args.query_ms,
+		"lost" : lost,
+		"empty" : empty,
+		"mean_tool_runs_per_burst" : float(sum(burstRuns)) / len(burstRuns) if burstRuns else None,
+		"operations" : operations
+	}
+
+## Print a table of results for people reading the console.
+#  @param result - the results of benchmarkFile
+def printSummary(result):
+	sys.stderr.write("%d tags, %d characters, index built in %.1f ms\n" % (result["tags"], result["characters"], result["index_build_ms"]))
+	for name in sorted(result["operations"]):
+		stats = result["operations"][name]
+		sys.stderr.write("  %-26s p50 %8.3f ms  p95 %8.3f ms  p99 %8.3f ms  %6.1f view calls\n" % (
+			name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["mean_view_calls"]))
+
+## Print the results of benchmarkQueue.
+#  @param result - the results of benchmarkQueue
+def printQueueSummary(result):
+	sys.stderr.write("requests missing the cache, %d ms debounce, %d ms queries: %d lost, %d empty, %.1f tool runs per burst of %d\n" % (
+		result["debounce_ms"], result["query_ms"], result["lost"], result["empty"], result["mean_tool_runs_per_burst"] or 0, BURST_LENGTH))
+	for name in sorted(result["operations"]):
+		stats = result["operations"][name]
+		sys.stderr.write("  %-26s p50 %8.3f ms  p95 %8.3f ms  p99 %8.3f ms\n" % (name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]))
+
+def main():
+	parser = argparse.ArgumentParser(description="Measure HIVE completion latency on synthetic files.")
+	parser.add_argument("--tags", type=int, nargs="+", default=[1000, 10000, 100000], help="number of tags in each generated file")
+	parser.add_argument("--depth", type=int, default=4, help="maximum nesting depth of objects")
+	parser.add_argument("--tag-length", type=int, default=60, help="approximate length of param tags")
+	parser.add_argument("--samples", type=int, default=200, help="number of measurements of each operation")
+	parser.add_argument("--seed", type=int, default=0, help="seed for the generated files and cursor locations")
+	parser.add_argument("--cursors", type=int, default=4, help="number of cursors of the multi-cursor requests")
+	parser.add_argument("--queue-samples", type=int, default=20, help="number of measurements of requests that miss the cache, 0 to skip them")
+	parser.add_argument("--queue-tags", type=int, default=10000, help="number of tags in the file of the requests that miss the cache")
+	parser.add_argument("--debounce-ms", type=float, default=100, help="debounce window of the completion queue")
+	parser.add_argument("--query-ms", type=float, default=20, help="time the stand-in HiveAPIQuery takes to answer")
+	parser.add_argument("--output", help="file to write the JSON report to instead of standard output")
+	args = parser.parse_args()
+
+	plugin = loadPlugin()
+	plugin.loadSettings()
+	schema = generateSchema(args.seed)
+	plugin.DATA_DICTIONARY = makeDataDictionary(plugin, schema)
+
+	report = {
+		"version" : REPORT_VERSION,
+		"time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python" : platform.python_version(),
+		"platform" : platform.platform(),
+		"config" : {
+			"depth" : args.depth,
+			"tag_length" : args.tag_length,
+			"samples" : args.samples,
+			"seed" : args.seed,
+			"cursors" : args.cursors
+		},
+		"results" : [],
+		"queue" : None
+	}
+
+	for tags in args.tags:
+		result = benchmarkFile(plugin, schema, args, tags)
+		printSummary(result)
+		report["results"].append(result)
+
+	if args.queue_samples > 0:
+		report["queue"] = benchmarkQueue(plugin, args)
+		printQueueSummary(report["queue"])
+
+	plugin.DATA_DICTIONARY.shutdown()
+
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2, sort_keys=True)
+	else:
+		json.dump(report, sys.stdout, indent=2, sort_keys=True)
+		sys.stdout.write("\n")
+
+if __name__ == "__main__":
+	main()
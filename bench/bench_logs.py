@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+
+## Log reference scan benchmark.
+#  @package bench_logs
+#
+#  Writes synthetic logs of the sizes asked for and reports the
+#  throughput of the scan behind "HIVE: List Referenced Sources"
+#  as JSON, next to a loop over the LOG_LINE_RE matches of the log,
+#  whose counts the scan must equal.
+#
+#  Usage: python3 bench/bench_logs.py --mb 64 256 --output logs.json
+
+import argparse
+import collections
+import importlib
+import json
+import mmap
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_log import writeLog
+
+## Version of the JSON report format
+REPORT_VERSION = 1
+
+## Load the log modules, which do not need Sublime Text.
+def loadLogReferences():
+	package = types.ModuleType("hive")
+	package.__path__ = [PACKAGE_DIR]
+	sys.modules["hive"] = package
+	return importlib.import_module("hive.Module_LogReferences")
+
+## Count the (level, file(line) reference) pairs of a log one LOG_LINE_RE match at a time.
+def countLogLines(module, path):
+	counts = collections.Counter()
+	with open(path, "rb") as f:
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			for m in module.LOG_LINE_RE.finditer(mm):
+				counts[m.group(1, 2)] += 1
+		finally:
+			mm.close()
+	return counts
+
+## Time a function a number of times.
+#  @returns a (best MB/s, result of the last run) pair
+def throughput(function, size, repeat):
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		result = function()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return (size / best / 1e6, result)
+
+def main():
+	parser = argparse.ArgumentParser(description="Measure the HIVE log reference scan.")
+	parser.add_argument("--mb", type=int, nargs="+", default=[64], help="sizes of the synthetic logs in megabytes")
+	parser.add_argument("--repeat", type=int, default=3, help="number of times each scan is run, the fastest is reported")
+	parser.add_argument("--output", help="file to write the JSON report to instead of standard output")
+	args = parser.parse_args()
+
+	module = loadLogReferences()
+	directory = tempfile.mkdtemp(prefix="hive_bench_logs_")
+	logs = {}
+	failed = False
+	try:
+		for mb in args.mb:
+			path = os.path.join(directory, "bench%d.nlog" % mb)
+			lines = writeLog(path, mb * 1024 * 1024)
+			size = os.path.getsize(path)
+
+			scanRate, counts = throughput(lambda: module.countReferences(path), size, args.repeat)
+			loopRate, expected = throughput(lambda: countLogLines(module, path), size, args.repeat)
+			same = counts == expected
+			failed = failed or not same
+
+			sys.stderr.write("  %5d MB  scan %6.1f MB/s  LOG_LINE_RE loop %6.1f MB/s  %s\n" % (mb, scanRate, loopRate,
+				"same counts" if same else "DIFFERENT COUNTS"))
+			logs["%d_mb" % mb] = {
+				"bytes" : size,
+				"lines" : lines,
+				"references" : len(set(ref for level, ref in counts)),
+				"scan_mb_per_s" : scanRate,
+				"log_line_loop_mb_per_s" : loopRate,
+				"same_counts" : same
+			}
+	finally:
+		shutil.rmtree(directory)
+
+	report = {
+		"version" : REPORT_VERSION,
+		"time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python" : platform.python_version(),
+		"platform" : platform.platform(),
+		"config" : {
+			"repeat" : args.repeat
+		},
+		"logs" : logs
+	}
+
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2, sort_keys=True)
+	else:
+		json.dump(report, sys.stdout, indent=2, sort_keys=True)
+		sys.stdout.write("\n")
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+
+## HiveAPIQuery latency benchmark.
+#  @package bench_queries
+#
+#  Runs DataDictionary against fake_hive_api_query.py and reports
+#  the p50, p95 and p99 latency of uncached and cached queries,
+#  with one process per query and with the worker process, and of
+#  DIS lookups, as JSON.
+#
+#  Usage: python3 bench/bench_queries.py --types 50000 --dis 1000000 --query-ms 20 --output run.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_completions import loadPlugin, summarize
+from fake_hive_api_query import writeLauncher
+
+## Version of the JSON report format
+REPORT_VERSION = 1
+
+## path of the launcher of the stand-in, written by main
+FAKE_QUERY = None
+
+## Time a function.
+#  @returns a (seconds, result) pair
+def measure(function):
+	start = time.perf_counter()
+	result = function()
+	return (time.perf_counter() - start, result)
+
+## Measure channel queries, first uncached and then cached.
+#  @param plugin - the hive_autocomplete_plugin module
+#  @param useWorker - True to run the queries on the worker process
+#  @param types - the object types to query
+#  @returns a dictionary of operation name -> statistics
+def benchmarkQueries(plugin, useWorker, types):
+	dd = plugin.DataDictionary(FAKE_QUERY, useWorker=useWorker)
+	mode = "worker" if useWorker else "process"
+	operations = {}
+	try:
+		first, result = measure(lambda: dd.apiQuery("type"))
+		operations["%s_first_query" % mode] = summarize([first], [0])
+
+		for name in ["uncached", "cached"]:
+			times = [measure(lambda: dd.apiQuery("channel", typ))[0] for typ in types]
+			operations["%s_channel_%s" % (mode, name)] = summarize(times, [0] * len(times))
+	finally:
+		dd.shutdown()
+	return operations
+
+## Measure loading the DIS table and looking enumerations up in it.
+#  @param plugin - the hive_autocomplete_plugin module
+#  @param typ - the object type holding the enumeration
+#  @param prefixes - the enumeration prefixes to complete
+#  @returns a dictionary of operation name -> statistics
+def benchmarkDis(plugin, typ, prefixes):
+	dd = plugin.DataDictionary(FAKE_QUERY)
+	operations = {}
+	try:
+		load, index = measure(lambda: dd.getDisIndex(typ, "disEnumeration"))
+		operations["dis_load"] = summarize([load], [0])
+
+		times = [measure(lambda: dd.getParamValueCompletions("disEnumeration", typ, prefix))[0] for prefix in prefixes]
+		operations["dis_prefix_lookup"] = summarize(times, [0] * len(times))
+
+		times = [measure(lambda: dd.getParamValueCompletions("disEnumeration", typ, "", word=word))[0] for word in ["entity 1", "sensors", "225"]]
+		operations["dis_substring_lookup"] = summarize(times, [0] * len(times))
+	finally:
+		dd.shutdown()
+	return operations
+
+def main():
+	global FAKE_QUERY
+	parser = argparse.ArgumentParser(description="Measure HiveAPIQuery latency with a stand-in executable.")
+	parser.add_argument("--types", type=int, default=1000, help="number of object types in the catalog")
+	parser.add_argument("--dis", type=int, default=10000, help="number of DIS enumerations in the catalog")
+	parser.add_argument("--startup-ms", type=float, default=0, help="delay before the stand-in answers its first query")
+	parser.add_argument("--query-ms", type=float, default=0, help="delay before the stand-in answers each query")
+	parser.add_argument("--queries", type=int, default=50, help="number of distinct channel queries")
+	parser.add_argument("--output", help="file to write the JSON report to instead of standard output")
+	args = parser.parse_args()
+
+	# the stand-in reads its catalog and delays from the environment
+	os.environ["HIVE_FAKE_TYPES"] = str(args.types)
+	os.environ["HIVE_FAKE_DIS"] = str(args.dis)
+	os.environ["HIVE_FAKE_STARTUP_MS"] = str(args.startup_ms)
+	os.environ["HIVE_FAKE_QUERY_MS"] = str(args.query_ms)
+
+	directory = tempfile.mkdtemp(prefix="hive_bench_queries_")
+	try:
+		FAKE_QUERY = writeLauncher(directory)
+		plugin = loadPlugin()
+		dd = plugin.DataDictionary(FAKE_QUERY)
+		types = dd.apiQuery("type")
+		dd.shutdown()
+		if not types:
+			sys.stderr.write("The stand-in returned no types\n")
+			return 1
+		step = max(1, len(types) // args.queries)
+		sample = types[::step][:args.queries]
+
+		operations = {}
+		operations.update(benchmarkQueries(plugin, False, sample))
+		operations.update(benchmarkQueries(plugin, True, sample))
+		operations.update(benchmarkDis(plugin, types[0], ["1", "1.2", "1.2.23", "3.1.225.", "9.6.264.2"]))
+
+		for name in sorted(operations):
+			stats = operations[name]
+			sys.stderr.write("  %-26s p50 %9.3f ms  p95 %9.3f ms  p99 %9.3f ms\n" % (name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]))
+
+		report = {
+			"version" : REPORT_VERSION,
+			"time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"python" : platform.python_version(),
+			"platform" : platform.platform(),
+			"config" : {
+				"types" : args.types,
+				"dis" : args.dis,
+				"startup_ms" : args.startup_ms,
+				"query_ms" : args.query_ms,
+				"queries" : len(sample)
+			},
+			"operations" : operations
+		}
+
+		if args.output:
+			with open(args.output, "w") as f:
+				json.dump(report, f, indent=2, sort_keys=True)
+		else:
+			json.dump(report, sys.stdout, indent=2, sort_keys=True)
+			sys.stdout.write("\n")
+		return 0
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	sys.exit(main())
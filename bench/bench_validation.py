@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+
+## Headless validation latency benchmark.
+#  @package bench_validation
+#
+#  Validates synthetic HIVE files against their schema outside of
+#  Sublime Text and reports the time of a whole file check and the
+#  p50, p95 and p99 latency of the incremental checks after edits
+#  as JSON.  With --verify every incremental result is compared to
+#  a whole file check of the edited text.
+#
+#  Usage: python3 bench/bench_validation.py --tags 10000 100000 --output validation.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_sublime
+fake_sublime.install()
+
+from bench_completions import loadPlugin, makeDataDictionary, summarize
+from synthetic_hive import generateSchema, generateDocument
+
+## Version of the JSON report format
+REPORT_VERSION = 1
+
+## The edits made to measure incremental checks: a name, an expression
+#  whose matches are edited and a function giving the new text of a match
+EDITS = [
+	("param_value", r'value="value\d+"', lambda rng: 'value="value%d"' % rng.randrange(8)),
+	("param_name", r'name="channel\d+"', lambda rng: 'name="channel%d"' % rng.randrange(14)),
+	("object_type", r'type="[^"]+"', None),
+	("text", r'\n\t', lambda rng: "\n\t "),
+	("tag_name", r'</?object\b', lambda rng: rng.choice(["<object", "<objext", "</object", "</objext"])),
+	("root_tag", r'<hive ?>', lambda rng: rng.choice(["<hive>", "<hive >"])),
+]
+
+## Run the benchmark on one synthetic file.
+#  @param plugin - the hive_autocomplete_plugin module
+#  @param schema - a schema from generateSchema
+#  @param args - the parsed command line
+#  @param tags - number of tags in the file
+#  @returns a dictionary of results
+def benchmarkFile(plugin, schema, args, tags):
+	dd = plugin.DATA_DICTIONARY
+	text = generateDocument(schema, tags, args.depth, args.tag_length, args.seed)
+	rng = random.Random(args.seed)
+	view = fake_sublime.View(text)
+
+	start = time.perf_counter()
+	problems, index = plugin.validateText(dd, plugin.TextSnapshot(text, view.change_count()))
+	fullTime = time.perf_counter() - start
+
+	index.view = view
+	validation = plugin.ViewValidation()
+	validation.setProblems(problems, view.change_count())
+
+	operations = {}
+	mismatches = 0
+	for name, pattern, replacement in EDITS:
+		times = []
+		calls = []
+		for i in range(args.samples):
+			matches = list(re.finditer(pattern, view.text))
+			m = rng.choice(matches)
+			if replacement is None:
+				new = 'type="%s"' % rng.choice(schema["types"])
+			else:
+				new = replacement(rng)
+
+			view.replace(m.start(), m.end(), new)
+			index.applyChanges([(m.start(), m.end(), len(new))])
+
+			callsBefore = view.calls
+			start = time.perf_counter()
+			updated = validation.update(dd, index)
+			times.append(time.perf_counter() - start)
+			calls.append(view.calls - callsBefore)
+			if not updated:
+				# the whole file is checked again, and later edits are checked
+				# against its tag index as the plugin does
+				found, index = plugin.validateText(dd, plugin.TextSnapshot(view.text, view.change_count()))
+				index.view = view
+				validation.setProblems(found, view.change_count())
+
+			if args.verify:
+				expected = plugin.validateText(dd, plugin.TextSnapshot(view.text, view.change_count()))[0]
+				if expected != validation.problems():
+					mismatches += 1
+
+		operations["incremental_" + name] = summarize(times, calls)
+
+	return {
+		"tags" : len(index),
+		"characters" : len(text),
+		"problems" : len(problems),
+		"full_check_ms" : fullTime * 1000.0,
+		"mismatches" : mismatches if args.verify else None,
+		"operations" : operations
+	}
+
+## Print a table of results for people reading the console.
+#  @param result - the results of benchmarkFile
+def printSummary(result):
+	sys.stderr.write("%d tags, %d problems, full check in %.1f ms\n" % (result["tags"], result["problems"], result["full_check_ms"]))
+	if result["mismatches"] is not None:
+		sys.stderr.write("  %d incremental checks differed from a full check\n" % result["mismatches"])
+	for name in sorted(result["operations"]):
+		stats = result["operations"][name]
+		sys.stderr.write("  %-26s p50 %8.3f ms  p95 %8.3f ms  p99 %8.3f ms  %6.1f view calls\n" % (
+			name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["mean_view_calls"]))
+
+def main():
+	parser = argparse.ArgumentParser(description="Measure HIVE validation latency on synthetic files.")
+	parser.add_argument("--tags", type=int, nargs="+", default=[10000, 100000], help="number of tags in each generated file")
+	parser.add_argument("--depth", type=int, default=4, help="maximum nesting depth of objects")
+	parser.add_argument("--tag-length", type=int, default=60, help="approximate length of param tags")
+	parser.add_argument("--samples", type=int, default=100, help="number of edits of each kind")
+	parser.add_argument("--seed", type=int, default=0, help="seed for the generated files and edits")
+	parser.add_argument("--verify", action="store_true", help="compare every incremental check to a full check")
+	parser.add_argument("--output", help="file to write the JSON report to instead of standard output")
+	args = parser.parse_args()
+
+	plugin = loadPlugin()
+	plugin.loadSettings()
+	schema = generateSchema(args.seed)
+	plugin.DATA_DICTIONARY = makeDataDictionary(plugin, schema)
+
+	report = {
+		"version" : REPORT_VERSION,
+		"time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python" : platform.python_version(),
+		"platform" : platform.platform(),
+		"config" : {
+			"depth" : args.depth,
+			"tag_length" : args.tag_length,
+			"samples" : args.samples,
+			"seed" : args.seed
+		},
+		"results" : []
+	}
+
+	for tags in args.tags:
+		result = benchmarkFile(plugin, schema, args, tags)
+		printSummary(result)
+		report["results"].append(result)
+
+	plugin.DATA_DICTIONARY.shutdown()
+
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2, sort_keys=True)
+	else:
+		json.dump(report, sys.stdout, indent=2, sort_keys=True)
+		sys.stdout.write("\n")
+
+if __name__ == "__main__":
+	main()
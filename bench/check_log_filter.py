@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+## Check of the lines Module_LogFilter finds in a log.
+#  @package check_log_filter
+#
+#  Filters a synthetic log with expressions anchored with ^ and $,
+#  expressions that could match across the end of a line and with
+#  log levels, reading it in chunks of several sizes, and compares
+#  the lines found to the lines an expression search of each line
+#  on its own finds.
+#  Prints one line per filter and exits with 1 if any failed.
+#
+#  Usage: python3 bench/check_log_filter.py [--size bytes]
+
+import argparse
+import importlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_log import writeLog
+
+## (log levels or None, expression) of each filter checked
+FILTERS = [
+	(None, r"^2026.*file1\.cpp"),
+	(None, r"loaded$"),
+	(None, r"^    at "),
+	(None, r"\d ms\s+2026"),
+	("!#", r"^2026"),
+	("W", r"value 1\d*$"),
+	("W!#", None),
+]
+
+## bytes read at a time by each run of the filters,
+#  None for the chunks LogFilter reads
+CHUNK_SIZES = [None, 4096, 100]
+
+## Load the log modules, which do not need Sublime Text.
+def loadLogFilter():
+	package = types.ModuleType("hive")
+	package.__path__ = [PACKAGE_DIR]
+	sys.modules["hive"] = package
+	return importlib.import_module("hive.Module_LogFilter")
+
+## Find the lines of a log that pass a filter one line at a time.
+def expectedLines(module, path, levels, pattern):
+	levelRe = module.levelLineRe(levels) if levels else None
+	patternRe = re.compile(pattern.encode("utf-8")) if pattern else None
+	lines = []
+	with open(path, "rb") as f:
+		for line in f:
+			if levelRe is not None and not levelRe.match(line):
+				continue
+			if patternRe is not None and not patternRe.search(line.rstrip(b"\n")):
+				continue
+			lines.append(line.decode("utf-8"))
+	return lines
+
+## Find the lines of a log that pass a filter with LogFilter.
+def filteredLines(module, path, levels, pattern, chunkSize):
+	if chunkSize is None:
+		found = []
+		module.LogFilter(path, levels, pattern).run(found.append)
+		return "".join(found).splitlines(True)
+
+	levelRe = module.levelLineRe(levels) if levels else None
+	patternRe = module.compileLinePattern(pattern) if pattern else None
+	lines = []
+	for offset, chunk in module.readLines(path, 0, chunkSize):
+		lines += [line.decode("utf-8") for line in module.filterChunk(chunk, levelRe, patternRe)]
+	return lines
+
+def main():
+	parser = argparse.ArgumentParser(description="Check the lines the HIVE log filter finds.")
+	parser.add_argument("--size", type=int, default=2 * 1024 * 1024, help="size of the synthetic log in bytes")
+	args = parser.parse_args()
+
+	module = loadLogFilter()
+	directory = tempfile.mkdtemp(prefix="hive_log_filter_")
+	try:
+		path = os.path.join(directory, "check.nlog")
+		writeLog(path, args.size)
+
+		failures = 0
+		for levels, pattern in FILTERS:
+			name = "%s /%s/" % ("".join("[%s]" % level for level in levels or ""), pattern or "")
+			expected = expectedLines(module, path, levels, pattern)
+			error = None
+			for chunkSize in CHUNK_SIZES:
+				found = filteredLines(module, path, levels, pattern, chunkSize)
+				if found != expected:
+					error = "%d lines instead of %d with %s chunks" % (len(found), len(expected), chunkSize or "default")
+					break
+
+			if error is None:
+				sys.stdout.write("%-28s ok, %d lines\n" % (name.strip(), len(expected)))
+			else:
+				sys.stdout.write("%-28s FAILED: %s\n" % (name.strip(), error))
+				failures += 1
+		return 1 if failures else 0
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+
+## Crash and hang recovery check of the HiveAPIQuery worker.
+#  @package check_query_worker
+#
+#  Runs Module_QueryWorker against fake_hive_api_query.py --serve
+#  and kills it, makes it exit after a number of queries, makes it
+#  hang, replaces it before its reader notices it exited and starts
+#  it without worker mode support, checking after each that queries
+#  are answered again by a restarted worker or by the one process
+#  per query fallback of DataDictionary.
+#  Prints one line per scenario and exits with 1 if any failed.
+#
+#  Usage: python3 bench/check_query_worker.py
+
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_hive_api_query import writeLauncher
+
+## path of the launcher of the stand-in, written by main
+FAKE_QUERY = None
+
+## seconds the worker waits for an answer in the hang scenario
+HANG_TIMEOUT = 1.0
+
+## Load the query modules, which do not need Sublime Text.
+#  @returns the Module_DataDictionary module, which also holds
+#  the names of Module_QueryWorker
+def loadModules():
+	package = types.ModuleType("hive")
+	package.__path__ = [PACKAGE_DIR]
+	sys.modules["hive"] = package
+	return importlib.import_module("hive.Module_DataDictionary")
+
+## Run a function with environment variables set, which the
+#  stand-in reads when the worker process is started.
+def withEnvironment(variables, function):
+	saved = dict((name, os.environ.get(name)) for name in variables)
+	os.environ.update(variables)
+	try:
+		return function()
+	finally:
+		for name, value in saved.items():
+			if value is None:
+				del os.environ[name]
+			else:
+				os.environ[name] = value
+
+## Check that a worker answers a channel query.
+def answers(worker):
+	result, size = worker.query("channel", "hive::hive::Type0")
+	return bool(result) and size > 0
+
+## The worker process is killed between two queries.
+def checkKilled(module):
+	worker = module.QueryWorker(FAKE_QUERY)
+	try:
+		if not answers(worker):
+			return "the first query was not answered"
+		worker.process.kill()
+		worker.process.wait()
+		if not answers(worker):
+			return "no answer after the worker was killed"
+		if worker.starts != 2:
+			return "the worker was started %d times instead of 2" % worker.starts
+	finally:
+		worker.stop()
+	return None
+
+## The worker process exits after answering two queries.
+def checkCrashed(module):
+	def run():
+		dd = module.DataDictionary(FAKE_QUERY, useWorker=True)
+		try:
+			for typ in ["hive::hive::Type0", "sensors::hive::Type1", "effects::hive::Type2", "comms::hive::Type3"]:
+				if not dd.runQuery("channel", typ)[0]:
+					return "the query for %s was not answered" % typ
+			if dd.worker.starts < 2:
+				return "the worker was not restarted"
+			if dd.worker.failed:
+				return "the worker was given up on"
+		finally:
+			dd.shutdown()
+		return None
+	return withEnvironment({"HIVE_FAKE_CRASH_AFTER" : "2"}, run)
+
+## The worker process stops answering, then a fixed one is started.
+def checkHung(module):
+	worker = module.QueryWorker(FAKE_QUERY, timeout=HANG_TIMEOUT)
+	try:
+		def hang():
+			start = time.perf_counter()
+			try:
+				worker.query("channel", "hive::hive::Type0")
+				return "a hung worker answered"
+			except module.QueryWorkerError:
+				pass
+			if time.perf_counter() - start > HANG_TIMEOUT * 3:
+				return "the hung worker was not given up on after its timeout"
+			return None
+
+		error = withEnvironment({"HIVE_FAKE_HANG_RATE" : "1"}, hang)
+		if error is not None:
+			return error
+		if worker.process is not None:
+			return "the hung worker process was not killed"
+		if not answers(worker):
+			return "no answer after the hung worker was replaced"
+	finally:
+		worker.stop()
+	return None
+
+## The worker process exits and is replaced before its reader thread
+#  notices, while a request sent to it is still waiting.
+def checkReplacedBeforeReader(module):
+	worker = module.QueryWorker(FAKE_QUERY, timeout=HANG_TIMEOUT * 5)
+	died = worker._processDied
+
+	# hold the reader of the first process back until the check is over
+	release = threading.Event()
+	def slowProcessDied(process):
+		if threading.current_thread().name == "HiveAPIQuery worker reader":
+			release.wait(HANG_TIMEOUT * 10)
+		died(process)
+	worker._processDied = slowProcessDied
+
+	errors = []
+	def waiting():
+		try:
+			worker.query("channel", "hive::hive::Type0")
+			errors.append("a hung worker answered")
+		except module.QueryWorkerError:
+			errors.append(None)
+
+	try:
+		def start():
+			thread = threading.Thread(target=waiting)
+			thread.start()
+			while not worker.pending:
+				time.sleep(0.01)
+			return thread
+
+		thread = withEnvironment({"HIVE_FAKE_HANG_RATE" : "1"}, start)
+		first = worker.process
+		first.kill()
+		first.wait()
+
+		start = time.perf_counter()
+		if not answers(worker):
+			return "no answer from the process replacing the one that exited"
+		thread.join(HANG_TIMEOUT * 10)
+		if not errors:
+			return "the request sent to the exited process is still waiting"
+		if errors[0] is not None:
+			return errors[0]
+		if time.perf_counter() - start > HANG_TIMEOUT:
+			return "the request sent to the exited process waited for its timeout"
+	finally:
+		release.set()
+		worker.stop()
+	return None
+
+## The executable exits at once when started in worker mode.
+def checkUnsupported(module):
+	dd = module.DataDictionary(FAKE_QUERY, useWorker=True)
+	dd.worker.args = ["--no-such-option"]
+	try:
+		for i in range(module.QueryWorker.MAX_FAILED_STARTS + 1):
+			if not dd.runQuery("channel", "hive::hive::Type0")[0]:
+				return "query %d was not answered by the fallback" % i
+		if not dd.worker.failed:
+			return "the worker was not given up on"
+	finally:
+		dd.shutdown()
+	return None
+
+SCENARIOS = [
+	("killed", checkKilled),
+	("crashed", checkCrashed),
+	("hung", checkHung),
+	("replaced", checkReplacedBeforeReader),
+	("unsupported", checkUnsupported),
+]
+
+def main():
+	global FAKE_QUERY
+	module = loadModules()
+	directory = tempfile.mkdtemp(prefix="hive_check_worker_")
+	try:
+		FAKE_QUERY = writeLauncher(directory)
+		failures = 0
+		for name, check in SCENARIOS:
+			error = check(module)
+			if error is None:
+				sys.stdout.write("%-12s ok\n" % name)
+			else:
+				sys.stdout.write("%-12s FAILED: %s\n" % (name, error))
+				failures += 1
+		return 1 if failures else 0
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	sys.exit(main())
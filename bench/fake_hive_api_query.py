@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+
+## Stand-in for the HiveAPIQuery executable.
+#  @package fake_hive_api_query
+#
+#  Answers the type, channel, value and dis queries with the same
+#  arguments and JSON output as HiveAPIQuery, from a synthetic
+#  catalog of any size, so DataDictionary can be tested and
+#  measured without a HIVE install.  With --serve it runs as a
+#  long lived worker speaking the protocol of Module_QueryWorker.
+#
+#  Usage:
+#    fake_hive_api_query.py type [--type=prefix]
+#    fake_hive_api_query.py channel --type=a::b
+#    fake_hive_api_query.py value --type=a::b --channel=channel3 [--value=prefix]
+#    fake_hive_api_query.py dis --type=a::b --channel=disEnumeration [--dis=prefix]
+#    fake_hive_api_query.py --serve
+#    fake_hive_api_query.py --write-launcher DIR
+#
+#  DataDictionary passes nothing but the query arguments, so the
+#  catalog and the injected faults are set with environment variables:
+#    HIVE_FAKE_TYPES       number of object types (default 1000)
+#    HIVE_FAKE_CHANNELS    number of channels of each type (default 12)
+#    HIVE_FAKE_VALUES      number of values of each channel (default 8)
+#    HIVE_FAKE_DIS         number of DIS enumerations (default 10000)
+#    HIVE_FAKE_STARTUP_MS  delay before the first query is answered (default 0)
+#    HIVE_FAKE_QUERY_MS    delay before each query is answered (default 0)
+#    HIVE_FAKE_FAIL_RATE   fraction of queries that fail (default 0)
+#    HIVE_FAKE_HANG_RATE   fraction of queries that never answer (default 0)
+#    HIVE_FAKE_CRASH_AFTER with --serve, exit after this many queries (default 0, never)
+#  Each can also be given as a command line option, such as --types=50000.
+
+import argparse
+import json
+import os
+import random
+import shlex
+import sys
+import time
+
+NAMESPACES = ["hive", "sensors", "effects", "comms", "terrain", "weapons", "platforms", "ui"]
+
+## name of the channel holding a DIS enumeration
+DIS_CHANNEL = "disEnumeration"
+
+## The knobs of the stand-in and their defaults.
+#  option name -> (environment variable, default, type)
+OPTIONS = {
+	"types" : ("HIVE_FAKE_TYPES", 1000, int),
+	"channels" : ("HIVE_FAKE_CHANNELS", 12, int),
+	"values" : ("HIVE_FAKE_VALUES", 8, int),
+	"dis_entries" : ("HIVE_FAKE_DIS", 10000, int),
+	"startup_ms" : ("HIVE_FAKE_STARTUP_MS", 0, float),
+	"query_ms" : ("HIVE_FAKE_QUERY_MS", 0, float),
+	"fail_rate" : ("HIVE_FAKE_FAIL_RATE", 0, float),
+	"hang_rate" : ("HIVE_FAKE_HANG_RATE", 0, float),
+	"crash_after" : ("HIVE_FAKE_CRASH_AFTER", 0, int),
+}
+
+## Raised for a query that was made to fail or has bad arguments.
+class QueryError(Exception):
+	pass
+
+## A synthetic HIVE API catalog.
+#  Every entry is derived from its index so nothing has
+#  to be generated until a query asks for it.
+class Catalog:
+
+	def __init__(self, types, channels, values, disEntries):
+		self.typeCount = types
+		self.channelCount = channels
+		self.valueCount = values
+		self.disCount = disEntries
+		self.types = None
+		self.typeSet = None
+		self.dis = None
+
+	## Get the sorted list of object types.
+	def getTypes(self):
+		if self.types is None:
+			count = len(NAMESPACES)
+			self.types = sorted("%s::%s::Type%d" % (NAMESPACES[i % count], NAMESPACES[(i // count) % count], i)
+				for i in range(self.typeCount))
+			self.typeSet = set(self.types)
+		return self.types
+
+	## Get the [name, description] pairs of the channels of a type.
+	def getChannels(self, typ):
+		self.getTypes()
+		if typ not in self.typeSet:
+			return []
+		channels = [["channel%d" % i, "Channel %d of %s" % (i, typ)] for i in range(self.channelCount)]
+		channels.append([DIS_CHANNEL, "DIS enumeration of %s" % typ])
+		return channels
+
+	## Get the [value, description] pairs of a channel.
+	def getValues(self, typ, channel):
+		if channel == DIS_CHANNEL or channel not in [c[0] for c in self.getChannels(typ)]:
+			return []
+		return [["value%d" % i, "Value %d of %s" % (i, channel)] for i in range(self.valueCount)]
+
+	## Get the [enumeration, description, flag] entries of the DIS table.
+	def getDis(self):
+		if self.dis is None:
+			self.dis = []
+			for i in range(self.disCount):
+				# kind.domain.country.category.subcategory.specific.extra
+				enum = "%d.%d.%d.%d.%d.%d.%d" % (1 + i % 9, 1 + (i // 9) % 6, 225 + (i // 54) % 40,
+					(i // 2160) % 30, (i // 64800) % 20, (i // 1296000) % 10, i % 3)
+				self.dis.append([enum, "Entity %d %s %s" % (i, NAMESPACES[i % 8], NAMESPACES[(i // 8) % 8]), 1 if i % 7 == 0 else 0])
+		return self.dis
+
+	## Answer a query.
+	#  @returns the result as a JSON compatible value
+	def answer(self, query, typ="", channel="", value="", dis=""):
+		if query == "type":
+			return [t for t in self.getTypes() if t.startswith(typ)]
+		elif query == "channel":
+			return self.getChannels(typ)
+		elif query == "value":
+			return [v for v in self.getValues(typ, channel) if v[0].startswith(value)]
+		elif query == "dis":
+			self.getTypes()
+			if typ != "" and typ not in self.typeSet:
+				return []
+			return [e for e in self.getDis() if e[0].startswith(dis)]
+		raise QueryError("unknown query %s" % query)
+
+## Sleep, fail or hang as the options ask before answering a query.
+def injectFaults(options):
+	if options.query_ms > 0:
+		time.sleep(options.query_ms / 1000.0)
+	roll = random.random()
+	if roll < options.hang_rate:
+		while True:
+			time.sleep(3600)
+	if roll < options.hang_rate + options.fail_rate:
+		raise QueryError("injected failure")
+
+## Answer requests from stdin until it is closed.
+def serve(catalog, options):
+	answered = 0
+	for line in sys.stdin:
+		if line.strip() == "":
+			continue
+		request = json.loads(line)
+		try:
+			injectFaults(options)
+			response = {"id" : request["id"], "result" : catalog.answer(request["query"], request.get("type", ""),
+				request.get("channel", ""), request.get("value", ""), request.get("dis", ""))}
+		except QueryError as e:
+			response = {"id" : request["id"], "error" : str(e)}
+
+		sys.stdout.write(json.dumps(response) + "\n")
+		sys.stdout.flush()
+
+		answered += 1
+		if options.crash_after > 0 and answered >= options.crash_after:
+			os._exit(3)
+
+## Write a launcher that runs this script with the current interpreter.
+#  DataDictionary runs the HiveAPIQuery path it is given as an executable,
+#  and the #! line of a script with CRLF line endings does not run.
+#  @param directory - directory to write the launcher to
+#  @returns the path of the launcher
+def writeLauncher(directory):
+	script = os.path.abspath(__file__)
+	if os.name == "nt":
+		path = os.path.join(directory, "fake_hive_api_query.cmd")
+		with open(path, "w") as f:
+			f.write('@"%s" "%s" %%*\n' % (sys.executable, script))
+	else:
+		path = os.path.join(directory, "fake_hive_api_query")
+		with open(path, "w", newline="\n") as f:
+			f.write("#!/bin/sh\nexec %s %s \"$@\"\n" % (shlex.quote(sys.executable), shlex.quote(script)))
+		os.chmod(path, 0o755)
+	return path
+
+def main():
+	parser = argparse.ArgumentParser(description="Stand-in for HiveAPIQuery with a synthetic catalog.")
+	parser.add_argument("query", nargs="?", choices=["type", "channel", "value", "dis"])
+	parser.add_argument("--type", default="")
+	parser.add_argument("--channel", default="")
+	parser.add_argument("--value", default="")
+	parser.add_argument("--dis", default="")
+	parser.add_argument("--serve", action="store_true", help="answer JSON line requests from stdin")
+	parser.add_argument("--write-launcher", dest="write_launcher", metavar="DIR", help="write a launcher to DIR, print its path and exit")
+	for name, (variable, default, kind) in OPTIONS.items():
+		parser.add_argument("--" + name.replace("_", "-"), dest=name, type=kind, default=kind(os.environ.get(variable, default)))
+	options = parser.parse_args()
+
+	if options.write_launcher:
+		sys.stdout.write(writeLauncher(options.write_launcher) + "\n")
+		return 0
+
+	if options.startup_ms > 0:
+		time.sleep(options.startup_ms / 1000.0)
+
+	catalog = Catalog(options.types, options.channels, options.values, options.dis_entries)
+
+	if options.serve:
+		serve(catalog, options)
+		return 0
+
+	if options.query is None:
+		parser.error("a query is required unless --serve or --write-launcher is given")
+
+	try:
+		injectFaults(options)
+		result = catalog.answer(options.query, options.type, options.channel, options.value, options.dis)
+	except QueryError as e:
+		sys.stderr.write("HiveAPIQuery: %s\n" % e)
+		return 1
+
+	sys.stdout.write(json.dumps(result))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+## Stand-in for the sublime and sublime_plugin modules.
+#  @package fake_sublime
+#
+#  Lets the plugin modules be imported and run outside of
+#  Sublime Text.  A View is backed by a Python string and
+#  counts the calls made to it, since each of those calls
+#  crosses the plugin host boundary in the real editor.
+
+import re
+import sys
+
+## A region of a view, [a, b) once ordered.
+class Region:
+
+	def __init__(self, a, b=None):
+		if b is None:
+			b = a
+		self.a = a
+		self.b = b
+
+	def begin(self):
+		return min(self.a, self.b)
+
+	def end(self):
+		return max(self.a, self.b)
+
+	def size(self):
+		return self.end() - self.begin()
+
+	def empty(self):
+		return self.a == self.b
+
+	def contains(self, x):
+		if isinstance(x, Region):
+			return self.begin() <= x.begin() and x.end() <= self.end()
+		return self.begin() <= x <= self.end()
+
+	def __eq__(self, other):
+		return isinstance(other, Region) and self.a == other.a and self.b == other.b
+
+	def __repr__(self):
+		return "Region(%d, %d)" % (self.a, self.b)
+
+## The selection of a view, a list of regions.
+class Selection(list):
+
+	def add(self, region):
+		self.append(region)
+
+	def add_all(self, regions):
+		self.extend(regions)
+
+## A settings object backed by a dictionary.
+class Settings(dict):
+
+	def set(self, key, value):
+		self[key] = value
+
+	def add_on_change(self, key, callback):
+		pass
+
+	def clear_on_change(self, key):
+		pass
+
+## A view backed by a string.
+class View:
+
+	nextId = 1
+
+	## constructor
+	#  @param text - the contents of the view
+	#  @param scope - the scope of the view's syntax
+	def __init__(self, text, scope="text.xml"):
+		self.text = text
+		self.scope = scope
+		self.viewId = View.nextId
+		View.nextId += 1
+		self.changeCount = 0
+		self.viewSettings = Settings()
+		self.selection = Selection([Region(0)])
+		## number of calls that would cross into the editor
+		self.calls = 0
+
+	def id(self):
+		return self.viewId
+
+	def buffer_id(self):
+		return self.viewId
+
+	def size(self):
+		return len(self.text)
+
+	def change_count(self):
+		return self.changeCount
+
+	def settings(self):
+		return self.viewSettings
+
+	def sel(self):
+		return self.selection
+
+	def file_name(self):
+		return None
+
+	def is_loading(self):
+		return False
+
+	def substr(self, x):
+		self.calls += 1
+		if isinstance(x, Region):
+			return self.text[x.begin():x.end()]
+		return self.text[x] if 0 <= x < len(self.text) else "\x00"
+
+	def find_all(self, pattern, flags=0):
+		self.calls += 1
+		return [Region(m.start(), m.end()) for m in re.finditer(pattern, self.text)]
+
+	## Score a selector the way the XML syntax would for the
+	#  selectors the plugin uses.
+	def score_selector(self, point, selector):
+		self.calls += 1
+		if selector == "comment.block.xml":
+			return 1 if self.text.startswith("<!--", point) else 0
+		if selector == "meta.tag.preprocessor.xml":
+			return 1 if self.text.startswith("<?", point) else 0
+		return 1 if self.scope.startswith(selector) else 0
+
+	def run_command(self, command, args=None):
+		pass
+
+	## Replace text the way an edit in the editor would.
+	#  @param begin - start of the replaced text
+	#  @param end - end of the replaced text
+	#  @param text - the new text
+	def replace(self, begin, end, text):
+		self.text = self.text[:begin] + text + self.text[end:]
+		self.changeCount += 1
+
+SETTINGS = {}
+
+def load_settings(name):
+	return SETTINGS.setdefault(name, Settings())
+
+def save_settings(name):
+	pass
+
+def set_timeout(callback, delay=0):
+	callback()
+
+def set_timeout_async(callback, delay=0):
+	callback()
+
+def status_message(message):
+	pass
+
+def packages_path():
+	return ""
+
+def active_window():
+	return None
+
+def version():
+	return "4000"
+
+def ok_cancel_dialog(message, ok_title=""):
+	return False
+
+def message_dialog(message):
+	pass
+
+class EventListener:
+	pass
+
+class ViewEventListener:
+	def __init__(self, view):
+		self.view = view
+
+class TextCommand:
+	def __init__(self, view):
+		self.view = view
+
+class WindowCommand:
+	def __init__(self, window):
+		self.window = window
+
+class ApplicationCommand:
+	pass
+
+## Register this module as sublime and sublime_plugin.
+#  Must be called before any plugin module is imported.
+def install():
+	module = sys.modules[__name__]
+	sys.modules["sublime"] = module
+	sys.modules["sublime_plugin"] = module
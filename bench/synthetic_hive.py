@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+## Synthetic HIVE input files.
+#  @package synthetic_hive
+#
+#  Generates HIVE XML of a given number of tags, nesting depth
+#  and tag length together with the HIVE API schema that the
+#  objects in it use, so completion latency can be measured
+#  on files of any size.  The files only use elements, attributes,
+#  params and values the schema allows.
+
+import random
+
+## Number of object types in the generated schema
+TYPE_COUNT = 400
+## Number of channels of each object type
+CHANNEL_COUNT = 12
+## Number of values of each channel
+VALUE_COUNT = 6
+
+NAMESPACES = ["hive", "sensors", "effects", "comms", "terrain", "weapons", "platforms", "ui"]
+
+## Generate the HIVE API schema used by the generated files.
+#  @param seed - seed for the random number generator
+#  @returns a dictionary with the sorted types, the channels of each
+#  type and the values of each channel, laid out like SchemaSnapshot
+def generateSchema(seed=0):
+	rng = random.Random(seed)
+	types = set()
+	while len(types) < TYPE_COUNT:
+		depth = rng.randint(1, 3)
+		segments = [rng.choice(NAMESPACES) for i in range(depth)]
+		segments.append("Type%d" % rng.randint(0, TYPE_COUNT * 4))
+		types.add("::".join(segments))
+
+	channels = {}
+	values = {}
+	for typ in types:
+		channels[typ] = [["channel%d" % i, "Channel %d of %s" % (i, typ)] for i in range(CHANNEL_COUNT)]
+		values[typ] = {}
+		for i in range(CHANNEL_COUNT):
+			values[typ]["channel%d" % i] = [["value%d" % v, "Value %d" % v] for v in range(VALUE_COUNT)]
+
+	return {"types" : sorted(types), "channels" : channels, "values" : values}
+
+## Generate a HIVE file.
+#  Objects nest up to depth levels below the root and each
+#  object holds params.  Params are padded with spaces so that
+#  they are about tagLength characters long.
+#  @param schema - a schema from generateSchema
+#  @param tags - number of tags to generate
+#  @param depth - maximum nesting depth of objects
+#  @param tagLength - approximate length of a param tag
+#  @param seed - seed for the random number generator
+#  @returns the text of the file
+def generateDocument(schema, tags=1000, depth=4, tagLength=60, seed=0):
+	rng = random.Random(seed)
+	types = schema["types"]
+	parts = ['<?xml version="1.0" encoding="UTF-8"?>\n', "<hive>\n"]
+	count = 2
+	stack = []
+
+	while count < tags:
+		indent = "\t" * (len(stack) + 1)
+		roll = rng.random()
+
+		if count % 97 == 0:
+			parts.append('%s<!-- generated section %d -->\n' % (indent, count))
+			count += 1
+
+		elif not stack or (roll < 0.15 and len(stack) < depth):
+			typ = rng.choice(types)
+			parts.append('%s<object type="%s" id="object%d">\n' % (indent, typ, count))
+			stack.append(typ)
+			count += 1
+
+		elif roll < 0.3:
+			stack.pop()
+			parts.append('%s</object>\n' % ("\t" * (len(stack) + 1)))
+			count += 1
+
+		else:
+			tag = '<param name="channel%d" value="value%d"' % (rng.randrange(CHANNEL_COUNT), rng.randrange(VALUE_COUNT))
+			padding = max(0, tagLength - len(tag) - 2)
+			parts.append('%s%s%s/>\n' % (indent, tag, " " * padding))
+			count += 1
+
+	while stack:
+		stack.pop()
+		parts.append('%s</object>\n' % ("\t" * (len(stack) + 1)))
+
+	parts.append("</hive>\n")
+	return "".join(parts)
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+## Synthetic HIVE log files.
+#  @package synthetic_log
+#
+#  Generates .nlog files of a given size with lines of every log
+#  level written from a set of source file(line) references, and
+#  lines without a level as HIVE writes for multi-line messages,
+#  so the log tools can be checked and measured on logs of any size.
+
+import random
+
+## The log levels and how often each is written
+LEVEL_WEIGHTS = [("S", 2), ("D", 30), ("I", 40), ("A", 3), ("W", 15), ("!", 8), ("#", 1)]
+
+## Number of source files the log is written from
+SOURCE_COUNT = 40
+## Number of places in each source file that write to the log
+SITE_COUNT = 25
+
+## Generate the lines of a log.
+#  Some messages mention a year or a source file that is not the
+#  one they were written from, so anchored and unanchored filter
+#  expressions find different lines.
+#  @param rng - a random.Random
+#  @returns an iterator of lines, each ending with a newline
+def generateLines(rng):
+	levels = "".join(level * weight for level, weight in LEVEL_WEIGHTS)
+	sites = []
+	for i in range(SOURCE_COUNT):
+		source = "src/module%d/file%d.cpp" % (i % 6, i)
+		sites += [(source, rng.randint(1, 2000), rng.choice(levels)) for j in range(SITE_COUNT)]
+
+	second = 0
+	while True:
+		second += rng.randint(0, 2)
+		year = rng.choice([2025, 2026])
+		source, row, level = rng.choice(sites)
+		roll = rng.random()
+		if roll < 0.1:
+			message = "retrying file%d.cpp after %d ms" % (rng.randint(0, SOURCE_COUNT - 1), rng.randint(1, 500))
+		elif roll < 0.15:
+			message = "build of %d loaded" % rng.choice([2025, 2026])
+		else:
+			message = "object%d channel%d value %d" % (rng.randint(0, 999), rng.randint(0, 11), rng.randint(0, 99999))
+		yield "%d-%02d-%02d %02d:%02d:%02d.%03d [%s]   %s(%d) %s\n" % (year, 1 + second // 2592000 % 12, 1 + second // 86400 % 28,
+			second // 3600 % 24, second // 60 % 60, second % 60, rng.randint(0, 999), level, source, row, message)
+		if rng.random() < 0.05:
+			yield "    at %s(%d)\n" % (source, rng.randint(1, 2000))
+
+## Write a log file.
+#  @param path - path of the file to write
+#  @param size - approximate size of the file in bytes
+#  @param seed - seed for the random number generator
+#  @returns the number of lines written
+def writeLog(path, size, seed=0):
+	rng = random.Random(seed)
+	written = 0
+	count = 0
+	with open(path, "w", newline="\n") as f:
+		for line in generateLines(rng):
+			if written >= size:
+				break
+			f.write(line)
+			written += len(line)
+			count += 1
+	return count
@@ -7,18 +7,27 @@
 #  Plugin that autocompletes
 #  parameters, object names, elements
 #  attributes, and enum values for HIVE files.
-#  Assumption: Each tag has less than 9000 characters
-#  (for optimization purposes)
 
 import sublime, sublime_plugin
+import html
+import re
+import threading
 from .Module_DataDictionary import *
 from .Module_XMLTagIterator import *
+from .Module_TagIndex import *
+from .Module_CompletionQueue import *
+from .Module_PerfStats import *
+from .Module_Validator import *
 
 ## Dictionary containing mappings of objects to parameters and
 #  mapping of elements to subelements and attributes.
 #  Autocompletion and help info plugins store a reference to this object
 DATA_DICTIONARY = None #cannot initialize dictionary at plugin load time
 
+## Worker threads that run HiveAPIQuery requests for completions
+#  so the main thread never waits on the tool.
+COMPLETION_QUEUE = None
+
 #Option names and default values
 settings_file = 'hive.sublime-settings'
 
@@ -26,6 +35,24 @@ settings_file = 'hive.sublime-settings'
 #occur in. text.xml is for xml files
 AUTOCOMPLETION_SELECTOR = "text.xml"
 
+## Number of characters read at a time when looking backwards
+#  for the start of the current tag.  A tag of n characters
+#  costs at most n / TAG_SCAN_CHUNK + 1 calls to view.substr.
+TAG_SCAN_CHUNK = 2048
+
+## Finds the type of every object tag of a file
+OBJECT_TYPE_RE = re.compile(r'<object\s[^>]*?\btype\s*=\s*"([^"]+)"')
+
+## view id -> change count of the view when its object types were last prefetched
+PREFETCHED_VIEWS = {}
+
+## view id -> ViewValidation of the view
+VALIDATIONS = {}
+## view id -> number of the latest edit waiting to be validated
+VALIDATION_REQUESTS = {}
+## name of the regions marking validation problems
+VALIDATION_REGIONS = "hive_validation"
+
 #enums
 
 ## context for object types
@@ -59,6 +86,9 @@ OBJECT_TYPE_COLON_CONTEXT = 11
 #  and no quotes have been typed
 OBJECT_TYPE_COLON_CONTEXT_NO_QUOTES = 12
 
+## contexts where the plugin types the quotes around the value
+ADD_QUOTES_CONTEXTS = (PARAM_VALUE_CONTEXT_NO_QUOTES, OBJECT_TYPE_COLON_CONTEXT_NO_QUOTES)
+
 CONTEXT_NAMES = [
 	"None",
 	"OBJECT_TYPE_CONTEXT",
@@ -84,10 +114,41 @@ default_binary = 'HiveAPIQuery.exe' if os_is_windows else 'HiveAPIQuery'
 def loadSettings():
 	global queryBinary
 	global inhibitComp
+	global cacheEntries
+	global cacheBytes
+	global cacheTTL
+	global useWorker
+	global asyncCompletions
+	global completionThreads
+	global useSnapshot
+	global slowCompletionMs
+	global multiCursorMode
+	global prefetchOnOpen
+	global prefetchThreads
+	global memoEntries
+	global debounceMs
+	global validateFiles
+	global validationDelayMs
 
 	settings = sublime.load_settings(settings_file)
 	inhibitComp = settings.get("inhibit_other_completions", True)
 	queryBinary = settings.get("hive_api_query", default_binary)
+	cacheEntries = settings.get("query_cache_max_entries", 512)
+	cacheBytes = int(settings.get("query_cache_max_mb", 32) * 1024 * 1024)
+	cacheTTL = settings.get("query_cache_ttl", 0)
+	useWorker = settings.get("hive_api_query_worker", False)
+	asyncCompletions = settings.get("async_completions", True)
+	completionThreads = settings.get("completion_threads", 2)
+	useSnapshot = settings.get("schema_snapshot", True)
+	slowCompletionMs = settings.get("slow_completion_log_ms", 0)
+	multiCursorMode = settings.get("multi_cursor_completions", "intersection")
+	prefetchOnOpen = settings.get("prefetch_on_open", True)
+	prefetchThreads = settings.get("prefetch_threads", 2)
+	memoEntries = settings.get("completion_memo_entries", 256)
+	debounceMs = settings.get("completion_debounce_ms", 100)
+	validateFiles = settings.get("validate_hive_files", True)
+	validationDelayMs = settings.get("validation_delay_ms", 200)
+	PERF_STATS.slowThreshold = slowCompletionMs
 
 # This function taken from Stack Overflow response:
 # http://stackoverflow.com/questions/377017/test-if-executable-exists-in-python
@@ -131,11 +192,28 @@ def checkQueryBinary():
 #   Sublime executes plugin_loaded once the api is ready to use
 def plugin_loaded():
 	global DATA_DICTIONARY
+	global COMPLETION_QUEUE
 
 	loadSettings()
 	checkQueryBinary()
 
-	DATA_DICTIONARY = DataDictionary(queryBinary)
+	DATA_DICTIONARY = DataDictionary(queryBinary, cacheEntries, cacheBytes, cacheTTL, useWorker, memoEntries)
+	DATA_DICTIONARY.prefetchThreads = prefetchThreads
+	if useSnapshot:
+		DATA_DICTIONARY.loadSnapshot(schemaSnapshotPath())
+	COMPLETION_QUEUE = CompletionQueue(completionThreads, debounceMs / 1000.0)
+
+## Sublime executes plugin_unloaded before the plugin is reloaded or removed
+def plugin_unloaded():
+	if COMPLETION_QUEUE is not None:
+		COMPLETION_QUEUE.shutdown()
+	if DATA_DICTIONARY is not None:
+		DATA_DICTIONARY.shutdown()
+
+## Get the path of the schema snapshot file,
+#  which is kept next to the user's settings.
+def schemaSnapshotPath():
+	return os.path.join(sublime.packages_path(), "User", "HiveAPISchema.json.gz")
 
 #///////////////////////////////////////////////GLOBAL METHODS/////////////////////////////////////////////////////////////////////
 
@@ -154,85 +232,110 @@ def isObjectTag(tokens):
 	return len(tokens) >=2 and tokens[0] == '<' and tokens[1] == 'object'
 
 
-## Method that gives the element of the tag
-#  at the location.
-#  @param view - a view object
-#  @param location - an integer for indexing into the view
-#  @returns a string or None if no element is found
-def getCurrentElementType(view, location):
-	index = location -1 #initialize index to location left of cursor
-
-	#get range from current cursor to either the beginning of file or a tag <
-	while(index >= 0 and  view.substr(index) != '<' and view.substr(index) != '>'):
-		index -= 1
-
-	if(index < 0 or view.substr(index) != '<'):
-		return None #the cursor is not in an XML tag
-
-	currentRegion = sublime.Region(index, location)
-
-	currentTag = view.substr(currentRegion)
-	tokens = currentTag.replace('=', ' = ').replace('<', ' < ').replace('\"', ' \" ').split()
-	if(len(tokens) <= 1):
-		return None
-	return tokens[1]
-
-## method that gets the value of the current param element's name attribute.
-#  This method does not check whether the current tag is a param tag;
-#  It just gets the value of a name attribute if available.
+## Everything the completion helpers need to know about the cursor,
+#  gathered from a single read of the tag the cursor is in.
+class CursorContext:
+	## constructor
+	#  @param location - index for cursor location in the view
+	#  @param prefix - the current word being typed
+	def __init__(self, location, prefix=""):
+		## index for cursor location in the view
+		self.location = location
+		## the current word being typed
+		self.prefix = prefix
+		## an enum value, 0 if the cursor is not in an XML tag
+		self.context = 0
+		## index of the '<' that starts the current tag, -1 if not in a tag
+		self.tagStart = -1
+		## text of the current tag up to the cursor
+		self.tagText = ""
+		## element of the current tag or None
+		self.element = None
+		## value of the current tag's name attribute or None
+		self.paramName = None
+		## the part of the attribute value before the word being typed
+		self.valuePrefix = ""
+		## True if the cursor is inside a quoted attribute value
+		self.inQuotes = False
+
+## Method that finds the '<' of the tag the cursor is in.
+#  The view is read backwards from the cursor in chunks of
+#  TAG_SCAN_CHUNK characters until a '<' or '>' is found,
+#  so a tag of any length is found with few calls to view.substr.
 #  @param view - a sublime view object
-#  @param location - an integer index into the view
-#  @returns a string or None
-def getCurrentParamName(view, location):
-	index = location -1 #initialize index to location left of cursor
-
-	#get range from current cursor to either the beginning of file or a tag <
-	while(index >= 0 and  view.substr(index) != '<' and view.substr(index) != '>'):
-		index -= 1
-
-	if(index < 0 or view.substr(index) != '<'):
-		return None #the cursor is not in an XML tag
-
-	currentRegion = sublime.Region(index, location)
-
-	currentTag = view.substr(currentRegion)
-	tokens = currentTag.replace('=', ' = ').replace('<', ' < ').replace('\"', ' \" ').split()
-
-	index = 0
-	while(index < len(tokens) and tokens[index] != 'name'):
-		index = index + 1
-	if(index + 3 < len(tokens)):
-		return tokens[index + 3]
-	else:
-		return None
-
-
-## Method that determines the context of the current cursor
+#  @param location - index for cursor location in the view
+#  @returns a (index, text) pair, index is the location of the '<'
+#  and text is the tag from the '<' up to the cursor,
+#  or (-1, "") if the cursor is not in a tag
+def scanTagStart(view, location):
+	chunks = []
+	end = location
+	while(end > 0):
+		start = max(0, end - TAG_SCAN_CHUNK)
+		chunk = view.substr(sublime.Region(start, end))
+		opening = chunk.rfind('<')
+		closing = chunk.rfind('>')
+		if(opening > closing):
+			chunks.append(chunk[opening:])
+			chunks.reverse()
+			return (start + opening, "".join(chunks))
+		if(closing != -1):
+			break #the cursor is after the end of a tag
+		chunks.append(chunk)
+		end = start
+
+	return (-1, "")
+
+## Method that reads the tag at the cursor once and works out
+#  the context, element, param name and value prefix from it.
 #  @param view - a sublime view object
 #  @param location - index for cursor location in the view
 #  @param prefix - the current word being typed, which should
 #  be removed from the list of tokens
-#  @returns an enum value
-def getContext(view, location, prefix=""):
-	index = location -1 #initialize index to location left of cursor
-
-	charCount = 0
-	#get range from current cursor to either the beginning of file or a tag <
-	while(index >= 0 and  view.substr(index) != '<' and view.substr(index) != '>' and charCount < 9000):
-		index -= 1
-		#for optimization, stop looking for < and > after charCount reaches 9000
-		charCount += 1
+#  @returns a CursorContext
+def analyzeContext(view, location, prefix=""):
+	ctx = CursorContext(location, prefix)
+	index, currentTag = scanTagStart(view, location)
 
-	if(view.substr(index) != '<'):
-		return 0 #the cursor is not in an XML tag
-
-	currentRegion = sublime.Region(index, location)
+	if(index < 0):
+		return ctx #the cursor is not in an XML tag
 
 	#currentTag may be an incomplete tag (no '>' )
-	currentTag = view.substr(currentRegion)
+	ctx.tagStart = index
+	ctx.tagText = currentTag
+
 	tokens = currentTag.replace('=', ' = ').replace('<', ' < ').replace('\"', ' \" ').split()
 	# print("Prefix [%s] CurrTag [%s], Tokens[%s]" % (prefix, currentTag, tokens))
 
+	if(len(tokens) > 1):
+		ctx.element = tokens[1]
+
+	#the param name is the third token after name (name = " value)
+	if('name' in tokens):
+		nameIndex = tokens.index('name')
+		if(nameIndex + 3 < len(tokens)):
+			ctx.paramName = tokens[nameIndex + 3]
+
+	#the value typed so far starts after the last = or "
+	valueStart = max(currentTag.rfind('='), currentTag.rfind('\"'))
+	ctx.valuePrefix = currentTag[valueStart + 1:].rstrip(prefix)
+
+	#the character in front of the word being typed
+	charBeforePrefix = ''
+	if(len(currentTag) - len(prefix) - 1 >= 0):
+		charBeforePrefix = currentTag[len(currentTag) - len(prefix) - 1]
+
+	ctx.context = getTokensContext(tokens, prefix, charBeforePrefix)
+	ctx.inQuotes = tokens.count('\"') % 2 == 1
+	return ctx
+
+## Method that determines the context from the tokens of the current tag
+#  @param tokens - the tokens of the current tag up to the cursor.
+#  The word being typed is removed from the list.
+#  @param prefix - the current word being typed
+#  @param charBeforePrefix - the character in front of the word being typed
+#  @returns an enum value
+def getTokensContext(tokens, prefix, charBeforePrefix):
 	context = 0
 	colonsNotWordSeparator = False
 	#user might have begun typing the word to be autocompleted, so remove word if so
@@ -240,7 +343,7 @@ def getContext(view, location, prefix=""):
 		tokens.pop()
 	#if the prefix is not found in tokens because of colons not being a word separator
 	#then mark the colonsNotWordSeparator flag and pop the last token which ends with prefix
-	elif(len(tokens) != 0 and view.substr(location - len(prefix)-1) == ':' and tokens[-1].endswith(prefix)):
+	elif(len(tokens) != 0 and charBeforePrefix == ':' and tokens[-1].endswith(prefix)):
 		tokens.pop()
 		colonsNotWordSeparator = True
 
@@ -294,6 +397,32 @@ def getContext(view, location, prefix=""):
 
 	return context
 
+## Method that gives the element of the tag
+#  at the location.
+#  @param view - a view object
+#  @param location - an integer for indexing into the view
+#  @returns a string or None if no element is found
+def getCurrentElementType(view, location):
+	return analyzeContext(view, location).element
+
+## method that gets the value of the current param element's name attribute.
+#  This method does not check whether the current tag is a param tag;
+#  It just gets the value of a name attribute if available.
+#  @param view - a sublime view object
+#  @param location - an integer index into the view
+#  @returns a string or None
+def getCurrentParamName(view, location):
+	return analyzeContext(view, location).paramName
+
+## Method that determines the context of the current cursor
+#  @param view - a sublime view object
+#  @param location - index for cursor location in the view
+#  @param prefix - the current word being typed, which should
+#  be removed from the list of tokens
+#  @returns an enum value
+def getContext(view, location, prefix=""):
+	return analyzeContext(view, location, prefix).context
+
 
 ## returns the object type as a string
 #  that a parameter belongs to
@@ -351,10 +480,7 @@ def getParentTagType(view, location):
 #  is being typed (the prefix for autocompletion)
 #  @returns a string
 def getObjectTypePrefix(view, location, suffix):
-	index = location - 1
-	while(index >= 0 and view.substr(index) != '=' and view.substr(index) != '\"'):
-		index -=1
-	return view.substr(sublime.Region(index + 1, location)).rstrip(suffix)
+	return analyzeContext(view, location, suffix).valuePrefix
 
 ## Filters the object completions list based on
 #  a prefix and trims the words based on the prefix.
@@ -371,6 +497,167 @@ def filterObjectTypeCompletions(completions, prefix):
 			completions.pop(i)
 		i -= 1
 
+## Move the cursors whose values quotes were added around back before
+#  their last quote.  The other cursors were already moved along with
+#  the inserted quotes by sublime, so they are left where they are.
+#  @param view - the sublime view
+#  @param quotedLocations - the locations of the quoted cursors before the quotes were added
+#  @param inserted - the locations quotes were inserted at, before the quotes were added
+def placeQuotedCursors(view, quotedLocations, inserted):
+	# a quoted cursor was pushed past both of its quotes
+	after = set(location + sum(1 for p in inserted if p <= location) for location in quotedLocations)
+
+	regions = []
+	for region in view.sel():
+		if(region.empty() and region.b in after):
+			regions.append(sublime.Region(region.b - 1))
+		else:
+			regions.append(region)
+
+	view.sel().clear()
+	view.sel().add_all(regions)
+
+## Combine the completion lists of several cursors, keeping the
+#  completions that every cursor has.
+#  @param lists - a non empty list of sorted lists of trigger-completion pairs
+#  @returns a sorted list of trigger-completion pairs
+def intersectCompletions(lists):
+	if(len(lists) == 1):
+		return lists[0]
+	common = set(tuple(item) for item in lists[0])
+	for items in lists[1:]:
+		common.intersection_update(tuple(item) for item in items)
+	return [item for item in lists[0] if tuple(item) in common]
+
+## Combine the completion lists of several cursors, keeping the
+#  completions that any cursor has.
+#  @param lists - a list of sorted lists of trigger-completion pairs
+#  @returns a sorted list of trigger-completion pairs
+def unionCompletions(lists):
+	if(len(lists) == 0):
+		return []
+	if(len(lists) == 1):
+		return lists[0]
+	seen = set()
+	items = []
+	for completions in lists:
+		for item in completions:
+			if(tuple(item) not in seen):
+				seen.add(tuple(item))
+				items.append(item)
+	items.sort()
+	return items
+
+## Prefetch the channels and values of every object type in a view,
+#  unless the view has not changed since it was last prefetched.
+#  Meant to run off the main thread.
+#  @param view - a sublime view object
+def prefetchViewTypes(view):
+	if(DATA_DICTIONARY is None or not prefetchOnOpen):
+		return
+	if(view.score_selector(0, AUTOCOMPLETION_SELECTOR) <= 0):
+		return
+	changeCount = view.change_count()
+	if(PREFETCHED_VIEWS.get(view.id()) == changeCount):
+		return
+	PREFETCHED_VIEWS[view.id()] = changeCount
+
+	text = view.substr(sublime.Region(0, view.size()))
+	types = set(OBJECT_TYPE_RE.findall(text))
+	DATA_DICTIONARY.prefetch(sorted(types))
+
+## Mark the validation problems of a view.
+#  @param view - a sublime view object
+#  @param validation - the ViewValidation of the view
+def showValidation(view, validation):
+	regions = [sublime.Region(a, b) for a, b in zip(validation.starts, validation.ends)]
+	view.add_regions(VALIDATION_REGIONS, regions, "invalid", "",
+		sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SQUIGGLY_UNDERLINE)
+
+## Bring the validation problems of a view up to date.
+#  When the tag index of the view saw every edit since the last check
+#  only the changed tags are checked again, on the main thread.
+#  Otherwise the whole file is checked on a background thread.
+#  @param view - a sublime view object
+def validateView(view):
+	if(DATA_DICTIONARY is None or not validateFiles):
+		return
+	if(not view.is_valid() or view.score_selector(0, AUTOCOMPLETION_SELECTOR) <= 0):
+		return
+
+	validation = VALIDATIONS.get(view.id())
+	if(validation is None):
+		validation = VALIDATIONS[view.id()] = ViewValidation()
+
+	index = TAG_INDEXES.get(view.buffer_id())
+	if(not validation.running and index is not None and index.changeCount == view.change_count()):
+		if(validation.update(DATA_DICTIONARY, index)):
+			showValidation(view, validation)
+			return
+
+	if(validation.running):
+		return #checked again once the running check sees the view changed
+
+	validation.running = True
+	snapshot = TextSnapshot(view.substr(sublime.Region(0, view.size())), view.change_count())
+
+	def finish(problems, checked):
+		validation.running = False
+		if(problems is None or VALIDATIONS.get(view.id()) is not validation or not view.is_valid()):
+			return
+		if(view.change_count() != snapshot.changeCount):
+			validateView(view) #edited while it was checked
+			return
+
+		validation.setProblems(problems, snapshot.changeCount)
+
+		# later edits are checked against the tag index built for this check,
+		# whose nesting pass has run over the whole file, so checking them
+		# never has to run it on the main thread
+		checked.view = view
+		TAG_INDEXES[view.buffer_id()] = checked
+		showValidation(view, validation)
+
+	def check():
+		problems, checked = None, None
+		try:
+			problems, checked = validateText(DATA_DICTIONARY, snapshot)
+		except Exception as e:
+			print("Exception while validating HIVE file. Exception %s" % e)
+		sublime.set_timeout(lambda: finish(problems, checked), 0)
+
+	thread = threading.Thread(target=check, name="HIVE validation")
+	thread.daemon = True
+	thread.start()
+
+## Validate a view once it has not been edited for validation_delay_ms.
+#  @param view - a sublime view object
+def scheduleValidation(view):
+	request = VALIDATION_REQUESTS.get(view.id(), 0) + 1
+	VALIDATION_REQUESTS[view.id()] = request
+
+	def run():
+		if(VALIDATION_REQUESTS.get(view.id()) == request):
+			validateView(view)
+
+	sublime.set_timeout(run, validationDelayMs)
+
+## Show the completion popup again once completions computed
+#  in the background are ready.  Nothing is shown if the user
+#  has typed, moved the cursor or asked for other completions since.
+#  @param view - a sublime view object
+#  @param generation - the completion request the results belong to
+#  @param changeCount - the change count of the view at request time
+#  @param selection - a list of (a, b) pairs of the selection at request time
+def retriggerCompletions(view, generation, changeCount, selection):
+	if(COMPLETION_QUEUE is None or not COMPLETION_QUEUE.isCurrent(view.id(), generation)):
+		return
+	if(view.change_count() != changeCount or [(r.a, r.b) for r in view.sel()] != selection):
+		return
+
+	view.run_command("hide_auto_complete")
+	view.run_command("auto_complete", {"disable_auto_insert": True, "next_completion_if_showing": False})
+
 
 #//////////////////////////END GLOBAL METHODS/////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 
@@ -389,7 +676,9 @@ class HiveAutoComplete(sublime_plugin.EventListener):
 	# returns a list of trigger-completion pairs
 	# and possibly a flag preventing sublime from
 	# adding its own completions.
-	# Only the first cursor is checked
+	# Every cursor is checked in one pass; cursors needing the same
+	# completions share one lookup, and the lists of the cursors are
+	# combined as set by multi_cursor_completions.
 	def on_query_completions(self, view, prefix, locations):
 
 		# we delay loading the dictionary until here because
@@ -400,6 +689,11 @@ class HiveAutoComplete(sublime_plugin.EventListener):
 
 		items = []
 
+		# any background work for earlier requests in this view is now stale
+		generation = 0
+		if COMPLETION_QUEUE is not None:
+			generation = COMPLETION_QUEUE.begin(view.id())
+
 		settings = view.settings()
 		inXML = view.score_selector(locations[0], AUTOCOMPLETION_SELECTOR)
 
@@ -407,76 +701,242 @@ class HiveAutoComplete(sublime_plugin.EventListener):
 		if not inXML:
 			return items
 
-		context = getContext(view, locations[0], prefix)
+		if multiCursorMode == "first":
+			locations = locations[:1]
+
+		# time each stage of the request, see HIVE: Show Completion Performance
+		trace = PERF_STATS.trace()
+
+		# read and tokenize the current tag of each cursor once for every step below
+		contexts = [analyzeContext(view, location, prefix) for location in locations]
+		context = contexts[0].context
+		trace.mark("context")
 		# print("Context = %s(%d)" % (CONTEXT_NAMES[context], context))
 
 		if self.DD is None:
+			trace.finish(CONTEXT_NAMES[context])
 			return items
 
-		if(context == OBJECT_TYPE_CONTEXT):
-			items = self.DD.getObjectCompletions()
+		# the parents are looked up before any quotes are added, while the
+		# locations are still right; every lookup shares the view's tag index
+		keys = [self.completionKey(view, ctx) for ctx in contexts]
+		# marked even when no parent was looked up, so the time of the tag
+		# index is never counted in another stage
+		trace.mark("tags")
+
+		# Force add the quotes, from the last cursor to the first so
+		# the locations of the cursors not done yet stay the same
+		quoted = [ctx for ctx in contexts if ctx.context in ADD_QUOTES_CONTEXTS]
+		inserted = []
+		for ctx in sorted(quoted, key=lambda ctx: ctx.location, reverse=True):
+			start = ctx.location - (len(ctx.valuePrefix) + len(prefix))
+			view.run_command("add_quotes", {"end": ctx.location +1, "start": start } )
+			inserted += [start, ctx.location]
+		if quoted:
+			#move the quoted cursors back before their last quote
+			placeQuotedCursors(view, [ctx.location for ctx in quoted], inserted)
+
+		# one lookup for each distinct key
+		distinct = []
+		for key in keys:
+			if key is not None and key not in distinct:
+				distinct.append(key)
+		results = self.getBatch(view, generation, distinct)
+
+		if multiCursorMode == "union":
+			items = unionCompletions([results[key] for key in distinct if key in results])
+		elif None not in keys and all(key in results for key in distinct):
+			items = intersectCompletions([results[key] for key in distinct])
+
+		# every completion list is already sorted by the data dictionary
+		trace.mark("completions")
+		trace.finish(CONTEXT_NAMES[context])
+
+		# If there are no items, or we are not preventin other auto complets from being shown
+		# then just return the items.
+		if len(items) == 0 or not inhibitComp:
+			return items;
+
+		return items
+		# return (items, sublime.INHIBIT_WORD_COMPLETIONS)
 
-		elif(context == OBJECT_TYPE_CONTEXT_NO_QUOTES):
-			items = self.DD.getObjectCompletions(addQuotes=True)
+	## Work out which completions a cursor needs.
+	#  @param view - the sublime view completions are requested for
+	#  @param ctx - the CursorContext of the cursor
+	#  @returns a hashable description of the completions for completionsFor,
+	#  or None if the cursor has no completions
+	def completionKey(self, view, ctx):
+		context = ctx.context
 
-		elif(context == PARAM_NAME_CONTEXT):
-			items = self.DD.getParamCompletions(getParentObjectName(view, locations[0]))
+		if(context == OBJECT_TYPE_CONTEXT or context == OBJECT_TYPE_CONTEXT_NO_QUOTES):
+			return ("type", "", context == OBJECT_TYPE_CONTEXT_NO_QUOTES)
 
-		elif(context == PARAM_NAME_CONTEXT_NO_QUOTES):
-			items = self.DD.getParamCompletions(getParentObjectName(view, locations[0]), addQuotes=True)
+		elif(context == PARAM_NAME_CONTEXT or context == PARAM_NAME_CONTEXT_NO_QUOTES):
+			parent = getParentObjectName(view, ctx.location)
+			return ("channel", parent, context == PARAM_NAME_CONTEXT_NO_QUOTES)
 
 		elif(context == ELEMENT_CONTEXT):
-			items = self.DD.getElementCompletions(getParentTagType(view, locations[0]))
+			return ("element", getParentTagType(view, ctx.location))
 
 		elif(context == ATTRIBUTE_CONTEXT):
 			#get element type of current tag
-			element = getCurrentElementType(view, locations[0])
-			items = self.DD.getAttributeCompletions(element)
-
-
-		elif(context == PARAM_VALUE_CONTEXT):
-			valPrefix = getObjectTypePrefix(view, locations[0], prefix)
-			paramName = getCurrentParamName(view, locations[0])
-			parent = getParentObjectName(view, locations[0])
-			items = self.DD.getParamValueCompletions(paramName, parent, valPrefix)
-
-		elif(context == PARAM_VALUE_CONTEXT_NO_QUOTES):
-			valPrefix = getObjectTypePrefix(view, locations[0], prefix)
-			# Force add the quotes
-			view.run_command("add_quotes", {"end": locations[0] +1, "start": locations[0] - (len(valPrefix) + len(prefix)) } )
-			#move the cursor back before the last quote
-			view.run_command("move", {"by": "characters", "forward": False})
-
-			paramName = getCurrentParamName(view, locations[0])
-			parent = getParentObjectName(view, locations[0])
-			items = self.DD.getParamValueCompletions(paramName, parent, valPrefix, addQuotes=True)
-
-		elif(context == ATTRIBUTE_VALUE_CONTEXT):
-			pass
-		elif(context ==ATTRIBUTE_VALUE_CONTEXT_NO_QUOTES):
-			pass
-		elif(context == OBJECT_TYPE_COLON_CONTEXT or context == OBJECT_TYPE_COLON_CONTEXT_NO_QUOTES):
-			objPrefix = getObjectTypePrefix(view, locations[0], prefix)
+			return ("attribute", ctx.element)
 
-			if(context == OBJECT_TYPE_COLON_CONTEXT_NO_QUOTES):
-				#quotes must manually be inserted
-				view.run_command("add_quotes", {"end": locations[0] +1, "start": locations[0] - (len(objPrefix) + len(prefix)) } )
-				#move the cursor back before the last quote
-				view.run_command("move", {"by": "characters", "forward": False})
+		elif(context == PARAM_VALUE_CONTEXT or context == PARAM_VALUE_CONTEXT_NO_QUOTES):
+			parent = getParentObjectName(view, ctx.location)
+			return ("value", ctx.paramName, parent, ctx.valuePrefix, ctx.prefix, context == PARAM_VALUE_CONTEXT_NO_QUOTES)
 
-			if(objPrefix.endswith("::")):
-				items = self.DD.getObjectCompletions(prefix=objPrefix)
+		elif(context == OBJECT_TYPE_COLON_CONTEXT or context == OBJECT_TYPE_COLON_CONTEXT_NO_QUOTES):
+			if(ctx.valuePrefix.endswith("::")):
+				return ("type", ctx.valuePrefix, False)
 				# filterObjectTypeCompletions(items, objPrefix)
 
-		items.sort()
+		return None
 
-		# If there are no items, or we are not preventin other auto complets from being shown
-		# then just return the items.
-		if len(items) == 0 or not inhibitComp:
-			return items;
+	## Get the completions described by a key from completionKey.
+	#  @param key - a key from completionKey
+	#  @param block - when False, None is returned if the HiveAPIQuery tool would have to be run
+	#  @returns a list of completions or None
+	def completionsFor(self, key, block=True):
+		DD = self.DD
+		kind = key[0]
+		if(kind == "type"):
+			return DD.getObjectCompletions(prefix=key[1], addQuotes=key[2], block=block)
+		elif(kind == "channel"):
+			return DD.getParamCompletions(key[1], addQuotes=key[2], block=block)
+		elif(kind == "value"):
+			return DD.getParamValueCompletions(key[1], key[2], key[3], addQuotes=key[5], block=block, word=key[4])
+		elif(kind == "element"):
+			return DD.getElementCompletions(key[1])
+		elif(kind == "attribute"):
+			return DD.getAttributeCompletions(key[1])
+		return []
+
+	## Get the completions of several keys.  Keys whose completions
+	#  need the HiveAPIQuery tool are computed together on a worker
+	#  thread, and are missing from the result until they are ready.
+	#  @param view - the sublime view completions are requested for
+	#  @param generation - the generation of the current completion request
+	#  @param keys - a list of keys from completionKey
+	#  @returns a dictionary of key -> list of completions
+	def getBatch(self, view, generation, keys):
+		if(COMPLETION_QUEUE is None or not asyncCompletions):
+			return dict((key, self.completionsFor(key)) for key in keys)
+
+		results = {}
+		missing = []
+		for key in keys:
+			items = self.completionsFor(key, False)
+			if(items is None):
+				missing.append(key)
+			else:
+				results[key] = items
+
+		if(missing):
+			viewId = view.id()
+			# HiveAPIQuery runs nobody is waiting for any more are killed
+			isCancelled = lambda: not COMPLETION_QUEUE.isCurrent(viewId, generation)
+
+			def compute(block):
+				batch = {}
+				with self.DD.cancellable(isCancelled):
+					for key in missing:
+						items = self.completionsFor(key, block)
+						if(items is None):
+							return None
+						batch[key] = items
+				return batch
+
+			batch = self.getDeferred(view, generation, tuple(missing), compute)
+			if(batch):
+				results.update(batch)
+
+		return results
+
+	## Get completions that may need the HiveAPIQuery tool without
+	#  blocking the main thread.  Completions that are not cached are
+	#  computed on a worker thread and the completion popup is shown
+	#  again once they are ready.
+	#  @param view - the sublime view completions are requested for
+	#  @param generation - the generation of the current completion request
+	#  @param key - a hashable description of the completions
+	#  @param compute - a function taking a block argument that returns a list
+	#  of completions, or None if block is False and the tool would have to run
+	#  @returns a list of completions, which is empty while they are computed
+	def getDeferred(self, view, generation, key, compute):
+		if(COMPLETION_QUEUE is None or not asyncCompletions):
+			return compute(True)
+
+		items = COMPLETION_QUEUE.take(view.id(), key)
+		if(items is None):
+			items = compute(False)
+		if(items is not None):
+			return items
 
-		return items
-		# return (items, sublime.INHIBIT_WORD_COMPLETIONS)
+		changeCount = view.change_count()
+		selection = [(r.a, r.b) for r in view.sel()]
+		COMPLETION_QUEUE.submit(view.id(), generation, key, lambda: compute(True),
+			lambda: sublime.set_timeout(lambda: retriggerCompletions(view, generation, changeCount, selection), 0))
+
+		return []
+
+	## Warm the cache for the object types of files as they are opened
+	def on_load_async(self, view):
+		prefetchViewTypes(view)
+
+	def on_activated_async(self, view):
+		prefetchViewTypes(view)
+
+	def on_close(self, view):
+		if COMPLETION_QUEUE is not None:
+			COMPLETION_QUEUE.forget(view.id())
+		PREFETCHED_VIEWS.pop(view.id(), None)
+		TagIndex.discard(view)
+
+## Marks elements, attributes, params and values the schema does not
+#  allow, and shows what is wrong when the mouse is over one.
+class HiveValidationListener(sublime_plugin.EventListener):
+	def on_load(self, view):
+		scheduleValidation(view)
+
+	def on_activated(self, view):
+		if(view.id() not in VALIDATIONS):
+			scheduleValidation(view)
+
+	def on_modified(self, view):
+		if(view.id() in VALIDATIONS):
+			scheduleValidation(view)
+
+	def on_close(self, view):
+		VALIDATIONS.pop(view.id(), None)
+		VALIDATION_REQUESTS.pop(view.id(), None)
+
+	def on_hover(self, view, point, hover_zone):
+		validation = VALIDATIONS.get(view.id())
+		if(validation is None or hover_zone != sublime.HOVER_TEXT):
+			return
+		messages = validation.messagesAt(point)
+		if(messages):
+			view.show_popup("<br>".join(html.escape(m) for m in messages), sublime.HIDE_ON_MOUSE_MOVE_AWAY, point)
+
+## Keeps the tag index of XML buffers up to date as they are edited.
+#  TextChangeListener only exists in Sublime Text 4; with older
+#  versions the tag index is rebuilt after each edit instead.
+if hasattr(sublime_plugin, "TextChangeListener"):
+	class HiveTagIndexListener(sublime_plugin.TextChangeListener):
+		@classmethod
+		def is_applicable(cls, buffer):
+			view = buffer.primary_view()
+			return view is not None and view.score_selector(0, AUTOCOMPLETION_SELECTOR) > 0
+
+		def on_text_changed(self, changes):
+			view = self.buffer.primary_view()
+			index = TAG_INDEXES.get(self.buffer.id())
+			if view is None or index is None:
+				return #the index is built when it is first needed
+
+			index.view = view
+			index.applyChanges([(c.a.pt, c.b.pt, len(c.str)) for c in changes])
 
 ## Plugin that adds quotes at two points
 class AddQuotesCommand(sublime_plugin.TextCommand):
@@ -491,4 +951,48 @@ class AddQuotesCommand(sublime_plugin.TextCommand):
 # Called to set the path to the HiveAPIQuery binary
 class HiveApiQuerySetPathCommand(sublime_plugin.WindowCommand):
 	def run(self):
-		updateQueryPath()
\ No newline at end of file
+		updateQueryPath()
+
+# Called to throw away all cached HiveAPIQuery results
+class HiveClearQueryCacheCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		if DATA_DICTIONARY is not None:
+			DATA_DICTIONARY.clearCache()
+			sublime.status_message("HIVE: API query cache cleared")
+
+# Called to show how well the HiveAPIQuery result cache is working
+class HiveShowQueryCacheStatsCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		if DATA_DICTIONARY is None:
+			return
+
+		stats = DATA_DICTIONARY.cache.stats()
+		msg = ("HIVE API query cache: %d entries, %.1f KB, %d hits, %d misses (%.0f%% hit rate), %d evictions, %d invalidations" %
+			(stats["entries"], stats["bytes"] / 1024.0, stats["hits"], stats["misses"], stats["hit_rate"] * 100, stats["evictions"], stats["invalidations"]))
+		print(msg)
+		sublime.status_message(msg)
+
+# Called to show how long each stage of completion requests takes
+class HiveShowCompletionPerformanceCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		lines = ["HIVE completion performance, most recent %d requests of each kind" % PERF_STATS.size, ""]
+		lines.extend(PERF_STATS.report())
+		text = "\n".join(lines) + "\n"
+		print(text)
+
+		panel = self.window.create_output_panel("hive_performance")
+		panel.run_command("append", {"characters": text})
+		self.window.run_command("show_panel", {"panel": "output.hive_performance"})
+
+# Called to read the whole HIVE API into a snapshot file used for completions
+class HiveBuildSchemaSnapshotCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		if DATA_DICTIONARY is None:
+			return
+
+		DATA_DICTIONARY.snapshotPath = schemaSnapshotPath()
+		progress = lambda msg: sublime.set_timeout(lambda: sublime.status_message(msg), 0)
+		if DATA_DICTIONARY.buildSnapshot(progress):
+			sublime.status_message("HIVE: building schema snapshot")
+		else:
+			sublime.status_message("HIVE: schema snapshot is already being built or HiveAPIQuery was not found")
\ No newline at end of file
@@ -0,0 +1,394 @@
+#!/usr/bin/python3
+
+## Log file tools
+#  @package hive_log_tools
+#
+#  Commands for navigating large HIVE log files (.nlog).
+#  The log levels of each file are indexed from disk in the
+#  background when the file is opened, so moving to the next
+#  error is a lookup instead of a search of the whole buffer.
+
+import sublime, sublime_plugin
+import os
+import re
+import threading
+from .Module_LogFile import *
+from .Module_LogIndex import *
+from .Module_LogFilter import *
+from .Module_LogFollow import *
+from .Module_LogReferences import *
+
+##the sublime selector of HIVE log files
+LOG_SELECTOR = "text.hive"
+
+## log levels that count as errors
+ERROR_LEVELS = "!#"
+## log levels that count as warnings
+WARNING_LEVELS = "W"
+
+## output view id -> LogFilter writing to it
+LOG_FILTERS = {}
+
+## follow view id -> LogFollower reading new lines for it
+LOG_FOLLOWERS = {}
+
+## most chunks of filtered lines waiting to be appended to a view,
+#  so a fast filter does not queue the whole result in memory
+FILTER_PENDING_CHUNKS = 4
+
+## Check whether a view shows a HIVE log file saved on disk.
+#  @param view - a sublime view object
+#  @returns True or False
+def isLogView(view):
+	return view is not None and view.file_name() is not None and view.score_selector(0, LOG_SELECTOR) > 0
+
+## Bring the level index of a view's file up to date in the background.
+#  @param view - a sublime view object
+#  @returns the LogIndex of the view's file
+def indexLogView(view):
+	index = LogIndex.forFile(view.file_name())
+	name = os.path.basename(index.path)
+	last = [-1]
+
+	def progress(fraction):
+		percent = int(fraction * 100)
+		if percent // 10 != last[0] // 10:
+			last[0] = percent
+			sublime.set_timeout(lambda: sublime.status_message("HIVE: indexing %s %d%%" % (name, percent)), 0)
+
+	index.updateAsync(progress)
+	return index
+
+## Move the cursor to the start of a line and show it.
+#  @param view - a sublime view object
+#  @param row - a 0 based line number
+def showLogRow(view, row):
+	point = view.text_point(row, 0)
+	view.sel().clear()
+	view.sel().add(sublime.Region(point))
+	view.show_at_center(point)
+
+## Get the syntax of HIVE log files.
+#  @returns the resource path of the syntax, or None if it was not found
+def logSyntax():
+	syntaxes = sublime.find_resources("hive.tmLanguage")
+	return syntaxes[0] if syntaxes else None
+
+## Ask for the path of a log file.
+#  Sublime Text 4 shows a file dialog, earlier versions an input panel.
+#  @param window - a sublime window object
+#  @param onDone - function called with the path picked
+def askLogPath(window, onDone):
+	if hasattr(sublime, "open_dialog"):
+		sublime.open_dialog(lambda path: onDone(path) if path else None, [("HIVE Log Files", ["nlog"])])
+		return
+
+	folder = ""
+	view = window.active_view()
+	if view is not None and view.file_name() is not None:
+		folder = os.path.dirname(view.file_name())
+	elif window.folders():
+		folder = window.folders()[0]
+	window.show_input_panel("HIVE log file: ", os.path.join(folder, "") if folder else "", onDone, None, None)
+
+## Start filtering a log file into a new scratch view.
+#  @param window - a sublime window object to open the view in
+#  @param path - path to the log file
+#  @param levels - a string of log levels such as "W!#", or None for any level
+#  @param pattern - an expression the lines must contain, or None
+def filterLogFile(window, path, levels=None, pattern=None):
+	if not os.path.isfile(path):
+		sublime.status_message("HIVE: no log file %s" % path)
+		return
+
+	try:
+		logFilter = LogFilter(path, levels, pattern)
+	except re.error as e:
+		sublime.status_message("HIVE: invalid filter expression: %s" % e)
+		return
+
+	filters = []
+	if levels:
+		filters.append("".join("[%s]" % level for level in levels))
+	if pattern:
+		filters.append("/%s/" % pattern)
+	name = os.path.basename(path)
+
+	out = window.new_file()
+	out.set_name("%s %s" % (name, " ".join(filters)))
+	out.set_scratch(True)
+	out.set_read_only(True)
+	# the log syntax marks the file(line) references for HiveOpenFileCommand
+	syntax = logSyntax()
+	if syntax is not None:
+		out.assign_syntax(syntax)
+	LOG_FILTERS[out.id()] = logFilter
+
+	pending = threading.Semaphore(FILTER_PENDING_CHUNKS)
+	last = [-1]
+
+	def append(text):
+		pending.release()
+		if not out.is_valid():
+			logFilter.cancel()
+			return
+		out.run_command("append", {"characters": text, "force": True, "scroll_to_end": False})
+
+	def onLines(text):
+		while not pending.acquire(timeout=0.1):
+			if logFilter.cancelled.is_set():
+				return
+		sublime.set_timeout(lambda: append(text), 0)
+
+	def progress(fraction):
+		percent = int(fraction * 100)
+		if percent // 5 != last[0] // 5:
+			last[0] = percent
+			msg = "HIVE: filtering %s %d%%, %d lines" % (name, percent, logFilter.lineCount)
+			sublime.set_timeout(lambda: sublime.status_message(msg), 0)
+
+	def onDone(finished):
+		msg = "HIVE: %s %s, %d lines" % ("filtered" if finished else "stopped filtering", name, logFilter.lineCount)
+		def done():
+			LOG_FILTERS.pop(out.id(), None)
+			sublime.status_message(msg)
+		sublime.set_timeout(done, 0)
+
+	logFilter.start(onLines, progress, onDone)
+
+## Show the lines HIVE writes to a log in a new scratch view.
+#  The log is polled on a background thread and the new lines of
+#  each poll are appended at once.  The oldest lines are removed
+#  from the view when it has more than log_follow_max_lines.
+#  @param view - a sublime view of the log file
+def followLogView(view):
+	settings = sublime.load_settings("hive.sublime-settings")
+	interval = settings.get("log_follow_interval_ms", 500)
+	maxLines = max(1, settings.get("log_follow_max_lines", 100000))
+
+	follower = LogFollower(view.file_name(), maxLines)
+	name = os.path.basename(view.file_name())
+
+	out = view.window().new_file()
+	out.set_name("%s (following)" % name)
+	out.set_scratch(True)
+	out.set_read_only(True)
+	out.assign_syntax(view.settings().get("syntax"))
+	LOG_FOLLOWERS[out.id()] = follower
+	shown = [0]
+
+	def show(text, notice):
+		if LOG_FOLLOWERS.get(out.id()) is not follower or not out.is_valid():
+			return
+
+		if notice is not None:
+			text = "---- HIVE: %s ----\n%s" % (notice, text)
+		if text:
+			out.run_command("append", {"characters": text, "force": True, "scroll_to_end": True})
+			shown[0] += text.count("\n")
+			if shown[0] > maxLines:
+				out.run_command("hive_trim_log_view", {"lines": shown[0] - maxLines})
+				shown[0] = maxLines
+
+		sublime.set_timeout_async(poll, interval)
+
+	def poll():
+		if LOG_FOLLOWERS.get(out.id()) is not follower:
+			return #stopped
+		try:
+			text, notice = follower.poll()
+		except Exception as e:
+			print("Exception while following HIVE log [%s]. Exception %s" % (follower.path, e))
+			text, notice = "", None
+		sublime.set_timeout(lambda: show(text, notice), 0)
+
+	sublime.set_timeout_async(poll, 0)
+	sublime.status_message("HIVE: following %s" % name)
+
+## Indexes HIVE log files as they are opened and looked at.
+#  Going back to a log that HIVE has written more of since
+#  extends its index with the new lines.
+class HiveLogIndexListener(sublime_plugin.EventListener):
+	def on_load(self, view):
+		if isLogView(view):
+			indexLogView(view)
+
+	def on_activated(self, view):
+		if isLogView(view):
+			indexLogView(view)
+
+	def on_post_save(self, view):
+		if isLogView(view):
+			indexLogView(view)
+
+	def on_close(self, view):
+		logFilter = LOG_FILTERS.pop(view.id(), None)
+		if logFilter is not None:
+			logFilter.cancel()
+		LOG_FOLLOWERS.pop(view.id(), None)
+
+## Move the cursor to the next or previous message of some log levels.
+class HiveNextLogMessageCommand(sublime_plugin.TextCommand):
+	## method executed when the plugin runs.
+	#  @param edit - a sublime edit object
+	#  @param levels - the log levels to move to, such as "!#"
+	#  @param forward - True for the next message, False for the previous one
+	def run(self, edit, levels=ERROR_LEVELS, forward=True):
+		view = self.view
+		index = indexLogView(view)
+
+		selection = view.sel()
+		current = selection[0].begin() if len(selection) > 0 else 0
+		row = index.nearest(view.rowcol(current)[0], levels, forward)
+		if row < 0:
+			names = "/".join(LEVEL_NAMES[level] for level in levels)
+			msg = "HIVE: no %s %s messages" % ("later" if forward else "earlier", names)
+			if index.updating:
+				msg += " indexed yet"
+			sublime.status_message(msg)
+			return
+
+		showLogRow(view, row)
+
+	def is_enabled(self):
+		return isLogView(self.view)
+
+## Show the number of messages of each log level and
+#  move to the first message of the level picked.
+class HiveShowLogLevelCountsCommand(sublime_plugin.TextCommand):
+	def run(self, edit):
+		view = self.view
+		index = indexLogView(view)
+		counts = index.counts()
+
+		levels = [level for level in reversed(LEVELS)]
+		items = [["%s [%s]" % (LEVEL_NAMES[level], level), "%d lines" % counts[level]] for level in levels]
+		if index.updating:
+			items.append(["indexing", "%d of %d bytes read so far" % (index.offset, os.path.getsize(index.path))])
+
+		def onDone(i):
+			if 0 <= i < len(levels):
+				row = index.nearest(-1, levels[i], True)
+				if row >= 0:
+					showLogRow(view, row)
+
+		view.window().show_quick_panel(items, onDone)
+
+	def is_enabled(self):
+		return isLogView(self.view)
+
+## Copy the lines of some log levels, or matching an expression,
+#  of a log file into a new view.  The log is read from disk in
+#  chunks, so this works on logs too large to open.  The log is
+#  the one picked in the side bar, the one in the current view,
+#  or else the one asked for.
+class HiveFilterLogCommand(sublime_plugin.WindowCommand):
+	## method executed when the plugin runs.
+	#  @param levels - the log levels to keep, such as "W!#", or None for any level
+	#  @param pattern - an expression the lines must contain, or None
+	#  @param prompt - True to ask for the expression
+	#  @param paths - the files picked in the side bar, or None
+	#  @param choose - True to ask for the log even if the current view shows one
+	def run(self, levels=None, pattern=None, prompt=False, paths=None, choose=False):
+		window = self.window
+
+		def start(paths, pattern):
+			for path in paths:
+				filterLogFile(window, path, levels, pattern)
+
+		def filter(paths):
+			if prompt:
+				window.show_input_panel("Filter HIVE log by expression: ", pattern or "",
+					lambda text: start(paths, text), None, None)
+				return
+
+			start(paths, pattern)
+
+		view = window.active_view()
+		if paths:
+			filter([path for path in paths if os.path.isfile(path)])
+		elif not choose and isLogView(view):
+			filter([view.file_name()])
+		else:
+			askLogPath(window, lambda path: filter([path]))
+
+	def is_visible(self, paths=None, **args):
+		return paths is None or any(os.path.isfile(path) for path in paths)
+
+## Stop the filter writing to the current view.
+class HiveCancelLogFilterCommand(sublime_plugin.TextCommand):
+	def run(self, edit):
+		logFilter = LOG_FILTERS.get(self.view.id())
+		if logFilter is not None:
+			logFilter.cancel()
+
+	def is_enabled(self):
+		return self.view.id() in LOG_FILTERS
+
+## Show the lines HIVE writes to the log in a new view as they are written.
+class HiveFollowLogCommand(sublime_plugin.TextCommand):
+	def run(self, edit):
+		followLogView(self.view)
+
+	def is_enabled(self):
+		return isLogView(self.view)
+
+## Stop following the log shown in the current view.
+class HiveStopFollowingLogCommand(sublime_plugin.TextCommand):
+	def run(self, edit):
+		if LOG_FOLLOWERS.pop(self.view.id(), None) is not None:
+			sublime.status_message("HIVE: stopped following log")
+
+	def is_enabled(self):
+		return self.view.id() in LOG_FOLLOWERS
+
+## Remove lines from the top of a follow view.
+class HiveTrimLogViewCommand(sublime_plugin.TextCommand):
+	## method executed when the plugin runs.
+	#  @param edit - a sublime edit object
+	#  @param lines - the number of lines to remove
+	def run(self, edit, lines):
+		view = self.view
+		readOnly = view.is_read_only()
+		view.set_read_only(False)
+		view.erase(edit, sublime.Region(0, view.text_point(lines, 0)))
+		view.set_read_only(readOnly)
+
+## List every source file(line) the log was written from, the
+#  ones with the most errors first, and open the one picked.
+class HiveListReferencedSourcesCommand(sublime_plugin.TextCommand):
+	def run(self, edit):
+		view = self.view
+		path = view.file_name()
+		name = os.path.basename(path)
+
+		def show(refs):
+			if not view.is_valid():
+				return
+			if not refs:
+				sublime.status_message("HIVE: %s has no source references" % name)
+				return
+
+			items = [[r.ref, "%d errors, %d warnings, %d lines, worst %s" % (r.errors, r.warnings, r.count, LEVEL_NAMES[r.worst])] for r in refs]
+
+			def onDone(i):
+				if 0 <= i < len(refs):
+					view.run_command("hive_open_file", {"ref": refs[i].ref})
+
+			view.window().show_quick_panel(items, onDone)
+
+		def scan():
+			refs = []
+			try:
+				refs = scanReferences(path)
+			except Exception as e:
+				print("Exception while listing the sources of HIVE log [%s]. Exception %s" % (path, e))
+			sublime.set_timeout(lambda: show(refs), 0)
+
+		sublime.status_message("HIVE: listing the sources of %s" % name)
+		thread = threading.Thread(target=scan, name="HIVE log references")
+		thread.daemon = True
+		thread.start()
+
+	def is_enabled(self):
+		return isLogView(self.view)
@@ -1,8 +1,97 @@
 import sublime, sublime_plugin
 import os, re
+from .Module_SourceIndex import *
+
+#Option names and default values
+settings_file = 'hive.sublime-settings'
+
+## Index of the files under the hive_source_roots setting,
+#  used to find the sources that logs from other machines refer to.
+SOURCE_INDEX = None
+
+## view id -> line to go to once the view has loaded.
+#  Opening several references to a file that is still loading
+#  leaves only the latest line here.
+PENDING_LINES = {}
+
+## Get the path of the source index file,
+#  which is kept next to the user's settings.
+def sourceIndexPath():
+	return os.path.join(sublime.packages_path(), "User", "HiveSourceIndex.json.gz")
+
+## Bring the source index up to date in the background and save it.
+def updateSourceIndex():
+	def onDone(changed):
+		if changed:
+			try:
+				SOURCE_INDEX.save(sourceIndexPath())
+			except Exception as e:
+				print("Exception while saving HIVE source index. Exception %s" % e)
+			sublime.set_timeout(lambda: sublime.status_message("HIVE: %d source files indexed" % len(SOURCE_INDEX)), 0)
+
+	if SOURCE_INDEX is not None:
+		SOURCE_INDEX.updateAsync(onDone)
+
+def loadSourceRoots():
+	settings = sublime.load_settings(settings_file)
+	if SOURCE_INDEX.setRoots(settings.get("hive_source_roots", [])):
+		updateSourceIndex()
+
+## Go to a line of a view, or once it has loaded if it is still loading.
+#  @param view - a sublime view object
+#  @param line - a 1 based line number
+def gotoLine(view, line):
+	if view.is_loading():
+		PENDING_LINES[view.id()] = line
+	else:
+		PENDING_LINES.pop(view.id(), None)
+		view.run_command("goto_line", {"line": line})
+
+def plugin_loaded():
+	global SOURCE_INDEX
+
+	settings = sublime.load_settings(settings_file)
+	SOURCE_INDEX = SourceIndex(settings.get("hive_source_roots", []))
+	SOURCE_INDEX.load(sourceIndexPath())
+	settings.add_on_change("hive_source_roots", loadSourceRoots)
+	updateSourceIndex()
+
+def plugin_unloaded():
+	sublime.load_settings(settings_file).clear_on_change("hive_source_roots")
+
+## Open the source file a file(line) reference of a log points to.
+#  @param window - the sublime window to open the file in
+#  @param ref - a file(line) reference
+#  @returns True if the file was found
+def openReference(window, ref):
+	matchObj = re.match( r'([^\(]+)\(([0-9]+)\)', ref)
+	if not matchObj:
+		return False
+
+	# The log may come from another machine, so look the file up under the source roots
+	path = matchObj.group(1)
+	if SOURCE_INDEX is not None:
+		path = SOURCE_INDEX.resolve(path)
+	if path is not None and os.path.exists(path):
+		# Open the file, the line is selected once its done loading
+		fileView = window.open_file(path)
+		gotoLine(fileView, matchObj.group(2))
+		return True
+
+	sublime.status_message("HIVE: %s was not found under hive_source_roots" % matchObj.group(1))
+	# the file may have been added since the roots were indexed
+	updateSourceIndex()
+	return False
 
 class HiveOpenFileCommand(sublime_plugin.TextCommand):
-	def run(self, edit):		
+	## method executed when the plugin runs.
+	#  @param edit - a sublime edit object
+	#  @param ref - the file(line) reference to open, None for the one at the first selection
+	def run(self, edit, ref=None):
+		if ref is not None:
+			openReference(self.view.window(), ref)
+			return
+
 		print('OpenFile')
 		# Check the first selection
 		s = self.view.sel()[0]
@@ -11,17 +100,25 @@ class HiveOpenFileCommand(sublime_plugin.TextCommand):
 		if self.view.scope_name(s.begin()).find("hive.log.file") != -1:
 			# Extract out just the file info
 			fullLogFile = self.view.substr(self.view.extract_scope(s.begin()))
-			matchObj = re.match( r'([^\(]+)\(([0-9]+)\)', fullLogFile)
-			if matchObj:
-				if os.path.exists(matchObj.group(1)):
-					# Open the file and wait until its done loading
-					fileView = self.view.window().open_file(matchObj.group(1))	
-					sublime.set_timeout(lambda: self.select_text(fileView, matchObj.group(2)), 10)
-
-	def select_text(self, view, line):
-		print("Waiting on load")
-		if not view.is_loading():
-			sublime.status_message('this line is processed')
-			view.run_command("goto_line", {"line": line} )
-		else:
-			sublime.set_timeout(lambda: self.select_text(view, line), 10)					
+			openReference(self.view.window(), fullLogFile)
+
+## Goes to the lines of sources opened while they were loading
+#  and adds files saved under the source roots to the source index.
+class HiveOpenFileListener(sublime_plugin.EventListener):
+	def on_load(self, view):
+		line = PENDING_LINES.pop(view.id(), None)
+		if line is not None:
+			view.run_command("goto_line", {"line": line})
+
+	def on_close(self, view):
+		PENDING_LINES.pop(view.id(), None)
+
+	def on_post_save_async(self, view):
+		if SOURCE_INDEX is not None and view.file_name() is not None:
+			SOURCE_INDEX.addFile(view.file_name())
+
+# Called to index the source roots again
+class HiveRebuildSourceIndexCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		updateSourceIndex()
+		sublime.status_message("HIVE: indexing sources")